@@ -0,0 +1,134 @@
+"""
+asyncio front end for the executor.
+
+Queries run on a thread pool over connections from the active backend (see
+backends.py), so an event loop can fan out many independent queries at once:
+
+    results = await gather_queries(["SELECT ...", "SELECT ..."], timeout=5)
+
+Results have the same shapes as `executor.execute_query`: a DataFrame for a
+SELECT and a message string otherwise (errors included).
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from backends import get_backend
+from db_config import pool_max_size
+from executor import execute_query
+
+
+def _operation(query):
+    words = query.strip().split(None, 1)
+    return words[0].upper() if words else "query"
+
+
+class _RunningQuery:
+    """Tracks the connection a worker thread runs a query on, so it can be interrupted."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.conn = None
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def connect(self):
+        conn = self.backend.connect()
+        with self._lock:
+            if conn is not None and self.cancelled:
+                conn.close()
+                return None
+            self.conn = conn
+        return conn
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            return self.conn
+
+
+class AsyncExecutor:
+    """
+    Runs queries from coroutines, at most `max_concurrency` at a time.
+
+    `timeout` (seconds, per query, None for no limit) counts from when the
+    query gets a slot; a query that runs over is interrupted through the
+    backend (KILL QUERY on MySQL) and reported as an error string.
+    """
+
+    def __init__(self, max_concurrency=pool_max_size, timeout=None):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._threads = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="sql-query")
+        self._slots = None
+        self._loop = None
+
+    async def execute(self, query, timeout=None):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Semaphores belong to one event loop; e.g. each asyncio.run() gets a new one
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        timeout = self.timeout if timeout is None else timeout
+        running = _RunningQuery(get_backend())
+        async with self._slots:
+            future = loop.run_in_executor(
+                self._threads, functools.partial(execute_query, query, connection_factory=running.connect))
+            try:
+                return await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                await self._cancel(running)
+                return f"Error executing {_operation(query)}: query timed out after {timeout}s"
+            except asyncio.CancelledError:
+                await self._cancel(running)
+                raise
+
+    async def _cancel(self, running):
+        conn = running.cancel()
+        if conn is not None:
+            await asyncio.get_running_loop().run_in_executor(None, running.backend.interrupt, conn)
+
+    async def gather(self, queries, timeout=None):
+        """Run `queries` concurrently; results come back in the same order."""
+        return await asyncio.gather(*(self.execute(query, timeout) for query in queries))
+
+    def close(self):
+        self._threads.shutdown(wait=False, cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+_default_executor = None
+_default_lock = threading.Lock()
+
+
+def get_async_executor():
+    """Shared AsyncExecutor, sized to the connection pool."""
+    global _default_executor
+    if _default_executor is None:
+        with _default_lock:
+            if _default_executor is None:
+                _default_executor = AsyncExecutor()
+    return _default_executor
+
+
+async def execute_query_async(query, timeout=None):
+    """Run one query on the shared AsyncExecutor without blocking the event loop."""
+    return await get_async_executor().execute(query, timeout)
+
+
+async def gather_queries(queries, max_concurrency=None, timeout=None):
+    """Run many queries concurrently, at most `max_concurrency` at once, results in input order."""
+    if max_concurrency is None:
+        return await get_async_executor().gather(queries, timeout)
+    async with AsyncExecutor(max_concurrency, timeout) as runner:
+        return await runner.gather(queries)
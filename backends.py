@@ -0,0 +1,467 @@
+"""
+Execution backends: where queries run and where schema metadata comes from.
+
+    backend = SQLiteBackend("dev.db")   # or SQLiteBackend() for a private in-memory database
+    set_backend(backend)
+    execute_query("SELECT * FROM users")
+
+A backend opens connections, runs statements (with literals sent as
+parameters, see executor.statement_cursor), streams results, builds the
+schema catalog and explains queries:
+
+    MySQLBackend   the configured MySQL server, through the connection pool
+                   in db_config (the default)
+    SQLiteBackend  an in-process SQLite database file or in-memory database,
+                   for local dev datasets, CI and the benchmark harness
+
+`SQLC_BACKEND` picks the process-wide backend: "mysql", "sqlite" (in
+memory) or "sqlite:<path>". The SQL itself is passed through unchanged, so
+a query has to be valid in the backend's dialect.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from itertools import count
+
+import mysql.connector
+
+from catalog import SchemaCatalog, set_catalog
+from db_config import create_connection, get_connection
+from profiler import DB, span
+
+BACKEND = os.environ.get('SQLC_BACKEND', 'mysql')
+
+SQLITE_COLUMNS_QUERY = (
+    "SELECT m.name, p.name, p.type "
+    "FROM sqlite_master AS m JOIN pragma_table_info(m.name) AS p "
+    "WHERE m.type = 'table' {condition}"
+    "ORDER BY m.name, p.cid"
+)
+
+SQLITE_INDEXES_QUERY = (
+    "SELECT m.name, i.name, NOT l.\"unique\" "
+    "FROM sqlite_master AS m JOIN pragma_index_list(m.name) AS l JOIN pragma_index_info(l.name) AS i "
+    "WHERE m.type = 'table' AND i.seqno = 0"
+)
+
+SQLITE_KEYS_QUERY = (
+    "SELECT tbl, idx, col, non_unique, nullable FROM ("
+    "SELECT m.name AS tbl, l.name AS idx, i.name AS col, NOT l.\"unique\" AS non_unique, "
+    "CASE WHEN c.\"notnull\" THEN '' ELSE 'YES' END AS nullable, i.seqno AS seq "
+    "FROM sqlite_master AS m JOIN pragma_index_list(m.name) AS l JOIN pragma_index_info(l.name) AS i "
+    "JOIN pragma_table_info(m.name) AS c ON c.name = i.name "
+    "WHERE m.type = 'table' "
+    "UNION ALL "
+    # An INTEGER PRIMARY KEY is the rowid and has no index of its own
+    "SELECT m.name, 'PRIMARY', p.name, 0, '', p.pk "
+    "FROM sqlite_master AS m JOIN pragma_table_info(m.name) AS p "
+    "WHERE m.type = 'table' AND p.pk > 0 "
+    "AND NOT EXISTS (SELECT 1 FROM pragma_index_list(m.name) AS l WHERE l.origin = 'pk')"
+    ") ORDER BY tbl, idx, seq"
+)
+
+SQLITE_FOREIGN_KEYS_QUERY = (
+    "SELECT m.name, f.id, f.\"from\", f.\"table\", f.\"to\" "
+    "FROM sqlite_master AS m JOIN pragma_foreign_key_list(m.name) AS f "
+    "WHERE m.type = 'table' "
+    "ORDER BY m.name, f.id, f.seq"
+)
+
+SQLITE_TABLES_QUERY = "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"
+
+_memory_databases = count()
+
+
+def _query_cost(plan):
+    """Optimizer cost from an EXPLAIN FORMAT=JSON document, or None."""
+    block = plan.get("query_block", {})
+    cost = block.get("cost_info", {}).get("query_cost")
+    if cost is None:
+        # UNION plans keep the cost on each member query
+        specs = block.get("union_result", {}).get("query_specifications", [])
+        costs = [_query_cost(spec) for spec in specs]
+        if not costs or None in costs:
+            return None
+        return sum(costs)
+    return float(cost)
+
+
+class Backend:
+    """
+    Interface of an execution backend.
+
+    Connections returned by `connect()` have cursor(), commit(), rollback()
+    and close(), and close when a `with` block ends; cursors are context
+    managers with the DB-API execute / executemany / fetch methods,
+    `description` and `rowcount`.
+    """
+
+    name = None
+    placeholder = "%s"  # parameter marker the driver expects
+
+    def connect(self):
+        """A new connection, or None when the database cannot be reached."""
+        raise NotImplementedError
+
+    @contextmanager
+    def statement_cursor(self, conn, query, prepared=None):
+        """
+        Execute `query` on `conn` and yield the cursor holding its result.
+        `prepared` is (template, params, key) from compiler.parameterize, or
+        None to send the text as is.
+        """
+        operation = self.operation(prepared[0], prepared[1]) if prepared is not None else None
+        with conn.cursor() as cursor:
+            if operation is None:
+                with span("statement", DB, sql=query):
+                    cursor.execute(query)
+            else:
+                with span("statement", DB, sql=operation):
+                    cursor.execute(operation, self.parameters(prepared[1]))
+            yield cursor
+
+    def operation(self, template, params):
+        """`template` (with %s markers) in this driver's parameter style, or None when it cannot be converted."""
+        if self.placeholder == "%s":
+            return template
+        pieces = template.split("%s")
+        if len(pieces) != len(params) + 1:
+            return None
+        return self.placeholder.join(pieces)
+
+    def parameters(self, params):
+        """Parameter values (from compiler.parameterize) in types the driver accepts."""
+        return params
+
+    def interrupt(self, conn):
+        """
+        Stop the statement running on `conn` (called from another thread);
+        the connection stays usable. False when nothing was interrupted.
+        """
+        return False
+
+    @contextmanager
+    def stream_cursor(self, query):
+        """Yield a cursor that `query` was executed on, for reading its result with fetchmany."""
+        raise NotImplementedError
+
+    def create_catalog(self, **settings):
+        """SchemaCatalog reading this backend's metadata."""
+        raise NotImplementedError
+
+    def explain(self, query):
+        """The backend's plan for `query`, or None when it cannot be explained."""
+        raise NotImplementedError
+
+    def explain_cost(self, query):
+        """Estimated cost of `query`, or None when the backend has no cost estimate for it."""
+        return None
+
+    def list_tables(self):
+        """Names of the tables of the database."""
+        raise NotImplementedError
+
+    def _fetch(self, sql):
+        conn = self.connect()
+        if conn is None:
+            return None
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+                return cursor.fetchall()
+        finally:
+            conn.close()
+
+
+class MySQLBackend(Backend):
+    """The MySQL server configured in db_config, through its connection pool."""
+
+    name = "mysql"
+
+    def __init__(self, connection_factory=get_connection):
+        self.connection_factory = connection_factory
+
+    def connect(self):
+        return self.connection_factory()
+
+    @contextmanager
+    def statement_cursor(self, conn, query, prepared=None):
+        # A server-side prepared statement is cached on the pooled connection
+        # by query fingerprint, so queries differing only in literal values
+        # are parsed by the server once per connection
+        if prepared is None or not hasattr(conn, "prepared_cursor"):
+            with super().statement_cursor(conn, query) as cursor:
+                yield cursor
+            return
+        template, params, key = prepared
+        cursor, template = conn.prepared_cursor(key, template)
+        try:
+            with span("statement", DB, sql=template):
+                cursor.execute(template, params)
+            yield cursor
+        except Exception:
+            conn.drop_prepared(key)
+            raise
+
+    @contextmanager
+    def stream_cursor(self, query):
+        conn = self.connect()
+        if conn is None:
+            raise mysql.connector.Error("Could not connect to the database")
+        cursor = None
+        try:
+            cursor = conn.cursor(buffered=False)
+            with span("stream", DB, sql=query):
+                cursor.execute(query)
+            yield cursor
+        finally:
+            if cursor is not None and conn.unread_result:
+                # The row cap (or an early break) left rows on the wire; draining
+                # them would read the whole result, so drop the connection instead
+                conn.discard()
+            else:
+                if cursor is not None:
+                    cursor.close()
+                conn.close()
+
+    def interrupt(self, conn):
+        try:
+            connection_id = int(conn.connection_id)
+            # A separate physical connection: the pool may be exhausted by the stuck queries
+            killer = create_connection()
+        except Exception:
+            return False
+        try:
+            cursor = killer.cursor()
+            cursor.execute(f"KILL QUERY {connection_id}")
+            cursor.close()
+            return True
+        except Exception:
+            return False
+        finally:
+            killer.close()
+
+    def create_catalog(self, **settings):
+        return SchemaCatalog(connection_factory=self.connection_factory, **settings)
+
+    def explain(self, query):
+        conn = self.connect()
+        if conn is None:
+            return None
+        try:
+            with span("explain", DB), conn.cursor() as cursor:
+                cursor.execute(f"EXPLAIN FORMAT=JSON {query.strip().rstrip(';')}")
+                row = cursor.fetchone()
+            plan = row[0]
+            if isinstance(plan, (bytes, bytearray)):
+                plan = plan.decode()
+            return json.loads(plan)
+        except Exception:
+            return None
+        finally:
+            conn.close()
+
+    def explain_cost(self, query):
+        plan = self.explain(query)
+        return _query_cost(plan) if plan is not None else None
+
+    def list_tables(self):
+        return [row[0] for row in self._fetch("SHOW TABLES") or ()]
+
+
+class _SQLiteCursor:
+    """sqlite3 cursor usable as a context manager, like the MySQL driver's."""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._raw.close()
+        return False
+
+
+class SQLiteConnection:
+    """sqlite3 connection that closes when its `with` block ends, like a pooled MySQL connection."""
+
+    unread_result = False
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def cursor(self, **options):
+        # MySQL cursor options (buffered, prepared, ...) have no SQLite equivalent
+        return _SQLiteCursor(self._raw.cursor())
+
+    def discard(self):
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._raw.close()
+        return False
+
+
+class SQLiteCatalog(SchemaCatalog):
+    """SchemaCatalog that reads its metadata from a SQLite database."""
+
+    def _fetch_all(self):
+        return self._query(SQLITE_COLUMNS_QUERY.format(condition=""))
+
+    def _fetch_tables(self, table_names):
+        placeholders = ", ".join("?" * len(table_names))
+        return self._query(SQLITE_COLUMNS_QUERY.format(condition=f"AND m.name IN ({placeholders}) "),
+                           tuple(table_names))
+
+    def _fetch_row_counts(self):
+        # SQLite keeps no row-count estimates
+        tables = self._query(SQLITE_TABLES_QUERY)
+        if tables is None:
+            return None
+        return [(table, self._query(f'SELECT COUNT(*) FROM "{table}"')[0][0]) for table, in tables]
+
+    def _fetch_indexes(self):
+        return self._query(SQLITE_INDEXES_QUERY)
+
+    def _fetch_keys(self):
+        return self._query(SQLITE_KEYS_QUERY)
+
+    def _fetch_foreign_keys(self):
+        # SQLite only enforces foreign keys on connections that turn them on,
+        # and never checks rows written before; join elimination takes them
+        # as guarantees, so they count only when connections enforce them by
+        # default and no stored row violates them
+        enforced = self._query("PRAGMA foreign_keys")
+        if not enforced or not enforced[0][0] or self._query("PRAGMA foreign_key_check") != []:
+            return []
+        return self._query(SQLITE_FOREIGN_KEYS_QUERY)
+
+
+class SQLiteBackend(Backend):
+    """
+    An SQLite database in this process: a file, or with path=None an
+    in-memory database that lives as long as the backend (connections
+    share it through SQLite's memdb VFS, which lets them read concurrently).
+    """
+
+    name = "sqlite"
+    placeholder = "?"
+
+    def __init__(self, path=None):
+        self.path = path
+        if path is None:
+            self._uri = f"file:/sqlc{os.getpid()}_{next(_memory_databases)}?vfs=memdb"
+            # An in-memory database lives as long as one connection to it is open
+            self._keeper = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+        else:
+            self._uri = None
+            self._keeper = None
+
+    def connect(self):
+        if self._uri is not None:
+            raw = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+        else:
+            raw = sqlite3.connect(self.path, check_same_thread=False)
+        return SQLiteConnection(raw)
+
+    @contextmanager
+    def stream_cursor(self, query):
+        # sqlite3 steps through the result as rows are fetched, so nothing needs draining
+        with self.connect() as conn, conn.cursor() as cursor:
+            with span("stream", DB, sql=query):
+                cursor.execute(query)
+            yield cursor
+
+    def interrupt(self, conn):
+        try:
+            conn.interrupt()
+            return True
+        except sqlite3.Error:
+            # Closed: the statement already finished
+            return False
+
+    def parameters(self, params):
+        # sqlite3 cannot bind Decimal; its REAL columns are doubles anyway
+        return [float(value) if isinstance(value, Decimal) else value for value in params]
+
+    def create_catalog(self, **settings):
+        return SQLiteCatalog(connection_factory=self.connect, **settings)
+
+    def explain(self, query):
+        try:
+            return self._fetch(f"EXPLAIN QUERY PLAN {query.strip().rstrip(';')}")
+        except sqlite3.Error:
+            return None
+
+    def list_tables(self):
+        return [row[0] for row in self._fetch(SQLITE_TABLES_QUERY) or ()]
+
+    def executescript(self, script):
+        """Run several `;`-separated statements, e.g. to load a dev dataset."""
+        with self.connect() as conn:
+            conn.executescript(script)
+            conn.commit()
+
+    def close(self):
+        if self._keeper is not None:
+            self._keeper.close()
+            self._keeper = None
+
+
+def create_backend(spec):
+    """Backend for an `SQLC_BACKEND` value: "mysql", "sqlite" or "sqlite:<path>"."""
+    kind, _, path = spec.partition(":")
+    kind = kind.strip().lower()
+    if kind == "mysql":
+        return MySQLBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(path or None)
+    raise ValueError(f"Unknown backend {spec!r}; expected 'mysql', 'sqlite' or 'sqlite:<path>'")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the process-wide backend, creating it from `SQLC_BACKEND` on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(BACKEND)
+    return _backend
+
+
+def set_backend(new_backend):
+    """Switch the process-wide backend; the schema catalog is replaced by one reading from it."""
+    global _backend
+    with _backend_lock:
+        _backend = new_backend
+    set_catalog(new_backend.create_catalog())
+    # Imported here because result_cache depends (through the compiler) on this module
+    from result_cache import get_result_cache
+    # Cached results came from the previous database
+    get_result_cache().clear()
+    return new_backend
@@ -0,0 +1,225 @@
+"""
+Throughput benchmark for the compiler phases.
+
+Generates a reproducible corpus of small, deep-join, wide-IN and
+nested-subquery queries of increasing size and measures queries/sec and
+peak memory for the lexer, the syntax parser, parse-tree building and the
+optimizer separately. Catalog lookups are served by an in-memory SQLite
+database instead of MySQL. Results are written as JSON so runs from two
+commits can be compared:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+from backends import SQLiteBackend
+from catalog import get_catalog, set_catalog
+from column_stats import StatisticsStore, get_statistics, set_statistics
+from lexer import tokenize
+from optimiser import SQLQueryOptimizer
+from parser import SQLSyntaxParser
+
+DEFAULT_SIZES = (1, 2, 4, 8, 16)
+TABLE_COLUMNS = (("id", "INTEGER"), ("parent_id", "INTEGER"), ("name", "TEXT"), ("value", "REAL"))
+
+
+def create_database(tables):
+    """In-memory SQLite backend holding empty benchmark tables with the given names."""
+    backend = SQLiteBackend()
+    columns = ", ".join(f"{name} {column_type}" for name, column_type in TABLE_COLUMNS)
+    backend.executescript("".join(
+        f"CREATE TABLE {table} ({columns}); "
+        f"CREATE UNIQUE INDEX {table}_id ON {table} (id); "
+        f"CREATE INDEX {table}_parent_id ON {table} (parent_id); " for table in tables))
+    return backend
+
+
+def table_name(index):
+    return f"t{index}"
+
+
+def small_query(size, rng):
+    predicates = ["1=1"] + [f"value > {rng.randint(0, 1000)}" for _ in range(size)]
+    return f"SELECT id, name FROM t0 WHERE {' AND '.join(predicates)}"
+
+
+def deep_join_query(size, rng):
+    query = "SELECT t0.id, t0.name FROM t0"
+    for i in range(1, size + 1):
+        query += f" JOIN {table_name(i)} ON {table_name(i - 1)}.id = {table_name(i)}.parent_id"
+    return query + f" WHERE t0.value > {rng.randint(0, 1000)}"
+
+
+def wide_in_query(size, rng):
+    values = ", ".join(str(rng.randint(0, 10 ** 6)) for _ in range(size * 8))
+    chain = " OR ".join(f"parent_id = {rng.randint(0, 1000)}" for _ in range(size + 1))
+    return f"SELECT * FROM t0 WHERE id IN ({values}) AND ({chain})"
+
+
+def nested_subquery_query(size, rng):
+    query = f"SELECT parent_id FROM {table_name(size)} WHERE value > {rng.randint(0, 1000)}"
+    for i in range(size - 1, -1, -1):
+        query = f"SELECT id FROM {table_name(i)} WHERE id IN ({query})"
+    return query
+
+
+GENERATORS = {
+    "small": small_query,
+    "deep_join": deep_join_query,
+    "wide_in": wide_in_query,
+    "nested_subquery": nested_subquery_query,
+}
+
+
+def generate_corpus(sizes=DEFAULT_SIZES, variants=20, seed=0):
+    """Return {family: {size: [query, ...]}}; the same seed gives the same corpus."""
+    rng = random.Random(seed)
+    return {family: {size: [generate(size, rng) for _ in range(variants)] for size in sizes}
+            for family, generate in GENERATORS.items()}
+
+
+def _parse(tokens):
+    return SQLSyntaxParser(tokens).parse()
+
+
+def _parse_tree(tokens):
+    return SQLSyntaxParser(tokens).build_parse_tree()
+
+
+def _optimize(query):
+    return SQLQueryOptimizer(query).optimize()
+
+
+# phase name -> (function, whether it takes the token buffer instead of the text)
+PHASES = {
+    "lexer": (tokenize, False),
+    "parse": (_parse, True),
+    "parse_tree": (_parse_tree, True),
+    "optimize": (_optimize, False),
+}
+
+
+def measure(function, inputs, min_time=0.2):
+    """Queries/sec over at least `min_time` seconds, and the peak KiB of one pass."""
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        for item in inputs:
+            function(item)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+
+    tracemalloc.start()
+    try:
+        for item in inputs:
+            function(item)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "queries_per_sec": round(runs * len(inputs) / elapsed, 1),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, variants=20, seed=0, phases=None, min_time=0.2):
+    corpus = generate_corpus(sizes, variants, seed)
+    previous = get_catalog()
+    previous_statistics = get_statistics()
+    database = create_database(table_name(i) for i in range(max(sizes) + 1))
+    set_catalog(database.create_catalog())
+    # No column statistics, so results do not depend on a local stats file
+    set_statistics(StatisticsStore(path=None))
+    results = {}
+    try:
+        for family, by_size in corpus.items():
+            for size, queries in by_size.items():
+                tokens = [tokenize(query) for query in queries]
+                row = results.setdefault(family, {}).setdefault(str(size), {})
+                for phase in phases or PHASES:
+                    function, takes_tokens = PHASES[phase]
+                    row[phase] = measure(function, tokens if takes_tokens else queries, min_time)
+    finally:
+        set_catalog(previous)
+        set_statistics(previous_statistics)
+        database.close()
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "variants": variants,
+            "sizes": list(sizes),
+        },
+        "results": results,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current, threshold=0.10):
+    """Lines describing throughput changes larger than `threshold` between two result files."""
+    lines = []
+    for family, by_size in current["results"].items():
+        for size, by_phase in by_size.items():
+            for phase, metrics in by_phase.items():
+                try:
+                    before = baseline["results"][family][size][phase]["queries_per_sec"]
+                except KeyError:
+                    continue
+                change = metrics["queries_per_sec"] / before - 1 if before else 0.0
+                if abs(change) >= threshold:
+                    label = "faster" if change > 0 else "SLOWER"
+                    lines.append(f"{family}[{size}] {phase}: {before:.0f} -> "
+                                 f"{metrics['queries_per_sec']:.0f} q/s ({change:+.0%}, {label})")
+    return lines
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Benchmark the SQL compiler phases.")
+    arg_parser.add_argument("--output", default="benchmark_results.json")
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    arg_parser.add_argument("--variants", type=int, default=20, help="queries per family and size")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--phases", nargs="+", choices=list(PHASES))
+    arg_parser.add_argument("--min-time", type=float, default=0.2, help="seconds to time each phase")
+    arg_parser.add_argument("--compare", metavar="BASELINE", help="result file to compare against")
+    args = arg_parser.parse_args(argv)
+
+    report = run_benchmarks(args.sizes, args.variants, args.seed, args.phases, args.min_time)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for family, by_size in report["results"].items():
+        for size, by_phase in by_size.items():
+            cells = ", ".join(f"{phase} {m['queries_per_sec']:.0f} q/s {m['peak_kib']:.0f} KiB"
+                              for phase, m in by_phase.items())
+            print(f"{family:<16} {size:>3}: {cells}")
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        changes = compare(baseline, report)
+        print("\n".join(changes) if changes else "No throughput change above 10%.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from db_config import get_connection
+from profiler import DB, span
+
+# Every table, column and type of the current database in one round trip
+BULK_COLUMNS_QUERY = (
+    "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE "
+    "FROM information_schema.COLUMNS "
+    "WHERE TABLE_SCHEMA = DATABASE() "
+    "ORDER BY TABLE_NAME, ORDINAL_POSITION"
+)
+
+# Columns of a few tables; {tables} is one %s placeholder per table name
+TABLES_COLUMNS_QUERY = (
+    "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE "
+    "FROM information_schema.COLUMNS "
+    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({tables}) "
+    "ORDER BY TABLE_NAME, ORDINAL_POSITION"
+)
+
+# Row-count estimates and the leading column of every index, for the join orderer
+TABLE_ROWS_QUERY = (
+    "SELECT TABLE_NAME, TABLE_ROWS "
+    "FROM information_schema.TABLES "
+    "WHERE TABLE_SCHEMA = DATABASE()"
+)
+
+INDEX_COLUMNS_QUERY = (
+    "SELECT TABLE_NAME, COLUMN_NAME, NON_UNIQUE "
+    "FROM information_schema.STATISTICS "
+    "WHERE TABLE_SCHEMA = DATABASE() AND SEQ_IN_INDEX = 1"
+)
+
+# Every column of every index, for the unique keys (and which of their columns are NOT NULL)
+KEY_COLUMNS_QUERY = (
+    "SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME, NON_UNIQUE, NULLABLE "
+    "FROM information_schema.STATISTICS "
+    "WHERE TABLE_SCHEMA = DATABASE() "
+    "ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX"
+)
+
+FOREIGN_KEYS_QUERY = (
+    "SELECT TABLE_NAME, CONSTRAINT_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME "
+    "FROM information_schema.KEY_COLUMN_USAGE "
+    "WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_SCHEMA = DATABASE() "
+    "ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION"
+)
+
+DDL_PATTERN = re.compile(
+    r'^\s*(?:CREATE|ALTER|DROP|TRUNCATE|RENAME)\s+'
+    r'(?:TEMPORARY\s+)?TABLE\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?`?(\w+)`?',
+    flags=re.IGNORECASE
+)
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, (bytes, bytearray)) else value
+
+
+class SchemaCatalog:
+    """
+    In-memory cache of table and column metadata.
+
+    The first lookup loads the whole schema from information_schema in a
+    single query. Entries expire after `ttl` seconds and at most `max_tables`
+    tables are kept (least recently used are evicted first). Evicted or
+    invalidated tables are reloaded on their next lookup; `describe_tables`
+    reloads all the tables it is asked about in one query.
+    `version` is bumped whenever the cached schema changes, so dependent
+    caches can tell when their entries went stale. Row counts and index
+    metadata, and key constraints, are loaded separately, on first use,
+    under the same TTL.
+    """
+
+    def __init__(self, ttl=300, max_tables=512, connection_factory=get_connection):
+        self.ttl = ttl
+        self.max_tables = max_tables
+        self.connection_factory = connection_factory
+        self.version = 0
+        self._tables = OrderedDict()   # lower name -> (loaded_at, name, [(column, type), ...])
+        self._known = set()            # lower names present in the last bulk load
+        self._loaded_at = None
+        self._signature = None         # hash of the last bulk load, to detect real schema changes
+        self._stats = {}               # lower name -> (row count or None, {lower column: unique})
+        self._stats_loaded_at = None
+        self._constraints = {}         # lower name -> ([unique key], [foreign key], {lower NOT NULL column})
+        self._constraints_loaded_at = None
+        self._lock = threading.RLock()
+
+    def _query(self, sql, params=()):
+        conn = self.connection_factory()
+        if conn is None:
+            return None
+        try:
+            with span("catalog query", DB, sql=sql):
+                cursor = conn.cursor()
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+                cursor.close()
+            return rows
+        finally:
+            conn.close()
+
+    def _fetch_all(self):
+        return self._query(BULK_COLUMNS_QUERY)
+
+    def _fetch_tables(self, table_names):
+        placeholders = ", ".join(["%s"] * len(table_names))
+        return self._query(TABLES_COLUMNS_QUERY.format(tables=placeholders), tuple(table_names))
+
+    def _group_rows(self, rows):
+        tables = OrderedDict()
+        for row in rows:
+            table, column, column_type = (_decode(value) for value in row)
+            tables.setdefault(table, []).append((column, column_type))
+        return tables
+
+    def _store(self, name, columns, now):
+        key = name.lower()
+        self._tables[key] = (now, name, columns)
+        self._tables.move_to_end(key)
+        while len(self._tables) > self.max_tables:
+            self._tables.popitem(last=False)
+
+    def _snapshot_fresh(self, now):
+        return self._loaded_at is not None and now - self._loaded_at < self.ttl
+
+    def load(self):
+        """Reload every table of the database in one query."""
+        rows = self._fetch_all()
+        if rows is None:
+            return False
+        now = time.monotonic()
+        grouped = self._group_rows(rows)
+        signature = hash(tuple((name, tuple(columns)) for name, columns in grouped.items()))
+        with self._lock:
+            self._tables.clear()
+            self._known.clear()
+            for name, columns in grouped.items():
+                self._known.add(name.lower())
+                self._store(name, columns, now)
+            self._loaded_at = now
+            if signature != self._signature:
+                self._signature = signature
+                self.version += 1
+        return True
+
+    def _lookup_many(self, table_names):
+        """{lower name: entry or None} for `table_names`, reloading stale tables in at most one query."""
+        now = time.monotonic()
+        found = {}
+        stale = {}  # lower name -> (name, cached entry or None)
+        with self._lock:
+            snapshot_fresh = self._snapshot_fresh(now)
+            for table_name in table_names:
+                key = table_name.lower()
+                if key in found or key in stale:
+                    continue
+                entry = self._tables.get(key)
+                if entry is not None and now - entry[0] < self.ttl:
+                    self._tables.move_to_end(key)
+                    found[key] = entry
+                elif snapshot_fresh and key not in self._known:
+                    found[key] = None
+                else:
+                    stale[key] = (table_name, entry)
+        if not stale:
+            return found
+
+        if not snapshot_fresh:
+            if not self.load():
+                found.update(dict.fromkeys(stale))
+                return found
+            with self._lock:
+                for key, (table_name, _) in list(stale.items()):
+                    entry = self._tables.get(key)
+                    if entry is not None or key not in self._known:
+                        found[key] = entry
+                        del stale[key]
+                    else:
+                        # Known but evicted by max_tables
+                        stale[key] = (table_name, None)
+            if not stale:
+                return found
+
+        # Evicted, expired or invalidated: reload just these tables
+        rows = self._fetch_tables([table_name for table_name, _ in stale.values()])
+        if rows is None:
+            found.update(dict.fromkeys(stale))
+            return found
+        grouped = {name.lower(): (name, columns) for name, columns in self._group_rows(rows).items()}
+        with self._lock:
+            for key, (_, entry) in stale.items():
+                if key not in grouped:
+                    if entry is not None:
+                        self.version += 1
+                    self._known.discard(key)
+                    self._tables.pop(key, None)
+                    found[key] = None
+                    continue
+                name, columns = grouped[key]
+                if entry is not None and entry[2] != columns:
+                    self.version += 1
+                self._known.add(key)
+                self._store(name, columns, now)
+                found[key] = self._tables[key]
+        return found
+
+    def _lookup(self, table_name):
+        return self._lookup_many([table_name])[table_name.lower()]
+
+    def describe_tables(self, table_names):
+        """{lower name: [(column, type), ...], or None when the table does not exist}."""
+        return {key: entry[2] if entry else None for key, entry in self._lookup_many(table_names).items()}
+
+    def table_exists(self, table_name):
+        return self._lookup(table_name) is not None
+
+    def get_columns(self, table_name):
+        entry = self._lookup(table_name)
+        return [column for column, _ in entry[2]] if entry else []
+
+    def has_column(self, table_name, column_name):
+        entry = self._lookup(table_name)
+        if entry is None:
+            return False
+        wanted = column_name.lower()
+        return any(column.lower() == wanted for column, _ in entry[2])
+
+    def get_column_type(self, table_name, column_name):
+        entry = self._lookup(table_name)
+        if entry is None:
+            return None
+        wanted = column_name.lower()
+        for column, column_type in entry[2]:
+            if column.lower() == wanted:
+                return column_type
+        return None
+
+    def _fetch_row_counts(self):
+        return self._query(TABLE_ROWS_QUERY)
+
+    def _fetch_indexes(self):
+        return self._query(INDEX_COLUMNS_QUERY)
+
+    def load_stats(self):
+        """Reload row-count estimates and indexed columns for every table."""
+        counts = self._fetch_row_counts()
+        indexes = self._fetch_indexes()
+        stats = {}
+        for table, rows in counts or ():
+            stats[_decode(table).lower()] = (None if rows is None else int(rows), {})
+        for table, column, non_unique in indexes or ():
+            _, columns = stats.setdefault(_decode(table).lower(), (None, {}))
+            column = _decode(column).lower()
+            columns[column] = columns.get(column, False) or not int(non_unique)
+        with self._lock:
+            # Kept even when the database is unreachable, so lookups do not retry until the TTL runs out
+            self._stats = stats
+            self._stats_loaded_at = time.monotonic()
+        return counts is not None
+
+    def _table_stats(self, table_name):
+        with self._lock:
+            fresh = self._stats_loaded_at is not None and time.monotonic() - self._stats_loaded_at < self.ttl
+        if not fresh:
+            self.load_stats()
+        return self._stats.get(table_name.lower(), (None, {}))
+
+    def get_row_count(self, table_name):
+        """Estimated number of rows in the table, or None when unknown."""
+        return self._table_stats(table_name)[0]
+
+    def get_indexes(self, table_name):
+        """{lower column name: unique} for every column that leads an index."""
+        return self._table_stats(table_name)[1]
+
+    def _fetch_keys(self):
+        return self._query(KEY_COLUMNS_QUERY)
+
+    def _fetch_foreign_keys(self):
+        return self._query(FOREIGN_KEYS_QUERY)
+
+    def load_constraints(self):
+        """Reload the unique and foreign keys of every table."""
+        keys = self._fetch_keys()
+        foreign_keys = self._fetch_foreign_keys()
+        indexes = OrderedDict()  # (lower table, index) -> (unique, [lower column, ...])
+        constraints = {}
+        for table, index, column, non_unique, nullable in keys or ():
+            table, column = _decode(table).lower(), _decode(column).lower()
+            unique, columns = indexes.setdefault((table, _decode(index)), (not int(non_unique), []))
+            columns.append(column)
+            if not _decode(nullable):
+                constraints.setdefault(table, ([], [], set()))[2].add(column)
+        for (table, index), (unique, columns) in indexes.items():
+            if unique:
+                unique_keys = constraints.setdefault(table, ([], [], set()))[0]
+                # The primary key goes first
+                unique_keys.insert(0 if index == "PRIMARY" else len(unique_keys), tuple(columns))
+        references = OrderedDict()  # (lower table, constraint) -> (lower referenced table, [(column, referenced)])
+        for table, constraint, column, referenced_table, referenced_column in foreign_keys or ():
+            if referenced_table is None:
+                continue
+            _, pairs = references.setdefault((_decode(table).lower(), _decode(constraint)),
+                                             (_decode(referenced_table).lower(), []))
+            pairs.append((_decode(column).lower(), _decode(referenced_column).lower()))
+        for (table, _), (referenced_table, pairs) in references.items():
+            columns, referenced_columns = zip(*pairs)
+            constraints.setdefault(table, ([], [], set()))[1].append((columns, referenced_table, referenced_columns))
+        with self._lock:
+            self._constraints = constraints
+            self._constraints_loaded_at = time.monotonic()
+        return keys is not None
+
+    def _table_constraints(self, table_name):
+        with self._lock:
+            fresh = (self._constraints_loaded_at is not None
+                     and time.monotonic() - self._constraints_loaded_at < self.ttl)
+        if not fresh:
+            self.load_constraints()
+        return self._constraints.get(table_name.lower(), ([], [], set()))
+
+    def get_unique_keys(self, table_name):
+        """Column tuples (lower case) of the primary key, then of every other unique index."""
+        return self._table_constraints(table_name)[0]
+
+    def get_foreign_keys(self, table_name):
+        """(columns, lower referenced table, referenced columns) for each foreign key of the table."""
+        return self._table_constraints(table_name)[1]
+
+    def is_not_null(self, table_name, column_name):
+        """True when the column is known to be NOT NULL (only indexed columns are known)."""
+        return column_name.lower() in self._table_constraints(table_name)[2]
+
+    def invalidate(self, table_name=None):
+        """Forget one table (it is re-checked on next lookup) or the whole catalog."""
+        with self._lock:
+            if table_name is None:
+                self._tables.clear()
+                self._known.clear()
+                self._loaded_at = None
+            else:
+                key = table_name.lower()
+                self._tables.pop(key, None)
+                self._known.add(key)
+            self._stats_loaded_at = None
+            self._constraints_loaded_at = None
+            self.version += 1
+
+    def observe_query(self, query):
+        """Invalidate the affected table when `query`, which has just run, is a DDL statement."""
+        match = DDL_PATTERN.match(query)
+        if match:
+            self.invalidate(match.group(1))
+            return True
+        return False
+
+
+catalog = None
+
+
+def get_catalog():
+    global catalog
+    if catalog is None:
+        # Imported here because backends builds on this module
+        from backends import get_backend
+        catalog = get_backend().create_catalog()
+    return catalog
+
+
+def set_catalog(new_catalog):
+    global catalog
+    catalog = new_catalog
+    return catalog
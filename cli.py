@@ -0,0 +1,200 @@
+"""
+Batch compiler: runs the lexer, parser and optimizer over a file of SQL
+statements on a process pool and writes one JSON line per statement, in
+input order.
+
+    python cli.py queries.sql > compiled.jsonl
+    cat queries.sql | python cli.py - --workers 8 --schema schema.json
+
+`--schema` takes a JSON file of {"table": ["column", ...]} and compiles
+against it instead of the database (e.g. in CI); `--offline` compiles
+against an empty schema. Throughput is reported on stderr.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from catalog import SchemaCatalog, set_catalog
+from compiler import compile_query
+
+
+class OfflineCatalog(SchemaCatalog):
+    """SchemaCatalog served from a {table: [column, ...]} mapping instead of the database."""
+
+    def __init__(self, tables=None, ttl=float("inf")):
+        self._schema = {table: [(column, None) for column in columns] for table, columns in (tables or {}).items()}
+        super().__init__(ttl=ttl, connection_factory=lambda: None)
+
+    def _fetch_all(self):
+        return [(table, column, column_type) for table, columns in self._schema.items()
+                for column, column_type in columns]
+
+    def _fetch_tables(self, table_names):
+        wanted = {name.lower() for name in table_names}
+        return [row for row in self._fetch_all() if row[0].lower() in wanted]
+
+    def _fetch_row_counts(self):
+        return []
+
+    def _fetch_indexes(self):
+        return []
+
+    def _fetch_keys(self):
+        return []
+
+    def _fetch_foreign_keys(self):
+        return []
+
+
+def split_statements(text):
+    """Split SQL text on semicolons outside quotes and comments; empty statements are dropped."""
+    statements = []
+    start = 0
+    i = 0
+    length = len(text)
+    while i < length:
+        char = text[i]
+        if char in "'\"`":
+            i += 1
+            while i < length:
+                if text[i] == "\\" and char != "`":
+                    i += 2
+                    continue
+                if text[i] == char:
+                    if i + 1 < length and text[i + 1] == char:
+                        i += 2
+                        continue
+                    break
+                i += 1
+        elif text.startswith("--", i) or char == "#":
+            newline = text.find("\n", i)
+            i = length if newline == -1 else newline
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = length if end == -1 else end + 1
+        elif char == ";":
+            statements.append(text[start:i])
+            start = i + 1
+        i += 1
+    statements.append(text[start:])
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+def compile_one(index, query, include_tokens=True):
+    result = {"index": index, "query": query}
+    try:
+        compiled = compile_query(query)
+        if include_tokens:
+            result["tokens"] = compiled.token_list
+        result["syntax"] = compiled.syntax_result
+        steps = compiled.optimization_steps
+        result["steps"] = steps
+        result["optimized"] = steps[-1][1]
+        result["error"] = None
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def compile_chunk(chunk, include_tokens=True):
+    return [compile_one(index, query, include_tokens) for index, query in chunk]
+
+
+def _init_worker(schema):
+    # stdout carries the JSONL stream; diagnostics (e.g. connection errors) go to stderr
+    sys.stdout = sys.stderr
+    if schema is not None:
+        set_catalog(OfflineCatalog(schema))
+
+
+def _chunks(statements, size):
+    chunk = []
+    for item in enumerate(statements):
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def compile_parallel(statements, workers=None, chunk_size=64, include_tokens=True, schema=None):
+    """
+    Yield compile results for `statements` in input order.
+
+    Work is handed out in chunks of `chunk_size` statements; at most two
+    chunks per worker are in flight, so memory stays bounded however long
+    the input is. workers=1 compiles in this process.
+    """
+    if workers == 1:
+        if schema is not None:
+            set_catalog(OfflineCatalog(schema))
+        for chunk in _chunks(statements, chunk_size):
+            with contextlib.redirect_stdout(sys.stderr):
+                results = compile_chunk(chunk, include_tokens)
+            yield from results
+        return
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(schema,)) as pool:
+        pending = deque()
+        for chunk in _chunks(statements, chunk_size):
+            pending.append(pool.submit(compile_chunk, chunk, include_tokens))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Compile a file of SQL statements to JSON lines.")
+    arg_parser.add_argument("input", help="SQL file, or - for stdin")
+    arg_parser.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    arg_parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    arg_parser.add_argument("--chunk-size", type=int, default=64, help="statements per work unit")
+    arg_parser.add_argument("--no-tokens", action="store_true", help="leave the token lists out of the output")
+    schema_group = arg_parser.add_mutually_exclusive_group()
+    schema_group.add_argument("--schema", help="JSON file of {table: [columns]} to compile against")
+    schema_group.add_argument("--offline", action="store_true", help="compile against an empty schema")
+    arg_parser.add_argument("--fail-on-error", action="store_true",
+                            help="exit with status 1 if any statement has a syntax or compile error")
+    args = arg_parser.parse_args(argv)
+
+    if args.input == "-":
+        text = sys.stdin.read()
+    else:
+        with open(args.input) as f:
+            text = f.read()
+    schema = {} if args.offline else None
+    if args.schema:
+        with open(args.schema) as f:
+            schema = json.load(f)
+
+    statements = split_statements(text)
+    output = open(args.output, "w") if args.output else sys.stdout
+    started = time.perf_counter()
+    count = failures = 0
+    try:
+        for result in compile_parallel(statements, args.workers, args.chunk_size, not args.no_tokens, schema):
+            output.write(json.dumps(result) + "\n")
+            count += 1
+            if result["error"] or result.get("syntax", "").startswith("Syntax Error"):
+                failures += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed else 0.0
+    print(f"Compiled {count} statements in {elapsed:.2f}s ({rate:,.0f} statements/sec), "
+          f"{failures} with errors", file=sys.stderr)
+    if args.fail_on_error and failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
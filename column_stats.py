@@ -0,0 +1,371 @@
+"""
+Column statistics for cardinality estimation.
+
+Tables are sampled through the executor and summarised per column: number of
+distinct values (NDV), null fraction, min/max and an equi-depth histogram.
+Statistics are kept in a local JSON file and refreshed incrementally: only
+tables whose statistics are too old, whose row count drifted or whose
+columns changed are sampled again. `selectivity()` turns a predicate into
+the estimated fraction of rows that satisfy it.
+
+    python column_stats.py orders customers     # collect
+    python column_stats.py --refresh            # re-sample stale tables
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import date, datetime, time as time_of_day, timedelta
+from decimal import Decimal
+
+from catalog import get_catalog
+from sql_ast import Between, BinaryOp, Column, InList, IsNull, Literal, UnaryOp
+
+STATS_PATH = os.environ.get('SQLC_STATS_PATH', 'column_stats.json')
+DEFAULT_SAMPLE_SIZE = 10000
+DEFAULT_BUCKETS = 32
+DEFAULT_MAX_AGE = 24 * 3600     # seconds before statistics are re-sampled
+ROW_COUNT_DRIFT = 0.2           # re-sample when the row count moved by more than this fraction
+DEFAULT_SELECTIVITY = 1 / 3     # predicates the statistics cannot answer
+
+
+def _json_value(value):
+    """Sample values as JSON-friendly, still comparable, scalars."""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time_of_day)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode(errors="replace")
+    return str(value)
+
+
+def estimate_ndv(sample_size, distinct, singletons, total_rows):
+    """
+    Distinct values in the whole table from a uniform sample (Haas & Stokes
+    Duj1 estimator): n*d / (n - f1 + f1*n/N).
+    """
+    if sample_size == 0:
+        return 0
+    if total_rows <= sample_size:
+        return distinct
+    denominator = sample_size - singletons + singletons * sample_size / total_rows
+    estimate = sample_size * distinct / denominator if denominator else distinct
+    return int(min(max(estimate, distinct), total_rows))
+
+
+class ColumnStats:
+    __slots__ = ("ndv", "null_fraction", "min", "max", "histogram")
+
+    def __init__(self, ndv, null_fraction, min=None, max=None, histogram=()):
+        self.ndv = ndv
+        self.null_fraction = null_fraction
+        self.min = min
+        self.max = max
+        self.histogram = list(histogram)  # equi-depth bucket bounds, len == buckets + 1
+
+    @classmethod
+    def from_sample(cls, values, total_rows, buckets=DEFAULT_BUCKETS):
+        non_null = [_json_value(v) for v in values if v is not None]
+        null_fraction = (len(values) - len(non_null)) / len(values) if values else 0.0
+        if not non_null:
+            return cls(0, null_fraction)
+        try:
+            non_null.sort()
+        except TypeError:
+            non_null = sorted(non_null, key=str)
+        counts = Counter(non_null)
+        singletons = sum(1 for c in counts.values() if c == 1)
+        ndv = estimate_ndv(len(non_null), len(counts), singletons,
+                           max(int(total_rows * (1 - null_fraction)), len(non_null)))
+        buckets = max(1, min(buckets, len(non_null)))
+        last = len(non_null) - 1
+        histogram = [non_null[round(i * last / buckets)] for i in range(buckets + 1)]
+        return cls(ndv, null_fraction, non_null[0], non_null[-1], histogram)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def fraction_below(self, value, inclusive=False):
+        """Estimated fraction of non-null values < `value` (<= with inclusive=True)."""
+        bounds = self.histogram
+        if not bounds:
+            return DEFAULT_SELECTIVITY
+        try:
+            if value < bounds[0] or (value == bounds[0] and not inclusive):
+                return 0.0
+            if value > bounds[-1] or (value == bounds[-1] and inclusive):
+                return 1.0
+            position = (bisect_right if inclusive else bisect_left)(bounds, value)
+        except TypeError:
+            return DEFAULT_SELECTIVITY
+        buckets = len(bounds) - 1
+        low, high = bounds[position - 1], bounds[min(position, buckets)]
+        within = 0.5
+        if isinstance(value, (int, float)) and isinstance(low, (int, float)) and high != low:
+            within = min(max((value - low) / (high - low), 0.0), 1.0)
+        return min((position - 1 + within) / buckets, 1.0)
+
+    def equality(self, value):
+        if self.ndv == 0:
+            return 0.0
+        try:
+            if self.min is not None and (value < self.min or value > self.max):
+                return 0.0
+        except TypeError:
+            pass
+        return (1 - self.null_fraction) / self.ndv
+
+
+class TableStats:
+    __slots__ = ("table", "row_count", "columns", "collected_at", "sample_rows")
+
+    def __init__(self, table, row_count, columns, collected_at, sample_rows):
+        self.table = table
+        self.row_count = row_count
+        self.columns = columns          # lower column name -> ColumnStats
+        self.collected_at = collected_at
+        self.sample_rows = sample_rows
+
+    def to_dict(self):
+        return {
+            "table": self.table,
+            "row_count": self.row_count,
+            "collected_at": self.collected_at,
+            "sample_rows": self.sample_rows,
+            "columns": {name: stats.to_dict() for name, stats in self.columns.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        columns = {name: ColumnStats.from_dict(stats) for name, stats in data["columns"].items()}
+        return cls(data["table"], data["row_count"], columns, data["collected_at"], data["sample_rows"])
+
+
+class StatisticsStore:
+    """
+    Per-table column statistics, persisted as JSON at `path`.
+
+    At most `sample_size` rows are read per table; larger tables are sampled
+    with `WHERE RAND() < fraction`, streamed so memory stays bounded.
+    """
+
+    def __init__(self, path=STATS_PATH, sample_size=DEFAULT_SAMPLE_SIZE, buckets=DEFAULT_BUCKETS,
+                 max_age=DEFAULT_MAX_AGE):
+        self.path = path
+        self.sample_size = sample_size
+        self.buckets = buckets
+        self.max_age = max_age
+        self._tables = {}   # lower table name -> TableStats
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with open(self.path) as f:
+            data = json.load(f)
+        with self._lock:
+            self._tables = {name: TableStats.from_dict(stats) for name, stats in data.get("tables", {}).items()}
+
+    def save(self):
+        with self._lock:
+            data = {"tables": {name: stats.to_dict() for name, stats in self._tables.items()}}
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(data, f, indent=1)
+        os.replace(temporary, self.path)
+
+    def _sample(self, table, columns, row_count):
+        # Imported here because the executor imports the optimizer, which imports this module
+        from executor import stream_select_query
+        select = ", ".join(f"`{column}`" for column in columns)
+        query = f"SELECT {select} FROM `{table}`"
+        if row_count and row_count > self.sample_size:
+            # Oversample slightly so the row cap, not the coin flips, sets the size
+            query += f" WHERE RAND() < {min(1.2 * self.sample_size / row_count, 1.0):.6f}"
+        rows = []
+        for chunk in stream_select_query(query, chunk_size=1000, max_rows=self.sample_size):
+            rows.extend(chunk)
+        return rows
+
+    def collect(self, table, save=True):
+        """Sample `table` and replace its statistics; returns the new TableStats or None."""
+        catalog = get_catalog()
+        columns = catalog.get_columns(table)
+        if not columns:
+            return None
+        row_count = catalog.get_row_count(table)
+        rows = self._sample(table, columns, row_count)
+        if row_count is None or len(rows) < self.sample_size:
+            # The whole table was read, or the estimate is missing
+            row_count = max(row_count or 0, len(rows))
+        stats = TableStats(
+            table, row_count,
+            {column.lower(): ColumnStats.from_sample([row[i] for row in rows], row_count, self.buckets)
+             for i, column in enumerate(columns)},
+            time.time(), len(rows))
+        with self._lock:
+            self._tables[table.lower()] = stats
+        if save and self.path:
+            self.save()
+        return stats
+
+    def is_stale(self, stats, now=None):
+        now = time.time() if now is None else now
+        if now - stats.collected_at > self.max_age:
+            return True
+        catalog = get_catalog()
+        rows = catalog.get_row_count(stats.table)
+        if rows is not None and abs(rows - stats.row_count) > ROW_COUNT_DRIFT * max(stats.row_count, 1):
+            return True
+        return {column.lower() for column in catalog.get_columns(stats.table)} != set(stats.columns)
+
+    def refresh(self, tables=None):
+        """Re-sample the stale ones among `tables` (default: every table with statistics)."""
+        with self._lock:
+            known = dict(self._tables)
+        refreshed = []
+        for table in tables or [stats.table for stats in known.values()]:
+            stats = known.get(table.lower())
+            if stats is None or self.is_stale(stats):
+                if self.collect(table, save=False) is not None:
+                    refreshed.append(table)
+        if refreshed and self.path:
+            self.save()
+        return refreshed
+
+    def table(self, table):
+        return self._tables.get(table.lower())
+
+    def column(self, table, column):
+        stats = self._tables.get(table.lower())
+        return stats.columns.get(column.lower()) if stats else None
+
+    def distinct_values(self, table, column):
+        stats = self.column(table, column)
+        return stats.ndv if stats else None
+
+    def selectivity(self, table, expr):
+        """
+        Estimated fraction of `table`'s rows satisfying `expr`.
+
+        Comparisons, BETWEEN, IN, IS NULL and AND/OR/NOT combinations of them
+        are estimated from the column statistics; anything else counts as
+        DEFAULT_SELECTIVITY. Columns are matched by name only.
+        """
+        if isinstance(expr, BinaryOp):
+            if expr.op == "AND":
+                return self.selectivity(table, expr.left) * self.selectivity(table, expr.right)
+            if expr.op == "OR":
+                left, right = self.selectivity(table, expr.left), self.selectivity(table, expr.right)
+                return left + right - left * right
+            return self._comparison(table, expr)
+        if isinstance(expr, UnaryOp) and expr.op == "NOT":
+            return 1 - self.selectivity(table, expr.operand)
+        stats = self.column(table, expr.expr.name) if isinstance(getattr(expr, "expr", None), Column) else None
+        if stats is None:
+            return DEFAULT_SELECTIVITY
+        if isinstance(expr, IsNull):
+            return 1 - stats.null_fraction if expr.negated else stats.null_fraction
+        if isinstance(expr, InList) and all(isinstance(item, Literal) for item in expr.items):
+            fraction = min(sum(stats.equality(_literal(item)) for item in expr.items), 1 - stats.null_fraction)
+            return (1 - stats.null_fraction - fraction) if expr.negated else fraction
+        if isinstance(expr, Between) and isinstance(expr.low, Literal) and isinstance(expr.high, Literal):
+            fraction = (stats.fraction_below(_literal(expr.high), inclusive=True)
+                        - stats.fraction_below(_literal(expr.low))) * (1 - stats.null_fraction)
+            fraction = max(fraction, 0.0)
+            return (1 - stats.null_fraction - fraction) if expr.negated else fraction
+        return DEFAULT_SELECTIVITY
+
+    def _comparison(self, table, expr):
+        column, literal, op = expr.left, expr.right, expr.op
+        if isinstance(column, Literal) and isinstance(literal, Column):
+            column, literal = literal, column
+            op = {"<": ">", ">": "<", "<=": ">=", ">=": "<="}.get(op, op)
+        if not isinstance(column, Column) or not isinstance(literal, Literal):
+            return DEFAULT_SELECTIVITY
+        stats = self.column(table, column.name)
+        if stats is None or literal.kind == "null":
+            return DEFAULT_SELECTIVITY if stats is None else 0.0
+        value = _literal(literal)
+        non_null = 1 - stats.null_fraction
+        if op == "=":
+            return stats.equality(value)
+        if op in ("!=", "<>"):
+            return max(non_null - stats.equality(value), 0.0)
+        if op in ("<", "<="):
+            return stats.fraction_below(value, inclusive=op == "<=") * non_null
+        if op in (">", ">="):
+            return (1 - stats.fraction_below(value, inclusive=op == ">")) * non_null
+        return DEFAULT_SELECTIVITY
+
+    def estimate_rows(self, table, expr=None):
+        """Estimated rows of `table` matching `expr` (all rows when expr is None), or None."""
+        stats = self.table(table)
+        if stats is None:
+            return None
+        return stats.row_count if expr is None else stats.row_count * self.selectivity(table, expr)
+
+
+def _literal(node):
+    return _json_value(node.python_value)
+
+
+statistics = None
+_statistics_lock = threading.Lock()
+
+
+def get_statistics():
+    """Return the process-wide statistics store, loading STATS_PATH on first use."""
+    global statistics
+    if statistics is None:
+        with _statistics_lock:
+            if statistics is None:
+                statistics = StatisticsStore()
+    return statistics
+
+
+def set_statistics(store):
+    global statistics
+    statistics = store
+    return statistics
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Collect column statistics for the optimizer.")
+    arg_parser.add_argument("tables", nargs="*", help="tables to sample")
+    arg_parser.add_argument("--refresh", action="store_true",
+                            help="only re-sample tables whose statistics are stale")
+    arg_parser.add_argument("--sample-size", type=int, default=DEFAULT_SAMPLE_SIZE)
+    arg_parser.add_argument("--path", default=STATS_PATH)
+    args = arg_parser.parse_args(argv)
+
+    store = StatisticsStore(args.path, sample_size=args.sample_size)
+    if args.refresh:
+        refreshed = store.refresh(args.tables or None)
+        print(f"Refreshed: {', '.join(refreshed) if refreshed else 'nothing was stale'}")
+        return
+    for table in args.tables:
+        stats = store.collect(table)
+        if stats is None:
+            print(f"Table '{table}' does not exist.")
+        else:
+            print(f"{table}: {stats.row_count} rows, {stats.sample_rows} sampled, {len(stats.columns)} columns")
+
+
+if __name__ == "__main__":
+    main()
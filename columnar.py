@@ -0,0 +1,161 @@
+"""
+Columnar materialization of query results.
+
+Instead of collecting every row as a tuple and handing the list to
+pd.DataFrame (which infers object columns and holds the rows and the
+frame in memory at the same time), result rows are fetched in batches of
+`FETCH_BATCH_ROWS` and copied straight into one typed NumPy buffer per
+column, chosen from the `cursor.description` type codes:
+
+    integer types    int64 (uint64 when UNSIGNED BIGINT), nullable Int64 once a NULL shows up
+    FLOAT / DOUBLE   float64, NULL -> NaN
+    DATE / DATETIME / TIMESTAMP   datetime64[us], NULL -> NaT
+    TIME             timedelta64[us], NULL -> NaT
+    anything else    Python objects (DECIMAL stays an exact Decimal)
+
+A column whose values do not fit its buffer (e.g. a driver returning
+strings) falls back to Python objects, so no value is ever lost.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from mysql.connector.constants import FieldFlag, FieldType
+
+FETCH_BATCH_ROWS = int(os.environ.get('SQLC_FETCH_BATCH_ROWS', 10000))
+
+INTEGER_TYPES = {FieldType.TINY, FieldType.SHORT, FieldType.INT24, FieldType.LONG, FieldType.LONGLONG,
+                 FieldType.YEAR}
+FLOAT_TYPES = {FieldType.FLOAT, FieldType.DOUBLE}
+DATETIME_TYPES = {FieldType.DATE, FieldType.NEWDATE, FieldType.DATETIME, FieldType.TIMESTAMP}
+TIME_TYPES = {FieldType.TIME}
+
+
+def column_dtype(description):
+    """NumPy dtype of the buffer for one `cursor.description` entry."""
+    type_code = description[1]
+    flags = description[7] if len(description) > 7 else 0
+    if type_code in INTEGER_TYPES:
+        if type_code == FieldType.LONGLONG and flags & FieldFlag.UNSIGNED:
+            return np.dtype(np.uint64)
+        return np.dtype(np.int64)
+    if type_code in FLOAT_TYPES:
+        return np.dtype(np.float64)
+    if type_code in DATETIME_TYPES:
+        return np.dtype("datetime64[us]")
+    if type_code in TIME_TYPES:
+        return np.dtype("timedelta64[us]")
+    return np.dtype(object)
+
+
+def _converted(column, dtype):
+    # NumPy converts datetime objects one at a time through Python; pandas does it in C
+    if dtype.kind == "M":
+        return pd.to_datetime(column).as_unit("us").to_numpy()
+    if dtype.kind == "m":
+        return pd.to_timedelta(column).as_unit("us").to_numpy()
+    return column
+
+
+class ColumnarBuilder:
+    """
+    Typed column buffers that rows are appended to in batches.
+
+        builder = ColumnarBuilder(cursor.description)
+        builder.append(cursor.fetchmany(1000))
+        df = builder.to_frame()
+
+    Buffers start at `capacity` rows (the row count, when the cursor knows
+    it) and double when they fill up.
+    """
+
+    def __init__(self, description, capacity=0):
+        self.columns = [desc[0] for desc in description]
+        self.size = 0
+        self.capacity = max(capacity, 1)
+        self._values = [np.empty(self.capacity, column_dtype(desc)) for desc in description]
+        self._masks = [None] * len(description)  # NULL masks of integer columns, once they have NULLs
+
+    def _grow(self, needed):
+        capacity = max(needed, 2 * self.capacity)
+        for i, values in enumerate(self._values):
+            grown = np.empty(capacity, values.dtype)
+            grown[:self.size] = values[:self.size]
+            self._values[i] = grown
+            mask = self._masks[i]
+            if mask is not None:
+                self._masks[i] = np.zeros(capacity, bool)
+                self._masks[i][:self.size] = mask[:self.size]
+        self.capacity = capacity
+
+    def append(self, rows):
+        count = len(rows)
+        if not count:
+            return
+        start, end = self.size, self.size + count
+        if end > self.capacity:
+            self._grow(end)
+        for i, values in enumerate(self._values):
+            column = [row[i] for row in rows]
+            try:
+                values[start:end] = _converted(column, values.dtype)
+            except (TypeError, ValueError, OverflowError):
+                self._fill_slowly(i, column, start, end)
+        self.size = end
+
+    def _fill_slowly(self, i, column, start, end):
+        values = self._values[i]
+        if values.dtype.kind in "iu":
+            nulls = [value is None for value in column]
+            try:
+                values[start:end] = [0 if value is None else value for value in column]
+            except (TypeError, ValueError, OverflowError):
+                pass
+            else:
+                if self._masks[i] is None:
+                    self._masks[i] = np.zeros(self.capacity, bool)
+                self._masks[i][start:end] = nulls
+                return
+        # Values that do not fit the buffer's type: keep the column as Python objects
+        objects = values.astype(object)
+        mask = self._masks[i]
+        if mask is not None:
+            objects[mask] = None
+            self._masks[i] = None
+        objects[start:end] = column
+        self._values[i] = objects
+
+    def to_frame(self):
+        data = {}
+        for i, values in enumerate(self._values):
+            values = values[:self.size]
+            if self.size < self.capacity:
+                # Do not keep the unused part of the buffer alive
+                values = values.copy()
+            mask = self._masks[i]
+            if mask is not None and mask[:self.size].any():
+                values = pd.arrays.IntegerArray(values, mask[:self.size].copy())
+            data[i] = values
+        # Keyed by position because a result may repeat a column name
+        df = pd.DataFrame(data, index=pd.RangeIndex(self.size), copy=False)
+        df.columns = self.columns
+        return df
+
+
+def fetch_dataframe(cursor, batch_size=FETCH_BATCH_ROWS):
+    """Read the rest of `cursor`'s result into a DataFrame, `batch_size` rows at a time."""
+    builder = ColumnarBuilder(cursor.description, max(cursor.rowcount or 0, 0) or batch_size)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        builder.append(rows)
+    return builder.to_frame()
+
+
+def frame_from_rows(rows, description):
+    """DataFrame with typed columns from rows already fetched."""
+    builder = ColumnarBuilder(description, len(rows))
+    builder.append(rows)
+    return builder.to_frame()
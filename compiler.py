@@ -0,0 +1,272 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from functools import cached_property
+
+from catalog import get_catalog
+from lexer import IDENTIFIER, KEYWORD, NUMBER, PUNCTUATION_TYPE, STRING, fingerprint, tokenize
+from optimiser import SQLQueryOptimizer
+from parser import SQLSyntaxParser
+from profiler import span
+from semantic import validate_semantics
+from sql_ast import Literal, transform
+
+
+# Literals in these clauses stay inline: a placeholder would rename a SELECT
+# column or turn a GROUP BY / ORDER BY position into a constant
+_INLINE_CLAUSES = {"SELECT", "GROUP BY", "ORDER BY"}
+_CLAUSE_KEYWORDS = {"SELECT", "FROM", "WHERE", "GROUP BY", "HAVING", "ORDER BY", "LIMIT", "OFFSET",
+                    "SET", "VALUES", "INTO", "JOIN", "ON", "USING", "UNION"}
+
+
+def _parameter_value(code, text):
+    if code == STRING:
+        return Literal(text, "string").python_value
+    if "e" in text or "E" in text:
+        return float(text)
+    # DECIMAL literals stay exact instead of becoming DOUBLE parameters
+    return Decimal(text) if "." in text else int(text)
+
+
+def parameterize(tokens):
+    """
+    Split a tokenized query into a `%s` template and its literal parameters.
+
+    Returns (template, params, key), where `key` identifies the statement
+    shape (the query fingerprint) for caching prepared statements, or None
+    when the query has a '%' outside a literal and cannot be a template.
+    String literals with backslash escapes and the arguments of a type, as
+    in CAST(x AS DECIMAL(10, 2)), are left inline.
+    """
+    source = tokens.source
+    offsets = tokens.offsets
+    pieces = []
+    params = []
+    inline = []
+    clauses = [None]  # current clause per parenthesis depth
+    calls = [None]  # function whose arguments each parenthesis holds
+    type_args = [False]  # whether each parenthesis holds type arguments, as in CAST(x AS DECIMAL(10, 2))
+    previous = None  # upper-case text of the previous token, None after a literal
+    type_name = False  # previous token is a type name after AS, or after a comma in CONVERT(
+    position = 0
+    count = len(tokens)
+    if count and tokens.types[-1] == PUNCTUATION_TYPE and tokens.value(count - 1) == ";":
+        count -= 1
+
+    for index in range(count):
+        code = tokens.types[index]
+        start, end = offsets[2 * index], offsets[2 * index + 1]
+        text = source[start:end]
+        if code == KEYWORD:
+            word = " ".join(text.upper().split())
+            if word in _CLAUSE_KEYWORDS:
+                clauses[-1] = word
+        elif code == PUNCTUATION_TYPE:
+            if text == "(":
+                clauses.append(clauses[-1])
+                calls.append(previous)
+                # The arguments of the type in CAST(x AS type) or CONVERT(x, type) must stay literal
+                type_args.append(type_args[-1] or type_name)
+            elif text == ")" and len(clauses) > 1:
+                clauses.pop()
+                calls.pop()
+                type_args.pop()
+        elif code == NUMBER or code == STRING:
+            if (clauses[-1] in _INLINE_CLAUSES or previous == "AS" or type_args[-1]
+                    or (code == STRING and "\\" in text)):
+                inline.append(f"{index}={text}")
+            else:
+                pieces.append(source[position:start])
+                pieces.append(None)
+                params.append(_parameter_value(code, text))
+                position = end
+        is_word = code == KEYWORD or code == IDENTIFIER
+        type_name = is_word and (previous == "AS" or previous == "," and calls[-1] == "CONVERT")
+        previous = text.upper() if is_word or code == PUNCTUATION_TYPE else None
+
+    end = offsets[2 * count - 1] if count else 0
+    pieces.append(source[position:end])
+    if any(piece is not None and "%" in piece for piece in pieces):
+        return None
+    template = "".join("%s" if piece is None else piece for piece in pieces)
+    key = fingerprint(tokens)[0]
+    if inline:
+        key = hashlib.blake2b("\x1f".join([key] + inline).encode(), digest_size=16).hexdigest()
+    return template, params, key
+
+
+class CompiledQuery:
+    """
+    Results of running one query through the compiler pipeline.
+
+    Every phase (tokens, syntax check, optimization, semantic check) is
+    computed the first time it is accessed and then kept, so callers only
+    pay for the phases they actually look at.
+    """
+
+    def __init__(self, query, tokens=None, ast=None, memo=None, parse_error=None):
+        self.query = query
+        self.schema_version = None  # catalog version the catalog-dependent phases ran against
+        self.memo = memo  # optimizer pass memo shared with other compilations, see PassManager
+        if tokens is not None:
+            self.__dict__["tokens"] = tokens
+        if ast is not None or parse_error is not None:
+            self.__dict__["parser"] = SQLSyntaxParser(self.tokens, ast=ast, error=parse_error)
+
+    @cached_property
+    def tokens(self):
+        with span("lex"):
+            return tokenize(self.query)
+
+    @cached_property
+    def token_list(self):
+        return self.tokens.to_list()
+
+    @cached_property
+    def fingerprint(self):
+        return fingerprint(self.tokens)[0]
+
+    @cached_property
+    def parser(self):
+        return SQLSyntaxParser(self.tokens)
+
+    @property
+    def ast(self):
+        return self.parser.parse_ast()
+
+    @cached_property
+    def syntax_result(self):
+        return self.parser.parse()
+
+    @cached_property
+    def optimizer(self):
+        ast = self.ast
+        self.schema_version = get_catalog().version
+        with span("optimize"):
+            optimizer = SQLQueryOptimizer(self.query, ast=ast, memo=self.memo)
+            optimizer.optimize()
+        return optimizer
+
+    @property
+    def optimization_steps(self):
+        return self.optimizer.get_steps()
+
+    @property
+    def optimized_query(self):
+        return self.optimization_steps[-1][1]
+
+    @cached_property
+    def semantic_result(self):
+        optimized_query = self.optimized_query
+        with span("semantic"):
+            result = validate_semantics(optimized_query, ast=self.optimizer.ast)
+        self.schema_version = get_catalog().version
+        return result
+
+    @cached_property
+    def parameterized(self):
+        """(template, params, key) for the optimized query, or None; see parameterize()."""
+        return parameterize(tokenize(self.optimized_query))
+
+    def computed_phases(self):
+        return [name for name in ("tokens", "syntax_result", "optimizer", "semantic_result")
+                if name in self.__dict__]
+
+
+class PlanCache:
+    """
+    LRU cache of CompiledQuery objects keyed by normalized query fingerprint.
+
+    Queries that differ only in whitespace, comments or keyword case share an
+    entry outright. Queries that differ only in literal values reuse the
+    cached parse tree with the new literals bound into it, skipping the
+    parser, and reuse a passing semantic verdict when optimization produced
+    the same shape. Entries compiled against an older schema catalog
+    version are treated as misses.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # fingerprint -> (literals, CompiledQuery)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.rebinds = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, query):
+        tokens = tokenize(query)
+        key, literals = fingerprint(tokens)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._is_current(entry[1]):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None and entry[0] == literals:
+            with self._lock:
+                self.hits += 1
+            return entry[1]
+
+        if entry is not None and entry[1].ast is not None:
+            compiled = self._rebind(entry[1], query, tokens, literals)
+            with self._lock:
+                self.rebinds += 1
+        else:
+            compiled = CompiledQuery(query, tokens)
+            with self._lock:
+                self.misses += 1
+
+        with self._lock:
+            self._entries[key] = (literals, compiled)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return compiled
+
+    def _is_current(self, compiled):
+        return compiled.schema_version is None or compiled.schema_version == get_catalog().version
+
+    def _rebind(self, cached, query, tokens, literals):
+        def bind(node):
+            if isinstance(node, Literal) and node.span is not None and node.span[0] in literals:
+                value = literals[node.span[0]]
+                if value != node.value:
+                    return Literal(value, node.kind, span=node.span)
+            return node
+
+        compiled = CompiledQuery(query, tokens, ast=transform(cached.ast, bind))
+        if "semantic_result" in cached.__dict__ and cached.semantic_result.startswith("Semantic Check"):
+            # Verdicts that passed only depend on the shape of the optimized query
+            optimized_shape = fingerprint(tokenize(cached.optimized_query))[0]
+            if fingerprint(tokenize(compiled.optimized_query))[0] == optimized_shape:
+                compiled.__dict__["semantic_result"] = cached.semantic_result
+        return compiled
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.rebinds + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "rebinds": self.rebinds,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.rebinds) / lookups if lookups else 0.0,
+            }
+
+
+plan_cache = PlanCache()
+
+
+def compile_query(query, cache=None):
+    """Return the (possibly cached) CompiledQuery for `query`."""
+    return (cache or plan_cache).get(query)
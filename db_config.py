@@ -1,3 +1,8 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
 import mysql.connector
 
 # Database connection details
@@ -6,17 +11,287 @@ user = 'root'  # Your MySQL username
 password = '2004'  # Your MySQL password
 database = 'sql_query_compiler'  # The database to connect to
 
+# Connection pool settings (can be overridden with environment variables)
+pool_min_size = int(os.environ.get('SQLC_POOL_MIN_SIZE', 1))
+pool_max_size = int(os.environ.get('SQLC_POOL_MAX_SIZE', 8))
+pool_checkout_timeout = float(os.environ.get('SQLC_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+pool_health_check_interval = float(os.environ.get('SQLC_POOL_HEALTH_CHECK', 30))  # seconds idle before pinging
+pool_max_statements = int(os.environ.get('SQLC_POOL_MAX_STATEMENTS', 64))  # prepared statements kept per connection
+
+
+def create_connection():
+    """Open a new physical connection to the database."""
+    return mysql.connector.connect(
+        host=host,
+        user=user,
+        password=password,
+        database=database
+    )
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    """
+    Wraps a physical connection checked out of a ConnectionPool.
+
+    Behaves like the underlying connection, except that close() (and leaving
+    a `with` block) hands the connection back to the pool instead of closing it.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise mysql.connector.Error("Connection has been returned to the pool")
+        return getattr(self._raw, name)
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool.release(raw)
+
+    def prepared_cursor(self, key, operation):
+        """
+        Prepared cursor cached on this physical connection under `key`.
+
+        Returns (cursor, operation); execute the returned operation, which is
+        the string the statement was first prepared from, so the server-side
+        statement is reused rather than prepared again.
+        """
+        if self._raw is None:
+            raise mysql.connector.Error("Connection has been returned to the pool")
+        return self._pool.prepared_cursor(self._raw, key, operation)
+
+    def drop_prepared(self, key):
+        """Forget (and close) the prepared cursor cached under `key`."""
+        if self._raw is not None:
+            self._pool.drop_prepared(self._raw, key)
+
+    def discard(self):
+        """Close the physical connection instead of returning it to the pool."""
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool._discard(raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __del__(self):
+        # Connections dropped without close() go back to the pool as well
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of database connections.
+
+    Keeps at least `min_size` idle connections warm, never opens more than
+    `max_size`, waits up to `timeout` seconds for a connection to be returned
+    when the pool is exhausted, and pings connections that have been idle for
+    longer than `health_check_interval` before handing them out. Up to
+    `max_statements` prepared cursors are kept per connection, least
+    recently used first out.
+    """
+
+    def __init__(self, factory=create_connection, min_size=1, max_size=8, timeout=10.0,
+                 health_check_interval=30.0, max_statements=64):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_statements = max_statements
+        self._idle = deque()  # (connection, last_used)
+        self._statements = {}  # id(connection) -> OrderedDict(key -> (cursor, operation))
+        self._size = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def _open(self):
+        """Connect for a slot the caller reserved (counted in `_size`); the slot is freed if that fails."""
+        try:
+            return self.factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _discard(self, raw):
+        for cursor, _ in self._statements.pop(id(raw), {}).values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _is_healthy(self, raw, last_used):
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def prepared_cursor(self, raw, key, operation):
+        # Only the thread holding `raw` touches its statement cache
+        statements = self._statements.get(id(raw))
+        if statements is None:
+            statements = self._statements[id(raw)] = OrderedDict()
+        entry = statements.get(key)
+        if entry is not None:
+            statements.move_to_end(key)
+            return entry
+        entry = statements[key] = (raw.cursor(prepared=True), operation)
+        while len(statements) > self.max_statements:
+            _, (cursor, _) = statements.popitem(last=False)
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        return entry
+
+    def drop_prepared(self, raw, key):
+        entry = self._statements.get(id(raw), {}).pop(key, None)
+        if entry is not None:
+            try:
+                entry[0].close()
+            except Exception:
+                pass
+
+    def fill(self):
+        """Open connections until `min_size` are available."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            raw = self._open()
+            with self._cond:
+                self._idle.append((raw, time.monotonic()))
+                self._cond.notify()
+
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise mysql.connector.Error("Connection pool is closed")
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"Timed out after {timeout}s waiting for a free connection "
+                            f"(max_size={self.max_size})")
+                    self._cond.wait(remaining)
+                entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    # Reserve the slot before connecting so concurrent callers cannot overshoot max_size
+                    self._size += 1
+
+            if entry is None:
+                return PooledConnection(self, self._open())
+            raw, last_used = entry
+            if self._is_healthy(raw, last_used):
+                return PooledConnection(self, raw)
+            self._discard(raw)
+
+    def release(self, raw):
+        try:
+            # Reset any open transaction so the next borrower starts clean
+            raw.rollback()
+        except Exception:
+            self._discard(raw)
+            return
+        with self._cond:
+            if self._closed:
+                close_now = True
+            else:
+                close_now = False
+                self._idle.append((raw, time.monotonic()))
+                self._cond.notify()
+        if close_now:
+            self._discard(raw)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for raw, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        with self._cond:
+            return {"size": self._size, "idle": len(self._idle), "in_use": self._size - len(self._idle),
+                    "prepared_statements": sum(len(s) for s in list(self._statements.values()))}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ConnectionPool(
+                    min_size=pool_min_size,
+                    max_size=pool_max_size,
+                    timeout=pool_checkout_timeout,
+                    health_check_interval=pool_health_check_interval,
+                    max_statements=pool_max_statements
+                )
+                pool.fill()
+                _pool = pool
+    return _pool
+
+
+def configure_pool(**settings):
+    """Replace the shared pool, e.g. configure_pool(min_size=2, max_size=16, timeout=5)."""
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, None
+    if old is not None:
+        old.close()
+    with _pool_lock:
+        _pool = ConnectionPool(**settings)
+    _pool.fill()
+    return _pool
+
+
 def get_connection():
-    """Establish a connection to the database."""
+    """Check a connection out of the shared pool; close() returns it."""
     try:
-        conn = mysql.connector.connect(
-            host=host,
-            user=user,
-            password=password,
-            database=database
-        )
-        print("Connection successful")
-        return conn
-    except mysql.connector.Error as err:
+        return get_pool().acquire()
+    except (mysql.connector.Error, PoolTimeout) as err:
         print(f"Error: {err}")
         return None
@@ -1,51 +1,276 @@
-import mysql.connector
-from db_config import get_connection
+import time
+from contextlib import contextmanager
+
+from backends import get_backend
+from catalog import DDL_PATTERN, get_catalog
+from columnar import fetch_dataframe, frame_from_rows
+from compiler import compile_query, parameterize
+from lexer import tokenize
+from predicates import is_contradiction
+from profiler import DB, span
+from result_cache import get_result_cache
+from sql_ast import (
+    AGGREGATES, Column, Delete, FuncCall, Select, SetOperation, Star, TableRef, Update, table_sources, walk,
+)
 import pandas as pd
 
-def execute_select_query(query):
+def prepare_statement(query):
+    """(template, params, key) to run `query` as a prepared statement, or None to send it as text."""
+    if DDL_PATTERN.match(query):
+        # DDL takes no parameters: VARCHAR(255) or DEFAULT 0 must stay literal
+        return None
+    try:
+        return parameterize(tokenize(query))
+    except ValueError:
+        return None
+
+@contextmanager
+def statement_cursor(conn, query):
+    """
+    Execute `query` on `conn` and yield the cursor holding its result.
+
+    Literals are sent as parameters, so the statement is parsed once per
+    connection for all queries differing only in literal values: MySQL
+    caches a server-side prepared statement on the connection by query
+    fingerprint, SQLite its own compiled statements.
+    """
+    with get_backend().statement_cursor(conn, query, prepare_statement(query)) as cursor:
+        yield cursor
+
+def _parsed(query):
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query)
-                columns = [desc[0] for desc in cursor.description]
-                rows = cursor.fetchall()
-                df = pd.DataFrame(rows, columns=columns)
-                return df
+        return compile_query(query).ast
+    except ValueError:
+        return None
+
+def _star_columns(block, star):
+    columns = []
+    for source in table_sources(block.from_):
+        if star.table is not None and (source.ref_name or "").lower() != star.table.strip('`"').lower():
+            continue
+        if not isinstance(source, TableRef):
+            return None
+        names = get_catalog().get_columns(source.name)
+        if not names:
+            return None
+        columns.extend(names)
+    return columns
+
+def _empty_result_columns(ast):
+    """
+    Column names of a SELECT that provably returns no rows because its WHERE
+    clause can never be true (see predicates.py), or None when it has to run.
+    """
+    if isinstance(ast, SetOperation):
+        left = _empty_result_columns(ast.left)
+        return left if left is not None and _empty_result_columns(ast.right) is not None else None
+    if not isinstance(ast, Select) or not is_contradiction(ast.where):
+        return None
+    if not ast.group_by and any(isinstance(node, FuncCall) and node.name.upper() in AGGREGATES
+                                for item in ast.columns for node in walk(item)):
+        # Aggregates without GROUP BY still return one row
+        return None
+    columns = []
+    for item in ast.columns:
+        if item.alias:
+            columns.append(item.alias.strip('`"'))
+        elif isinstance(item.expr, Star):
+            names = _star_columns(ast, item.expr)
+            if names is None:
+                return None
+            columns.extend(names)
+        elif isinstance(item.expr, Column):
+            columns.append(item.expr.name)
+        else:
+            columns.append(item.expr.to_sql())
+    return columns
+
+def execute_select_query(query, connection_factory=None):
+    columns = _empty_result_columns(_parsed(query))
+    if columns is not None:
+        # Nothing can match, so the database is not contacted
+        return pd.DataFrame(columns=columns)
+    backend = get_backend()
+    cache = get_result_cache()
+    # Connections from a custom factory may reach another database than the backend's
+    cached, ticket = cache.get(query, backend) if connection_factory is None else (None, None)
+    if cached is not None:
+        return cached
+    try:
+        with (connection_factory or backend.connect)() as conn:
+            with statement_cursor(conn, query) as cursor:
+                with span("fetch"):
+                    df = fetch_dataframe(cursor)
+        cache.put(ticket, df)
+        return df
     except Exception as e:
         return f"Error executing SELECT: {str(e)}"
 
-def execute_modify_query(query, operation):
+def stream_select_query(query, chunk_size=1000, max_rows=None, as_dataframe=False):
+    """
+    Run a SELECT on an unbuffered cursor and yield its result in chunks.
+
+    Each chunk holds at most `chunk_size` rows, either as a list of tuples or,
+    with `as_dataframe=True`, as a DataFrame with typed columns (see
+    columnar.py). Rows are pulled from the server with fetchmany, so memory
+    stays bounded by the chunk size. `max_rows` stops the stream after that
+    many rows in total.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    with get_backend().stream_cursor(query) as cursor:
+        remaining = max_rows
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            rows = cursor.fetchmany(size)
+            if not rows:
+                break
+            if remaining is not None:
+                remaining -= len(rows)
+            yield frame_from_rows(rows, cursor.description) if as_dataframe else rows
+
+def execute_modify_query(query, operation, connection_factory=None):
+    ast = _parsed(query)
+    if isinstance(ast, (Update, Delete)) and is_contradiction(ast.where):
+        return f"{operation} successful, 0 rows affected."
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query)
+        with (connection_factory or get_backend().connect)() as conn:
+            with statement_cursor(conn, query) as cursor:
                 conn.commit()
-                return f"{operation} successful, {cursor.rowcount} rows affected."
+                rowcount = cursor.rowcount
+        # Only a DDL statement that has run changes the schema
+        get_catalog().observe_query(query)
+        return f"{operation} successful, {max(rowcount, 0)} rows affected."
     except Exception as e:
         return f"Error executing {operation}: {str(e)}"
+    finally:
+        # Cached SELECT results that read the written table are stale now
+        get_result_cache().invalidate_statement(query)
+
+BULK_OPERATIONS = ("INSERT", "REPLACE", "UPDATE", "DELETE")
+
+def _statement_groups(queries, batch_size, backend):
+    """
+    Yield (template, [params, ...], first statement) for runs of consecutive
+    statements that differ only in literal values, at most `batch_size` per
+    run, with templates in `backend`'s parameter style. Statements that
+    cannot be parameterized come out alone as (None, [query], query).
+    """
+    template = key = first = None
+    rows = []
+    for query in queries:
+        operation = query.strip().split(None, 1)[0].upper() if query.strip() else ""
+        if operation not in BULK_OPERATIONS:
+            raise ValueError(f"Bulk mode only runs {', '.join(BULK_OPERATIONS)} statements, got: {query[:60]!r}")
+        prepared = prepare_statement(query)
+        if prepared is not None:
+            operation = backend.operation(prepared[0], prepared[1])
+            prepared = None if operation is None else (operation, backend.parameters(prepared[1]), prepared[2])
+        if rows and (prepared is None or prepared[2] != key or len(rows) >= batch_size):
+            yield template, rows, first
+            rows = []
+        if prepared is None:
+            yield None, [query], query
+            continue
+        if not rows:
+            template, _, key = prepared
+            first = query
+        rows.append(prepared[1])
+    if rows:
+        yield template, rows, first
+
+def execute_bulk(queries, batch_size=1000, commit_every=None):
+    """
+    Run many INSERT / UPDATE / DELETE statements over one connection.
+
+    Consecutive statements that differ only in their literals are sent with
+    executemany in batches of `batch_size`; for INSERTs the driver turns each
+    batch into a single multi-row INSERT. The work runs in one transaction
+    that is committed at the end, or at the first batch boundary after every
+    `commit_every` statements. On an error the uncommitted statements are
+    rolled back and the report says how far the load got.
 
-def execute_query(query):
-    query_upper = query.strip().upper()
-    if query_upper.startswith("SELECT"):
-        return execute_select_query(query)
-    elif query_upper.startswith("INSERT"):
-        return execute_modify_query(query, "INSERT")
-    elif query_upper.startswith("UPDATE"):
-        return execute_modify_query(query, "UPDATE")
-    elif query_upper.startswith("DELETE"):
-        return execute_modify_query(query, "DELETE")
-    else:
-        return "Unsupported query type or invalid syntax."
+    Returns a report dict: statements, rows, committed_statements,
+    rolled_back_statements, batches (statements and rowcount of each),
+    elapsed_s, rows_per_sec and error.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    report = {"statements": 0, "rows": 0, "committed_statements": 0, "rolled_back_statements": 0,
+              "batches": [], "elapsed_s": 0.0, "rows_per_sec": 0.0, "error": None}
+    started = time.perf_counter()
+    backend = get_backend()
+    conn = backend.connect()
+    if conn is None:
+        report["error"] = "Error executing bulk statements: could not connect to the database"
+        return report
+    pending = pending_rows = committed_rows = 0
+    written = {}  # statement shape -> one statement of that shape, for result cache invalidation
+    try:
+        with conn.cursor() as cursor:
+            for template, rows, first in _statement_groups(queries, batch_size, backend):
+                written.setdefault(template or first, first)
+                pending += len(rows)
+                with span("batch", DB, statements=len(rows)):
+                    if template is None:
+                        cursor.execute(rows[0])
+                    else:
+                        cursor.executemany(template, rows)
+                rowcount = max(cursor.rowcount, 0)
+                report["batches"].append({"statements": len(rows), "rowcount": rowcount})
+                report["statements"] += len(rows)
+                report["rows"] += rowcount
+                pending_rows += rowcount
+                if commit_every and pending >= commit_every:
+                    conn.commit()
+                    report["committed_statements"] += pending
+                    committed_rows += pending_rows
+                    pending = pending_rows = 0
+        conn.commit()
+        report["committed_statements"] += pending
+        committed_rows += pending_rows
+    except Exception as e:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        report["rolled_back_statements"] = pending
+        report["error"] = f"Error executing bulk statements: {str(e)}"
+    finally:
+        conn.close()
+        cache = get_result_cache()
+        for query in written.values():
+            cache.invalidate_statement(query)
+    elapsed = time.perf_counter() - started
+    report["elapsed_s"] = round(elapsed, 4)
+    report["rows_per_sec"] = round(committed_rows / elapsed, 1) if elapsed else 0.0
+    return report
+
+def execute_query(query, connection_factory=None):
+    with span("execute"):
+        query_upper = query.strip().upper()
+        if query_upper.startswith("SELECT"):
+            return execute_select_query(query, connection_factory)
+        elif query_upper.startswith("INSERT"):
+            return execute_modify_query(query, "INSERT", connection_factory)
+        elif query_upper.startswith("UPDATE"):
+            return execute_modify_query(query, "UPDATE", connection_factory)
+        elif query_upper.startswith("DELETE"):
+            return execute_modify_query(query, "DELETE", connection_factory)
+        elif DDL_PATTERN.match(query):
+            return execute_modify_query(query, query_upper.split(None, 1)[0], connection_factory)
+        else:
+            return "Unsupported query type or invalid syntax."
 
 # Example function to check tables in your database
 def list_tables():
-    query = "SHOW TABLES;"
-    result = execute_select_query(query)
-    if isinstance(result, pd.DataFrame):
-        print("Tables in database:")
-        print(result)
-    else:
-        print(result)
+    try:
+        tables = get_backend().list_tables()
+    except Exception as e:
+        print(f"Error listing tables: {str(e)}")
+        return
+    print("Tables in database:")
+    print(pd.DataFrame({"table": tables}))
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+
+from backends import get_backend
+from catalog import get_catalog
+from lexer import fingerprint, tokenize
+
+
+class ExplainCache:
+    """
+    Estimated costs from the backend's EXPLAIN (`EXPLAIN FORMAT=JSON` on
+    MySQL), cached by query fingerprint.
+
+    The key is the normalized fingerprint plus the literal values (costs
+    depend on them), so whitespace, comments and keyword case do not cause
+    extra EXPLAIN round trips. Entries from another backend or an older
+    schema catalog version are ignored. Queries that cannot be explained
+    are cached as None.
+    """
+
+    def __init__(self, max_entries=1024, backend=None):
+        self.max_entries = max_entries
+        self.backend = backend  # None: the current process-wide backend
+        self._entries = OrderedDict()  # key -> ((id of backend, catalog version), cost)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, query):
+        try:
+            tokens = tokenize(query)
+        except ValueError:
+            return None
+        digest, literals = fingerprint(tokens)
+        return digest, tuple(literals.values())
+
+    def cost(self, query):
+        key = self._key(query)
+        if key is None:
+            return None
+        backend = self.backend or get_backend()
+        version = (id(backend), get_catalog().version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        cost = backend.explain_cost(query)
+        with self._lock:
+            self._entries[key] = (version, cost)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return cost
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+explain_cache = ExplainCache()
+
+
+def explain_cost(query, cache=None):
+    """Estimated cost of `query` from the backend's optimizer, or None when it cannot be explained."""
+    return (cache or explain_cache).cost(query)
@@ -0,0 +1,248 @@
+"""
+Incremental compilation for text that is edited a little at a time, e.g. a
+query being typed into the Streamlit editor.
+
+    editor = IncrementalParser()
+    editor.update("SELECT a FROM t WHERE b = 1")
+    editor.update("SELECT a FROM t WHERE b = 12")  # re-lexes one token, reparses the WHERE clause
+
+Each update diffs the new text against the previous one. Only the tokens
+around the edit are re-lexed (see lexer.relex), and only the smallest
+enclosing clause or subquery is re-parsed and spliced into the previous
+AST; the whole statement is parsed again only when that fails. Subtrees
+outside the edit stay the same objects, so the optimizer reuses its pass
+results for them through a memo shared between updates.
+"""
+
+from bisect import bisect_left, bisect_right
+
+from catalog import get_catalog
+from compiler import CompiledQuery
+from lexer import relex, tokenize
+from parser import ParseError, RecursiveDescentParser
+from profiler import span
+from sql_ast import (
+    Delete, Exists, FuncCall, InList, InSubquery, Insert, Join, Node, Select, Subquery,
+    SubqueryRef, Update, ValuesRow,
+)
+
+# (node type, field) -> parser method that parses one value of that field.
+# Each value of these fields comes from a single call of the method, so
+# re-running it over the value's tokens gives what a full parse would.
+REPARSE_RULES = {
+    (Select, "columns"): "parse_select_item",
+    (Select, "where"): "parse_expression",
+    (Select, "group_by"): "parse_expression",
+    (Select, "having"): "parse_expression",
+    (Select, "order_by"): "parse_order_item",
+    (Join, "condition"): "parse_expression",
+    (InList, "items"): "parse_expression",
+    (FuncCall, "args"): "parse_expression",
+    (ValuesRow, "items"): "parse_expression",
+    (Insert, "rows"): "parse_values_row",
+    (Insert, "query"): "parse_query",
+    (Update, "assignments"): "parse_assignment",
+    (Update, "where"): "parse_expression",
+    (Delete, "where"): "parse_expression",
+    (Subquery, "query"): "parse_query",
+    (SubqueryRef, "query"): "parse_query",
+    (InSubquery, "query"): "parse_query",
+    (Exists, "query"): "parse_query",
+}
+
+MEMO_LIMIT = 20000  # optimizer memo entries kept before it is cleared
+
+
+def _covers(span, start, end):
+    return span is not None and span[0] < span[1] and span[0] <= start and end <= span[1]
+
+
+def _enclosing(root, start, end):
+    """
+    Reparse candidates covering old tokens [start, end), outermost first, as
+    (parent, field, first, last): `first`..`last` is the run of list items
+    the change falls in, or None, None for a single-valued field.
+    """
+    found = []
+    node = root
+    while node is not None:
+        parent, node = node, None
+        for name in parent._fields:
+            rule = REPARSE_RULES.get((type(parent), name))
+            value = getattr(parent, name)
+            if isinstance(value, Node):
+                if _covers(value.span, start, end):
+                    if rule is not None:
+                        found.append((parent, name, None, None))
+                    node = value
+                    break
+            elif isinstance(value, list) and value and isinstance(value[0], Node):
+                first = bisect_left(value, start, key=lambda item: item.span[1])
+                last = bisect_right(value, end, key=lambda item: item.span[0]) - 1
+                if first <= last and value[first].span[0] <= start and end <= value[last].span[1]:
+                    if rule is not None:
+                        found.append((parent, name, first, last))
+                    if first == last:
+                        node = value[first]
+                    break
+    return found
+
+
+def _shifted(node, shift):
+    """Copy of `node` with every span moved by `shift` tokens."""
+    values = []
+    for name in node._fields:
+        value = getattr(node, name)
+        if isinstance(value, Node):
+            value = _shifted(value, shift)
+        elif isinstance(value, list):
+            value = [_shifted(item, shift) if isinstance(item, Node) else item for item in value]
+        values.append(value)
+    span = node.span
+    return type(node)(*values, span=None if span is None else (span[0] + shift, span[1] + shift))
+
+
+def _splice(node, parent, name, value, start, end, shift):
+    """
+    Rebuild `node` with field `name` of `parent` set to `value`, which
+    replaces old tokens [start, end). Subtrees before the change are shared;
+    subtrees after it are shared too unless the token count changed, in
+    which case copies with shifted spans are made.
+    """
+    span = node.span
+    if span is not None and span[1] <= start:
+        return node
+    if span is not None and span[0] >= end:
+        return _shifted(node, shift) if shift else node
+    changes = {}
+    for field in node._fields:
+        old = getattr(node, field)
+        if node is parent and field == name:
+            changes[field] = value
+        elif isinstance(old, Node):
+            new = _splice(old, parent, name, value, start, end, shift)
+            if new is not old:
+                changes[field] = new
+        elif isinstance(old, list) and old and isinstance(old[0], Node):
+            new = [_splice(item, parent, name, value, start, end, shift) for item in old]
+            if any(item is not previous for item, previous in zip(new, old)):
+                changes[field] = new
+    new_node = node.replace(**changes)
+    new_node.span = None if span is None else (span[0], span[1] + shift)
+    return new_node
+
+
+def reparse(ast, parser, start, old_end, new_end):
+    """
+    Update `ast` after old tokens [start, old_end) became [start, new_end)
+    of the tokens `parser` (a RecursiveDescentParser) now holds.
+
+    Re-parses the innermost clause, run of list items or subquery covering
+    the change and splices the result in. Returns the new AST, or None when
+    nothing smaller than the whole statement could be re-parsed on its own.
+    """
+    shift = new_end - old_end
+    for parent, name, first, last in reversed(_enclosing(ast, start, old_end)):
+        rule = getattr(parser, REPARSE_RULES[(type(parent), name)])
+        value = getattr(parent, name)
+        if first is None:
+            region_start, region_end = value.span
+        else:
+            region_start, region_end = value[first].span[0], value[last].span[1]
+        stop = region_end + shift
+        parser.position = region_start
+        try:
+            parsed = [rule()]
+            if first is not None:
+                while parser.position < stop and parser.accept(","):
+                    parsed.append(rule())
+        except ParseError:
+            continue
+        if parser.position != stop:
+            continue
+        if first is None:
+            new_value = parsed[0]
+        else:
+            after = value[last + 1:]
+            if shift:
+                after = [_shifted(item, shift) for item in after]
+            new_value = value[:first] + parsed + after
+        return _splice(ast, parent, name, new_value, region_start, region_end, shift)
+    return None
+
+
+class IncrementalParser:
+    """
+    Compiles successive versions of one query, reusing the work done for
+    the previous version; `update()` returns a CompiledQuery.
+
+    `stats` counts full and incremental lexes and parses; `last_edit`
+    describes what the latest update re-lexed and re-parsed.
+    """
+
+    def __init__(self):
+        self.compiled = None
+        self.memo = {}
+        self.last_edit = None
+        self.stats = {"full_lexes": 0, "relexes": 0, "full_parses": 0, "reparses": 0, "reused_asts": 0}
+        self._parser = None  # RecursiveDescentParser over the current tokens
+        self._memo_version = None
+
+    @property
+    def ast(self):
+        return self.compiled.ast if self.compiled is not None else None
+
+    def update(self, query):
+        """Compile `query`, an edited version of the previous text; raises ValueError on illegal input."""
+        version = get_catalog().version
+        if version != self._memo_version or sum(map(len, self.memo.values())) > MEMO_LIMIT:
+            # Pass results depend on the schema
+            self.memo = {}
+            self._memo_version = version
+        previous = self.compiled
+        if previous is not None and previous.query == query and previous.schema_version in (None, version):
+            return previous
+
+        edit = {"relexed": None, "reparsed": None}
+        old_ast = None
+        try:
+            if previous is None:
+                with span("lex"):
+                    tokens = tokenize(query)
+                self._parser = RecursiveDescentParser(tokens)
+                self.stats["full_lexes"] += 1
+            else:
+                with span("relex"):
+                    tokens, start, old_end, new_end = relex(previous.tokens, query)
+                    self._parser.retokenize(tokens, start, old_end, new_end)
+                old_ast = previous.ast
+                edit["relexed"] = new_end - start
+                self.stats["relexes"] += 1
+        except ValueError:
+            self.compiled = self._parser = None
+            raise
+
+        ast = error = None
+        if old_ast is not None and start == old_end == new_end:
+            ast = old_ast
+            edit["reparsed"] = "nothing"
+            self.stats["reused_asts"] += 1
+        elif old_ast is not None:
+            with span("reparse"):
+                ast = reparse(old_ast, self._parser, start, old_end, new_end)
+            if ast is not None:
+                edit["reparsed"] = "clause"
+                self.stats["reparses"] += 1
+        if ast is None:
+            edit["reparsed"] = "statement"
+            self.stats["full_parses"] += 1
+            self._parser.position = 0
+            with span("parse"):
+                try:
+                    ast = self._parser.parse_statement()
+                except ParseError as e:
+                    error = e
+
+        self.compiled = CompiledQuery(query, tokens, ast=ast, memo=self.memo, parse_error=error)
+        self.last_edit = edit
+        return self.compiled
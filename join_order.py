@@ -0,0 +1,269 @@
+"""
+Cost-based ordering of inner-join chains.
+
+A chain such as `a JOIN b ON ... JOIN c ON ...` is turned into a join graph:
+one relation per table and one edge per ON conjunct. Left-deep orders are
+costed from catalog row counts and index metadata, refined by column
+statistics (see column_stats) where they have been collected. Graphs of up
+to DP_LIMIT tables are searched exhaustively with dynamic programming over
+table subsets; larger ones are ordered greedily.
+"""
+
+from catalog import get_catalog
+from column_stats import get_statistics
+from sql_ast import BinaryOp, Column, Join, Literal, and_all, conjuncts, walk
+
+DEFAULT_ROWS = 1000         # tables the catalog has no row count for
+DUPLICATION_FACTOR = 10     # assumed rows per distinct value of a non-unique column
+RANGE_SELECTIVITY = 1 / 3
+DP_LIMIT = 8                # largest join graph ordered exhaustively
+
+COMPARISONS = ("=", "<", ">", "<=", ">=")
+
+
+class CostModel:
+    """
+    Cardinality and cost estimates for left-deep join orders.
+
+    Joining relation r to an intermediate result of n rows costs the rows it
+    produces plus the rows read from r: n index lookups when one of r's join
+    columns leads an index, otherwise a full scan of r.
+    """
+
+    def __init__(self, catalog=None, statistics=None):
+        self.catalog = catalog or get_catalog()
+        self.statistics = statistics or get_statistics()
+
+    def table_rows(self, table):
+        rows = self.catalog.get_row_count(table)
+        if rows is None:
+            rows = self.statistics.estimate_rows(table)
+        return DEFAULT_ROWS if rows is None else max(rows, 1)
+
+    def indexes(self, table):
+        return self.catalog.get_indexes(table)
+
+    def distinct_values(self, relation, column):
+        ndv = self.statistics.distinct_values(relation.table, column)
+        if ndv:
+            return min(ndv, relation.rows)
+        if self.indexes(relation.table).get(column.lower()):
+            return relation.rows
+        return max(relation.rows / DUPLICATION_FACTOR, 1)
+
+    def selectivity(self, predicate, relations):
+        """Fraction of rows that satisfy `predicate`; 1 when it cannot be analysed."""
+        expr = predicate.expr
+        if len(predicate.refs) == 1:
+            table = relations[next(iter(predicate.refs))].table
+            if self.statistics.table(table) is not None:
+                return self.statistics.selectivity(table, expr)
+        if not isinstance(expr, BinaryOp) or expr.op not in COMPARISONS:
+            return 1.0
+        left, right = expr.left, expr.right
+        if isinstance(left, Literal):
+            left, right = right, left
+        if not isinstance(left, Column):
+            return 1.0
+        if isinstance(right, Column):
+            if expr.op != "=" or len(predicate.refs) != 2:
+                return RANGE_SELECTIVITY
+            ndv = max(self.distinct_values(relations[predicate.column_refs[c]], c.name)
+                      for c in (left, right))
+            return 1 / ndv
+        if isinstance(right, Literal) and len(predicate.refs) == 1:
+            if expr.op == "=":
+                return 1 / self.distinct_values(relations[predicate.column_refs[left]], left.name)
+            return RANGE_SELECTIVITY
+        return 1.0
+
+
+class Relation:
+    __slots__ = ("index", "source", "table", "ref_name", "rows")
+
+    def __init__(self, index, source, rows):
+        self.index = index
+        self.source = source
+        self.table = source.name
+        self.ref_name = source.ref_name.lower()
+        self.rows = rows
+
+
+class Predicate:
+    """One conjunct; `refs` is the set of relation indexes it mentions."""
+    __slots__ = ("expr", "refs", "column_refs", "from_on")
+
+    def __init__(self, expr, column_refs, from_on):
+        self.expr = expr
+        self.column_refs = column_refs   # Column node -> relation index
+        self.refs = frozenset(column_refs.values())
+        self.from_on = from_on
+
+
+class JoinGraph:
+    def __init__(self, relations, predicates, model):
+        self.relations = relations
+        self.predicates = predicates
+        self.model = model
+        self.selectivities = [model.selectivity(p, relations) for p in predicates]
+        # Filtered cardinality of every relation on its own, and the cost of
+        # reading it first: an index lookup when a filter uses an indexed column
+        self.base_rows = []
+        self.scan_costs = []
+        for relation in relations:
+            rows = relation.rows
+            indexes = model.indexes(relation.table)
+            indexed = False
+            for predicate, selectivity in zip(predicates, self.selectivities):
+                if predicate.refs == {relation.index}:
+                    rows *= selectivity
+                    indexed = indexed or any(c.name.lower() in indexes for c in predicate.column_refs)
+            self.base_rows.append(max(rows, 1))
+            self.scan_costs.append(self.base_rows[-1] if indexed else relation.rows)
+
+    def _joining(self, placed, index):
+        """Predicates (with their selectivity) that link relation `index` to the `placed` ones."""
+        for predicate, selectivity in zip(self.predicates, self.selectivities):
+            refs = predicate.refs
+            if index in refs and len(refs) > 1 and refs - {index} <= placed:
+                yield predicate, selectivity
+
+    def connected(self, placed, index):
+        return any(True for _ in self._joining(placed, index))
+
+    def step(self, placed, rows, index):
+        """(cost, output rows) of joining relation `index` to `rows` rows covering `placed`."""
+        relation = self.relations[index]
+        indexes = self.model.indexes(relation.table)
+        selectivity = 1.0
+        indexed = False
+        for predicate, predicate_selectivity in self._joining(placed, index):
+            selectivity *= predicate_selectivity
+            indexed = indexed or any(ref == index and column.name.lower() in indexes
+                                     for column, ref in predicate.column_refs.items())
+        output = max(rows * self.base_rows[index] * selectivity, 1)
+        read = min(rows, relation.rows) if indexed else relation.rows
+        return read + output, output
+
+    def cost(self, order):
+        placed = {order[0]}
+        rows = self.base_rows[order[0]]
+        total = float(self.scan_costs[order[0]])
+        for index in order[1:]:
+            cost, rows = self.step(placed, rows, index)
+            total += cost
+            placed.add(index)
+        return total
+
+    def _candidates(self, placed, remaining):
+        connected = [i for i in remaining if self.connected(placed, i)]
+        return connected or list(remaining)
+
+    def order_dp(self):
+        """Cheapest left-deep order, by dynamic programming over subsets of relations."""
+        n = len(self.relations)
+        best = {}
+        for i in range(n):
+            best[1 << i] = (float(self.scan_costs[i]), self.base_rows[i], (i,))
+        for mask in range(1, 1 << n):
+            if mask not in best:
+                continue
+            cost, rows, order = best[mask]
+            placed = set(order)
+            for i in self._candidates(placed, [i for i in range(n) if not mask & (1 << i)]):
+                step_cost, out = self.step(placed, rows, i)
+                key = mask | (1 << i)
+                if key not in best or cost + step_cost < best[key][0]:
+                    best[key] = (cost + step_cost, out, order + (i,))
+        return list(best[(1 << n) - 1][2])
+
+    def order_greedy(self):
+        """Start from the smallest relation and keep adding the cheapest next join."""
+        remaining = list(range(len(self.relations)))
+        first = min(remaining, key=lambda i: (self.base_rows[i], self.scan_costs[i]))
+        order = [first]
+        remaining.remove(first)
+        placed = {first}
+        rows = self.base_rows[first]
+        while remaining:
+            choices = [(self.step(placed, rows, i), i) for i in self._candidates(placed, remaining)]
+            (_, rows), index = min(choices, key=lambda choice: choice[0][0])
+            order.append(index)
+            remaining.remove(index)
+            placed.add(index)
+        return order
+
+    def best_order(self):
+        if len(self.relations) <= DP_LIMIT:
+            return self.order_dp()
+        return self.order_greedy()
+
+
+def build_graph(base, joins, where=None, model=None):
+    """
+    Join graph of an inner-join chain, or None when it cannot be reordered.
+
+    Every column in the ON clauses must be qualified with one of the chain's
+    tables, and no two tables may share a reference name.
+    """
+    model = model or CostModel()
+    sources = [base] + [join.right for join in joins]
+    relations = []
+    by_name = {}
+    for index, source in enumerate(sources):
+        relation = Relation(index, source, model.table_rows(source.name))
+        if relation.ref_name in by_name:
+            return None
+        by_name[relation.ref_name] = index
+        relations.append(relation)
+
+    def resolve(expr):
+        refs = {}
+        for node in walk(expr):
+            if isinstance(node, Column):
+                index = by_name.get(node.table.lower()) if node.table else None
+                if index is None:
+                    return None
+                refs[node] = index
+        return refs
+
+    predicates = []
+    for join in joins:
+        for expr in conjuncts(join.condition):
+            refs = resolve(expr)
+            if refs is None:
+                return None
+            predicates.append(Predicate(expr, refs, True))
+    for expr in conjuncts(where):
+        refs = resolve(expr)
+        if refs:
+            # WHERE conjuncts only inform the estimates; they stay where they are
+            predicates.append(Predicate(expr, refs, False))
+    return JoinGraph(relations, predicates, model)
+
+
+def chain(base, joins):
+    """Left-deep join tree of `base` joined with the right side of each of `joins` in turn."""
+    item = base
+    for join in joins:
+        item = join.replace(left=item)
+    return item
+
+
+def rebuild_chain(graph, order):
+    """Left-deep join chain in `order`, each ON conjunct attached to the first join that can evaluate it."""
+    pending = [p for p in graph.predicates if p.from_on]
+    placed = {order[0]}
+    joins = []
+    for index in order[1:]:
+        placed.add(index)
+        ready = [p for p in pending if p.refs <= placed]
+        pending = [p for p in pending if not p.refs <= placed]
+        condition = and_all(p.expr for p in ready)
+        joins.append(Join("INNER" if condition is not None else "CROSS", None, graph.relations[index].source,
+                          condition, None))
+    return chain(graph.relations[order[0]].source, joins)
+
+
+def format_order(graph, order):
+    return ", ".join(graph.relations[i].source.to_sql() for i in order)
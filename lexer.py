@@ -1,46 +1,317 @@
 # lexer.py
 # Phase 1: Lexical Analysis - Tokenizing SQL query
 
+import hashlib
 import re
+from array import array
+from bisect import bisect_left
 
 # Define token types
-KEYWORDS = ["SELECT", "FROM", "WHERE", "INSERT", "UPDATE", "DELETE", "CREATE", "ALTER", "DROP", "JOIN", "INNER", "LEFT", "RIGHT", "ON", "VALUES", "SET"]
-OPERATORS = ["=", "<", ">", "<=", ">=", "<>", "LIKE", "AND", "OR", "NOT"]
-PUNCTUATION = [",", "(", ")", "*", ";","."]
+KEYWORDS = [
+    "SELECT", "FROM", "WHERE", "INSERT", "UPDATE", "DELETE", "CREATE", "ALTER", "DROP", "JOIN",
+    "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "OUTER", "ON", "USING", "VALUES", "SET", "INTO",
+    "TABLE", "AS", "DISTINCT", "ALL", "UNION", "GROUP BY", "ORDER BY", "HAVING", "LIMIT", "OFFSET",
+    "ASC", "DESC", "NULL", "TRUE", "FALSE", "EXISTS", "CASE", "WHEN", "THEN", "ELSE", "END", "IF",
+]
+OPERATORS = ["<=", ">=", "<>", "!=", "=", "<", ">", "+", "-", "/", "%", "||", "&&",
+             "LIKE", "AND", "OR", "NOT", "IN", "IS", "BETWEEN"]
+PUNCTUATION = [",", "(", ")", "*", ";", "."]
+
+# Token type codes stored in TokenBuffer.types
+TOKEN_TYPES = ("KEYWORD", "OPERATOR", "PUNCTUATION", "IDENTIFIER", "QUOTED_IDENTIFIER", "NUMBER", "STRING")
+KEYWORD, OPERATOR, PUNCTUATION_TYPE, IDENTIFIER, QUOTED_IDENTIFIER, NUMBER, STRING = range(len(TOKEN_TYPES))
 
-# Regular expressions for matching tokens
+_WORD_TYPES = {}
+_WORD_TYPES.update((op, OPERATOR) for op in OPERATORS if op.isalpha())
+_WORD_TYPES.update((kw, KEYWORD) for kw in KEYWORDS if " " not in kw)
+_WORD_TYPES.update((word, KEYWORD) for kw in KEYWORDS if " " in kw for word in kw.split())
+
+# Regular expressions for matching tokens. Words come first because they
+# are the most common token; numbers precede punctuation (.5) and comments
+# precede operators (-- and /*). Leading whitespace is skipped by the
+# combined pattern itself rather than emitted as a token.
 token_specification = [
-    ('KEYWORD',     r'\b(?:' + '|'.join(KEYWORDS) + r')\b'),
-    ('OPERATOR',    r'|'.join([re.escape(op) for op in OPERATORS])),
-    ('PUNCTUATION', r'|'.join([re.escape(p) for p in PUNCTUATION])),
-    ('IDENTIFIER',  r'[A-Za-z_][A-Za-z0-9_]*'),
-    ('NUMBER',      r'\b\d+\b'),
-    ('STRING',      r"'[^']*'"),
-    ('WHITESPACE',  r'[ \t\r\n]+'),  
-    ('MISMATCH',    r'.')            
+    ('WORD',              r'[A-Za-z_][A-Za-z0-9_$]*'),
+    ('NUMBER',            r'(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?'),
+    ('PUNCTUATION',       r'|'.join(re.escape(p) for p in PUNCTUATION)),
+    ('COMMENT',           r'--[^\n]*|#[^\n]*|/\*[\s\S]*?\*/'),
+    ('STRING',            r"'(?:[^'\\]|\\[\s\S]|'')*'|\"(?:[^\"\\]|\\[\s\S]|\"\")*\""),
+    ('QUOTED_IDENTIFIER', r'`(?:[^`]|``)*`'),
+    ('UNTERMINATED',      r"/\*|['\"`]"),
+    ('OPERATOR',          r'|'.join(re.escape(op) for op in OPERATORS if not op.isalpha())),
+    ('MISMATCH',          r'\S'),
 ]
 
+# GROUP BY / ORDER BY are lexed as one keyword token
+_MULTIWORD_TAIL = re.compile(r'\s+BY\b', re.IGNORECASE)
+_MULTIWORD_HEADS = {"GROUP", "ORDER"}
+
 # Combine all token patterns into one regex
-master_pattern = '|'.join(f'(?P<{pair[0]}>{pair[1]})' for pair in token_specification)
+master_pattern = r'\s*(?:' + '|'.join(f'(?P<{pair[0]}>{pair[1]})' for pair in token_specification) + ')'
 compiled_regex = re.compile(master_pattern)
 
+# Regex group number -> token type code (None for skipped groups)
+_GROUP_TYPES = [None] * (compiled_regex.groups + 1)
+for _name, _code in (('STRING', STRING), ('QUOTED_IDENTIFIER', QUOTED_IDENTIFIER), ('NUMBER', NUMBER),
+                     ('WORD', IDENTIFIER), ('OPERATOR', OPERATOR),
+                     ('PUNCTUATION', PUNCTUATION_TYPE)):
+    _GROUP_TYPES[compiled_regex.groupindex[_name]] = _code
+_WORD_GROUP = compiled_regex.groupindex['WORD']
+_UNTERMINATED_GROUP = compiled_regex.groupindex['UNTERMINATED']
+_MISMATCH_GROUP = compiled_regex.groupindex['MISMATCH']
+
+
+class TokenBuffer:
+    """
+    Tokens of one query stored as parallel arrays.
+
+    `types` holds one type code per token (an index into TOKEN_TYPES) and
+    `offsets` the start and end character offset of every token, interleaved,
+    into `source`. Token text is sliced from the source on demand rather than
+    copied. Indexing and iteration yield the classic (type, value) tuples.
+    """
+
+    __slots__ = ("source", "types", "offsets")
+
+    def __init__(self, source, types=None, offsets=None):
+        self.source = source
+        self.types = types if types is not None else array('B')
+        self.offsets = offsets if offsets is not None else array('I')
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self.types)
+        offsets = self.offsets
+        return (TOKEN_TYPES[self.types[index]], self.source[offsets[2 * index]:offsets[2 * index + 1]])
+
+    def __iter__(self):
+        source = self.source
+        offsets = iter(self.offsets)
+        for code, start, end in zip(self.types, offsets, offsets):
+            yield (TOKEN_TYPES[code], source[start:end])
+
+    @property
+    def starts(self):
+        return self.offsets[0::2]
+
+    @property
+    def ends(self):
+        return self.offsets[1::2]
+
+    def start(self, index):
+        return self.offsets[2 * index]
+
+    def end(self, index):
+        return self.offsets[2 * index + 1]
+
+    def value(self, index):
+        return self.source[self.offsets[2 * index]:self.offsets[2 * index + 1]]
+
+    def values(self):
+        source = self.source
+        offsets = iter(self.offsets)
+        return [source[start:end] for start, end in zip(offsets, offsets)]
+
+    def type_names(self):
+        return [TOKEN_TYPES[code] for code in self.types]
+
+    def source_span(self, span):
+        """Character offsets covered by a (start, end) token span from the parser."""
+        start, end = span
+        if start >= end:
+            offset = self.offsets[2 * start] if start < len(self) else len(self.source)
+            return (offset, offset)
+        return (self.offsets[2 * start], self.offsets[2 * end - 1])
+
+    def to_list(self):
+        return list(self)
+
+
+def _lex(query, pos=0, sync_from=None, resync=None):
+    """
+    Lex `query` from character `pos`; returns (types, offsets, stop).
+
+    `resync(start)` is called for every token starting at or after
+    `sync_from`; lexing stops before the first token for which it returns
+    a value, which is passed back as `stop` (None when the end was reached).
+    """
+    types = []
+    offsets = []
+    types_append = types.append
+    offsets_extend = offsets.extend
+    group_types = _GROUP_TYPES
+    word_types = _WORD_TYPES
+    if sync_from is None:
+        sync_from = len(query) + 1
+    resume = 0
+
+    for match in compiled_regex.finditer(query, pos):
+        group = match.lastindex
+        span = match.span(group)
+        if span[0] >= sync_from and not resume:
+            stop = resync(span[0])
+            if stop is not None:
+                return types, offsets, stop
+        if group == _WORD_GROUP:
+            if resume:
+                # The BY of a GROUP BY / ORDER BY that was already emitted
+                resume = 0
+                continue
+            word = match[group].upper()
+            if word in _MULTIWORD_HEADS:
+                tail = _MULTIWORD_TAIL.match(query, span[1])
+                if tail:
+                    resume = 1
+                    types_append(KEYWORD)
+                    offsets_extend((span[0], tail.end()))
+                    continue
+            types_append(word_types.get(word, IDENTIFIER))
+        else:
+            code = group_types[group]
+            if code is None:
+                if group == _MISMATCH_GROUP:
+                    raise ValueError(f"Illegal character at position {span[0]}: '{match[group]}'")
+                if group == _UNTERMINATED_GROUP:
+                    raise ValueError(f"Unterminated {'comment' if match[group] == '/*' else 'quote'} "
+                                     f"at position {span[0]}: '{match[group]}'")
+                continue  # comment
+            types_append(code)
+        offsets_extend(span)
+    return types, offsets, None
+
+
+def tokenize(query):
+    """Tokenize a query into a TokenBuffer; raises ValueError on illegal input."""
+    types, offsets, _ = _lex(query)
+    return TokenBuffer(query, array('B', types), array('I', offsets))
+
+
+def _common_prefix(a, b):
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _common_suffix(a, b, limit):
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[len(a) - middle:] == b[len(b) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def relex(tokens, query):
+    """
+    Tokenize `query`, an edited version of `tokens.source`, re-lexing only
+    the tokens around the edit; raises ValueError on illegal input.
+
+    Lexing restarts one token before the first changed character and stops
+    as soon as a token lines up with an old token after the edit; the rest
+    of the old tokens are reused with their offsets shifted. Returns
+    (buffer, start, old_end, new_end): old tokens [start, old_end) were
+    replaced by new tokens [start, new_end), all other tokens are equal.
+    """
+    source = tokens.source
+    count = len(tokens)
+    prefix = _common_prefix(source, query)
+    suffix = _common_suffix(source, query, min(len(source), len(query)) - prefix)
+    shift = len(query) - len(source)
+
+    touched = bisect_left(tokens.ends, prefix)
+    first = max(touched - 1, 0)
+    pos = tokens.start(first) if touched else 0
+    starts = tokens.starts
+
+    def resync(start):
+        index = bisect_left(starts, start - shift, first)
+        if index < count and starts[index] == start - shift:
+            return index
+        return None
+
+    types, offsets, stop = _lex(query, pos, len(query) - suffix, resync)
+    old_end = count if stop is None else stop
+    new_end = first + len(types)
+
+    tail = tokens.offsets[2 * old_end:]
+    if shift:
+        tail = array('I', [offset + shift for offset in tail])
+    buffer = TokenBuffer(query, tokens.types[:first] + array('B', types) + tokens.types[old_end:],
+                         tokens.offsets[:2 * first] + array('I', offsets) + tail)
+
+    # Re-lexed tokens at either end of the range may be unchanged
+    start = first
+    while (start < old_end and start < new_end and tokens.types[start] == buffer.types[start]
+           and tokens.value(start) == buffer.value(start)):
+        start += 1
+    while (old_end > start and new_end > start and tokens.types[old_end - 1] == buffer.types[new_end - 1]
+           and tokens.value(old_end - 1) == buffer.value(new_end - 1)):
+        old_end -= 1
+        new_end -= 1
+    return buffer, start, old_end, new_end
+
+
+def lex_many(queries, strict=True):
+    """
+    Tokenize many queries in one call, e.g. a whole query log.
+
+    Returns one TokenBuffer per query. With strict=False a query that fails
+    to tokenize yields None instead of raising.
+    """
+    results = []
+    append = results.append
+    for query in queries:
+        try:
+            append(tokenize(query))
+        except ValueError:
+            if strict:
+                raise
+            append(None)
+    return results
+
+
 def lexer(query):
     """Lexical analyzer that yields tokens (type, value) from SQL query."""
-    position = 0
-    while position < len(query):
-        match = compiled_regex.match(query, position)
-        if match:
-            token_type = match.lastgroup
-            value = match.group(token_type)
-
-            if token_type == 'WHITESPACE':
-                position = match.end()
-                continue
-            elif token_type == 'MISMATCH':
-                raise ValueError(f"Illegal character at position {position}: '{value}'")
-            else:
-                yield (token_type, value)
+    yield from tokenize(query)
+
+
+def fingerprint(tokens):
+    """
+    Normalized fingerprint of a tokenized query.
 
-            position = match.end()
+    Whitespace, comments, keyword case and literal values are ignored:
+    numbers become `?n` and strings `?s`. Returns (digest, literals) where
+    `literals` maps token index -> literal text for re-binding values.
+    """
+    parts = []
+    literals = {}
+    source = tokens.source
+    offsets = tokens.offsets
+    for index, code in enumerate(tokens.types):
+        text = source[offsets[2 * index]:offsets[2 * index + 1]]
+        if code == NUMBER:
+            parts.append("?n")
+            literals[index] = text
+        elif code == STRING:
+            parts.append("?s")
+            literals[index] = text
+        elif code == KEYWORD or code == OPERATOR:
+            parts.append(" ".join(text.upper().split()))
         else:
-            raise ValueError(f"Illegal character at position {position}")
+            parts.append(text)
+    if parts and parts[-1] == ";":
+        parts.pop()
+    digest = hashlib.blake2b("\x1f".join(parts).encode(), digest_size=16).hexdigest()
+    return digest, literals
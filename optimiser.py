@@ -1,16 +1,575 @@
 import re
+import time
+
+from catalog import get_catalog
+from explain import explain_cost
+from join_order import build_graph, chain, format_order, rebuild_chain
+from parser import ParseError, parse_sql
+from predicates import simplify_predicate
+from profiler import PASS, profiled, span
 from semantic import get_table_columns
+from sql_ast import (
+    AGGREGATES, BinaryOp, Column, Delete, Exists, FuncCall, InList, IsNull, Join, Literal, Select, SelectItem,
+    SetOperation, Star, SubqueryRef, TableRef, Update, and_all, conjuncts, disjuncts, table_sources, transform,
+    walk, walk_block,
+)
+from unnesting import decorrelate_scalar_subqueries, merge_derived_tables, unnest_semi_joins, with_qualified_stars
+
+
+# ------------------------------------------------------------------ AST passes
+#
+# Each pass takes one query block (a Select, Update or Delete node) and
+# returns (new_block, hits), handing back the very same object when it has
+# nothing to rewrite. A pass may return (new_block, hits, notes) to add
+# details such as cost estimates to the logged optimization step.
+
+def _is_tautology(expr):
+    if isinstance(expr, Literal):
+        return expr.kind == "boolean" and expr.python_value is True
+    return (isinstance(expr, BinaryOp) and expr.op == "="
+            and isinstance(expr.left, Literal) and isinstance(expr.right, Literal)
+            and expr.left.kind in ("number", "string")
+            and expr.left.key() == expr.right.key())
+
+
+def remove_tautologies(block):
+    """WHERE 1=1 AND x -> WHERE x"""
+    parts = conjuncts(block.where)
+    kept = [part for part in parts if not _is_tautology(part)]
+    if len(kept) == len(parts):
+        return block, 0
+    return block.replace(where=and_all(kept)), len(parts) - len(kept)
+
+
+def normalize_predicates(block):
+    """WHERE NOT (a <= 1) AND 10 > a AND a <> 4 -> WHERE a > 1 AND a < 10 AND a <> 4; see predicates.py"""
+    where, notes = simplify_predicate(block.where)
+    if where is block.where:
+        return block, 0
+    hits = max(len(conjuncts(block.where)) - len(conjuncts(where)), 1)
+    return block.replace(where=where), hits, notes
+
+
+def remove_duplicate_conditions(block):
+    """WHERE a = 1 AND a = 1 -> WHERE a = 1"""
+    parts = conjuncts(block.where)
+    seen = set()
+    kept = []
+    for part in parts:
+        key = part.key()
+        if key not in seen:
+            seen.add(key)
+            kept.append(part)
+    if len(kept) == len(parts):
+        return block, 0
+    return block.replace(where=and_all(kept)), len(parts) - len(kept)
+
+
+def _equality_operands(expr):
+    if isinstance(expr, BinaryOp) and expr.op == "=":
+        if isinstance(expr.left, Column) and isinstance(expr.right, Literal):
+            return expr.left, [expr.right]
+        if isinstance(expr.right, Column) and isinstance(expr.left, Literal):
+            return expr.right, [expr.left]
+    if isinstance(expr, InList) and not expr.negated and isinstance(expr.expr, Column):
+        if all(isinstance(item, Literal) for item in expr.items):
+            return expr.expr, list(expr.items)
+    return None
+
+
+def convert_or_to_in(block):
+    """WHERE a = 1 OR a = 2 -> WHERE a IN (1, 2)"""
+    parts = conjuncts(block.where)
+    new_parts = []
+    hits = 0
+    for part in parts:
+        options = disjuncts(part)
+        if len(options) > 1:
+            operands = [_equality_operands(option) for option in options]
+            if all(operands) and len({column.key() for column, _ in operands}) == 1:
+                values = []
+                seen = set()
+                for _, literals in operands:
+                    for literal in literals:
+                        if literal.key() not in seen:
+                            seen.add(literal.key())
+                            values.append(literal)
+                new_parts.append(InList(operands[0][0], values, False))
+                hits += 1
+                continue
+        new_parts.append(part)
+    if not hits:
+        return block, 0
+    return block.replace(where=and_all(new_parts)), hits
+
+
+def _qualify(expr, inner_names, alias):
+    """Point columns of a flattened subquery at the alias it was known by outside."""
+    def visit(node):
+        if isinstance(node, Column):
+            if len(node.parts) == 1 or node.table.lower() in inner_names:
+                return Column([alias, node.parts[-1]])
+        return node
+    return transform(expr, visit)
+
+
+def _flattenable(item):
+    if not isinstance(item, SubqueryRef) or not item.alias or not isinstance(item.query, Select):
+        return False
+    query = item.query
+    return (len(query.columns) == 1 and isinstance(query.columns[0].expr, Star)
+            and query.columns[0].expr.table is None
+            and len(query.from_) == 1 and isinstance(query.from_[0], TableRef)
+            and not (query.distinct or query.group_by or query.having is not None
+                     or query.order_by or query.limit is not None or query.offset is not None)
+            and (query.where is None or not any(isinstance(node, Select) for node in walk(query.where))))
+
+
+def flatten_subqueries(block):
+    """FROM (SELECT * FROM t WHERE c) x -> FROM t x WHERE x.c"""
+    if not isinstance(block, Select) or not block.from_:
+        return block, 0
+    lifted = []
+    flattened = 0
+
+    def flatten(item, preserved):
+        nonlocal flattened
+        # Only tables whose rows are never null-extended can move their filter to WHERE
+        if isinstance(item, Join):
+            left = flatten(item.left, preserved and item.kind in ("INNER", "CROSS", "LEFT"))
+            right = flatten(item.right, preserved and item.kind in ("INNER", "CROSS", "RIGHT"))
+            if left is item.left and right is item.right:
+                return item
+            return item.replace(left=left, right=right)
+        if preserved and _flattenable(item):
+            inner = item.query
+            table = inner.from_[0]
+            if inner.where is not None:
+                names = {table.name.lower(), table.ref_name.lower()}
+                lifted.extend(conjuncts(_qualify(inner.where, names, item.alias)))
+            flattened += 1
+            return TableRef(table.parts, item.alias)
+        return item
+
+    from_ = [flatten(item, True) for item in block.from_]
+    if not flattened:
+        return block, 0
+    return block.replace(from_=from_, where=and_all(lifted + conjuncts(block.where))), flattened
+
+
+def _join_chain(item):
+    """Unroll a left-deep join tree into (base, [join, ...])."""
+    joins = []
+    while isinstance(item, Join):
+        joins.append(item)
+        item = item.left
+    return item, list(reversed(joins))
+
+
+def remove_redundant_joins(block):
+    """Drop a JOIN that repeats an earlier join of the same table on the same condition."""
+    if not isinstance(block, Select):
+        return block, 0
+    hits = 0
+    from_ = []
+    for item in block.from_:
+        base, joins = _join_chain(item)
+        seen = set()
+        kept = []
+        for join in joins:
+            key = (join.kind, join.right.key(), join.condition.key() if join.condition is not None else None)
+            if key in seen:
+                hits += 1
+                continue
+            seen.add(key)
+            kept.append(join)
+        from_.append(chain(base, kept) if len(kept) != len(joins) else item)
+    if not hits:
+        return block, 0
+    return block.replace(from_=from_), hits
+
+
+def _key_equalities(condition, alias):
+    """{lower column of `alias`: other side} for the `alias.column = expr` conjuncts of an ON clause."""
+    equalities = {}
+    for part in conjuncts(condition):
+        if not isinstance(part, BinaryOp) or part.op != "=":
+            continue
+        for column, other in ((part.left, part.right), (part.right, part.left)):
+            if (isinstance(column, Column) and len(column.parts) == 2 and column.table.lower() == alias
+                    and not any(isinstance(node, (Column, Star)) and node.table is not None
+                                and node.table.lower() == alias or isinstance(node, (Select, SetOperation))
+                                for node in walk(other))):
+                equalities[column.name.lower()] = other
+                break
+    return equalities
+
+
+def _removable_join(join, tables, catalog):
+    """
+    Why `join` can be dropped when nothing outside its ON clause reads its
+    table: (note, WHERE conditions to add), or None when that is not proven.
+
+    A LEFT JOIN keeps every row of its left side exactly once when at most
+    one row can match, i.e. the ON clause equates a unique key of the table.
+    An INNER JOIN also needs at least one match: its ON clause must equate
+    exactly a foreign key of an earlier table (one in `tables`, which no
+    outer join null-extends) with the key it references, and rows where
+    that foreign key is NULL (which match nothing) are filtered out instead.
+    """
+    table = join.right
+    alias = table.ref_name.lower()
+    equalities = _key_equalities(join.condition, alias)
+    unique_keys = [set(key) for key in catalog.get_unique_keys(table.name)]
+    if not any(key <= set(equalities) for key in unique_keys):
+        return None
+    if join.kind == "LEFT":
+        return f"LEFT JOIN {table.to_sql()}: at most one row matches its unique key", []
+    if len(equalities) != len(conjuncts(join.condition)):
+        return None
+    sides = {(other.table or "").lower() if isinstance(other, Column) else None for other in equalities.values()}
+    referencing = tables.get(sides.pop()) if len(sides) == 1 else None
+    if referencing is None:
+        return None
+    pairs = {(other.name.lower(), column) for column, other in equalities.items()}
+    for columns, referenced_table, referenced_columns in catalog.get_foreign_keys(referencing.name):
+        if (referenced_table == table.name.lower() and set(zip(columns, referenced_columns)) == pairs
+                and set(referenced_columns) in unique_keys):
+            filters = [IsNull(Column([referencing.ref_name, column]), True) for column in columns
+                       if not catalog.is_not_null(referencing.name, column)]
+            return (f"JOIN {table.to_sql()}: foreign key {referencing.name}({', '.join(columns)}) "
+                    f"-> {table.name}({', '.join(referenced_columns)})"), filters
+    return None
+
+
+def _reads_table(block, join, columns):
+    """True when something outside `join`'s ON clause may read the joined table (columns: its lower names)."""
+    alias = join.right.ref_name.lower()
+    condition = {id(node) for node in walk(join.condition)} if join.condition is not None else set()
+    for node in walk(block):
+        if id(node) in condition:
+            continue
+        if isinstance(node, (Column, Star)) and node.table is not None and node.table.lower() == alias:
+            return True
+        if isinstance(node, Column) and node.table is None and node.name.lower() in columns:
+            return True
+    return any(isinstance(item.expr, Star) and item.expr.table is None for item in block.columns)
+
+
+def _null_extended(item, extended=False):
+    """Yield the table sources under a FROM item whose rows an outer join may null-extend."""
+    if isinstance(item, Join):
+        yield from _null_extended(item.left, extended or item.kind in ("RIGHT", "FULL"))
+        yield from _null_extended(item.right, extended or item.kind in ("LEFT", "FULL"))
+    elif extended:
+        yield item
+
+
+def eliminate_unused_joins(block):
+    """
+    Drop a JOIN whose table is only read by its own ON clause when the
+    catalog's key constraints prove that it changes neither which rows come
+    out nor how often (see _removable_join).
+    """
+    if not isinstance(block, Select):
+        return block, 0
+    catalog = get_catalog()
+    notes = []
+    filters = []
+    from_ = []
+    for item in block.from_:
+        base, joins = _join_chain(item)
+        kept = list(joins)
+        for join in joins:
+            if (join.kind not in ("INNER", "LEFT") or not isinstance(join.right, TableRef)
+                    or len(join.right.parts) != 1 or join.condition is None):
+                continue
+            columns = {column.lower() for column in get_table_columns(join.right.name)}
+            tree = chain(base, kept)
+            current = block.replace(from_=from_ + [tree] + block.from_[len(from_) + 1:])
+            if not columns or _reads_table(current, join, columns):
+                continue
+            # A null-extended row has a NULL foreign key even when the column is
+            # NOT NULL, so only tables no outer join pads can vouch for a match
+            padded = {id(source) for source in _null_extended(tree)}
+            tables = {source.ref_name.lower(): source for source in table_sources([tree])
+                      if isinstance(source, TableRef) and len(source.parts) == 1 and source is not join.right
+                      and id(source) not in padded}
+            proof = _removable_join(join, tables, catalog)
+            if proof is None:
+                continue
+            note, conditions = proof
+            kept.remove(join)
+            notes.append(note)
+            filters.extend(conditions)
+        from_.append(chain(base, kept) if len(kept) != len(joins) else item)
+    if not notes:
+        return block, 0
+    return block.replace(from_=from_, where=and_all(conjuncts(block.where) + filters)), len(notes), notes
+
+
+def expand_select_star(block):
+    """SELECT * FROM t -> SELECT col1, col2 FROM t"""
+    if (not isinstance(block, Select) or len(block.columns) != 1
+            or not isinstance(block.columns[0].expr, Star) or block.columns[0].expr.table is not None
+            or len(block.from_) != 1 or not isinstance(block.from_[0], TableRef)):
+        return block, 0
+    try:
+        columns = get_table_columns(block.from_[0].name)
+    except Exception:
+        return block, 0
+    if not columns:
+        return block, 0
+    return block.replace(columns=[SelectItem(Column([name]), None) for name in columns]), 1
+
+
+def _output_name(item):
+    if item.alias:
+        return item.alias.strip('`"').lower()
+    return item.expr.name.lower() if isinstance(item.expr, Column) else None
+
+
+def _pruned_derived_table(block, derived):
+    """The derived table's query without the columns `block` never reads, or None."""
+    query = derived.query
+    if (not derived.alias or not isinstance(query, Select) or query.distinct
+            or any(isinstance(item.expr, Star) for item in query.columns)):
+        return None
+    alias = derived.ref_name.lower()
+    inside = {id(node) for node in walk(derived)}
+    needed = set()
+    for node in walk(block):
+        if id(node) in inside:
+            continue
+        if isinstance(node, Star) and (node.table is None and any(item.expr is node for item in block.columns)
+                                       or node.table is not None and node.table.lower() == alias):
+            return None
+        if isinstance(node, Column) and (node.table is None or node.table.lower() == alias):
+            # An unqualified column may belong to any table of the block
+            needed.add(node.name.lower())
+        elif isinstance(node, Join) and node.using:
+            needed.update(column.strip('`"').lower() for column in node.using)
+    # GROUP BY, HAVING and ORDER BY may refer to select aliases
+    aliases = {_output_name(item) for item in query.columns
+               if item.alias and not (isinstance(item.expr, Column) and _output_name(item) == item.expr.name.lower())}
+    for expr in query.group_by + [item.expr for item in query.order_by] + [query.having]:
+        if expr is not None:
+            needed.update(node.name.lower() for node in walk(expr)
+                          if isinstance(node, Column) and node.table is None and node.name.lower() in aliases)
+    kept = [item for item in query.columns if _output_name(item) is None or _output_name(item) in needed]
+    if len(kept) == len(query.columns):
+        return None
+    # At least one column; the first keeps a lone aggregate aggregating
+    return query.replace(columns=kept or query.columns[:1])
+
+
+def prune_unused_columns(block):
+    """
+    (SELECT a, b, c FROM t) s ... s.a -> (SELECT a FROM t) s ... s.a
+    EXISTS (SELECT a, b FROM t ...) -> EXISTS (SELECT 1 FROM t ...)
+    """
+    if not isinstance(block, Select):
+        return block, 0
+    replacements = {}  # id(node) -> replacement
+    notes = []
+    for source in table_sources(block.from_):
+        if isinstance(source, SubqueryRef):
+            pruned = _pruned_derived_table(block, source)
+            if pruned is not None:
+                dropped = [item.to_sql() for item in source.query.columns if item not in pruned.columns]
+                replacements[id(source)] = source.replace(query=pruned)
+                notes.append(f"derived table {source.alias}: dropped {', '.join(dropped)}")
+    for node in walk_block(block):
+        if not isinstance(node, Exists) or not isinstance(node.query, Select):
+            continue
+        query = node.query
+        one = [SelectItem(Literal("1", "number"), None)]
+        if (query.having is not None or query.limit is not None or query.offset is not None
+                or [item.key() for item in query.columns] == [item.key() for item in one]
+                or not query.group_by and any(isinstance(part, FuncCall) and part.name.upper() in AGGREGATES
+                                              for item in query.columns for part in walk(item))):
+            continue
+        # Neither the select list nor the order of the rows changes whether a row exists
+        replacements[id(node)] = node.replace(query=query.replace(distinct=False, columns=one, order_by=[]))
+        notes.append(f"EXISTS subquery on {', '.join(source.to_sql() for source in query.from_)}: "
+                     f"select list replaced with 1")
+    if not notes:
+        return block, 0
+    return transform(block, lambda node: replacements.get(id(node), node)), len(notes), notes
+
+
+def reorder_joins_by_cost(block):
+    """Put each chain of inner joins in the cheapest order the join cost model finds."""
+    if not isinstance(block, Select):
+        return block, 0
+    hits = 0
+    notes = []
+    from_ = []
+    for item in block.from_:
+        base, joins = _join_chain(item)
+        graph = None
+        if (joins and isinstance(base, TableRef)
+                and all(join.kind in ("INNER", "CROSS") and isinstance(join.right, TableRef) and not join.using
+                        for join in joins)):
+            graph = build_graph(base, joins, block.where)
+        if graph is None:
+            from_.append(item)
+            continue
+        current = list(range(len(graph.relations)))
+        order = graph.best_order()
+        cost, current_cost = graph.cost(order), graph.cost(current)
+        # The tolerance keeps equally cheap orders from swapping back and forth
+        if order == current or cost >= current_cost * (1 - 1e-9):
+            from_.append(item)
+            continue
+        hits += 1
+        from_.append(rebuild_chain(graph, order))
+        notes.append(f"{format_order(graph, order)}, estimated cost {cost:,.0f} (was {current_cost:,.0f})")
+    if not hits:
+        return block, 0
+    # A bare * lists columns in FROM order, so it is spelled out per table first
+    columns = with_qualified_stars(block)
+    if columns is None:
+        return block, 0
+    return block.replace(columns=columns, from_=from_), hits, notes
+
+
+class RewritePass:
+    def __init__(self, name, description, rewrite, applies_to=(Select,)):
+        self.name = name
+        self.description = description
+        self.rewrite = rewrite
+        self.applies_to = applies_to
+
+
+WHERE_BLOCKS = (Select, Update, Delete)
+
+DEFAULT_PASSES = [
+    RewritePass("remove_tautologies", "Removed 'WHERE 1=1'", remove_tautologies, WHERE_BLOCKS),
+    RewritePass("flatten_subqueries", "Flattened subquery in FROM clause", flatten_subqueries),
+    RewritePass("merge_derived_tables", "Merged derived table into the outer query", merge_derived_tables),
+    RewritePass("unnest_semi_joins", "Rewrote IN / EXISTS subqueries as joins", unnest_semi_joins),
+    RewritePass("decorrelate_scalar_subqueries", "Decorrelated scalar subqueries into grouped joins",
+                decorrelate_scalar_subqueries),
+    RewritePass("normalize_predicates", "Normalized and merged predicates in WHERE clause",
+                normalize_predicates, WHERE_BLOCKS),
+    RewritePass("remove_redundant_joins", "Removed redundant joins", remove_redundant_joins),
+    RewritePass("eliminate_unused_joins", "Eliminated unused joins", eliminate_unused_joins),
+    RewritePass("remove_duplicate_conditions", "Removed duplicate conditions from WHERE clause",
+                remove_duplicate_conditions, WHERE_BLOCKS),
+    RewritePass("expand_select_star", "Replaced SELECT * with explicit column names", expand_select_star),
+    RewritePass("prune_unused_columns", "Pruned columns no outer query reads", prune_unused_columns),
+    RewritePass("convert_or_to_in", "Converted OR chains to IN clauses", convert_or_to_in, WHERE_BLOCKS),
+    RewritePass("reorder_joins", "Reordered joins by estimated cost", reorder_joins_by_cost),
+]
+
+
+class PassManager:
+    """
+    Runs rewrite passes over an AST until none of them changes anything.
+
+    Passes are applied to every query block (including nested subqueries).
+    Because unchanged subtrees are shared between rewrites, the result of
+    each pass on each block is remembered and reused when the same block
+    comes up again; only blocks that changed since are rewritten. Passing
+    the same `memo` dict to several managers (e.g. for successive edits of
+    one query) carries those results over between runs.
+    """
+
+    def __init__(self, passes=None, max_iterations=10, memo=None):
+        self.passes = list(DEFAULT_PASSES if passes is None else passes)
+        self.max_iterations = max_iterations
+        self.stats = {p.name: {"runs": 0, "hits": 0, "rejected": 0, "time_ms": 0.0} for p in self.passes}
+        self.iterations = 0
+        # pass name -> {id(block): (block, rewrite result)}
+        self._memo = {} if memo is None else memo
+        for p in self.passes:
+            self._memo.setdefault(p.name, {})
+        self._rejected = {}  # pass name -> tree whose rewrite by that pass was rejected
+
+    def run_pass(self, rewrite_pass, tree):
+        memo = self._memo[rewrite_pass.name]
+        hits = 0
+        notes = []
+
+        def visit(node):
+            nonlocal hits
+            if not isinstance(node, rewrite_pass.applies_to):
+                return node
+            entry = memo.get(id(node))
+            if entry is not None and entry[0] is node:
+                result = entry[1]
+            else:
+                result = rewrite_pass.rewrite(node)
+                memo[id(node)] = (node, result)
+            new_node = result[0]
+            if new_node is not node:
+                hits += result[1]
+                notes.extend(result[2] if len(result) > 2 else ())
+            return new_node
+
+        with span(rewrite_pass.name, PASS):
+            return transform(tree, visit), hits, notes
+
+    def run(self, tree, on_change=None, accept=None):
+        """
+        Rewrite `tree` to a fixpoint. `accept(rewrite_pass, old_tree, new_tree)`
+        may veto a rewrite; the pass is then not retried on that same tree.
+        """
+        for _ in range(self.max_iterations):
+            self.iterations += 1
+            changed = False
+            for rewrite_pass in self.passes:
+                if self._rejected.get(rewrite_pass.name) is tree:
+                    continue
+                started = time.perf_counter()
+                new_tree, hits, notes = self.run_pass(rewrite_pass, tree)
+                elapsed = (time.perf_counter() - started) * 1000
+                stats = self.stats[rewrite_pass.name]
+                stats["runs"] += 1
+                stats["time_ms"] += elapsed
+                if new_tree is tree:
+                    continue
+                if accept is not None and not accept(rewrite_pass, tree, new_tree):
+                    self._rejected[rewrite_pass.name] = tree
+                    stats["rejected"] += 1
+                    continue
+                stats["hits"] += hits
+                changed = True
+                tree = new_tree
+                if on_change is not None:
+                    on_change(rewrite_pass, tree, hits, elapsed, notes)
+            if not changed:
+                break
+        return tree
+
 
 class SQLQueryOptimizer:
-    def __init__(self, query):
+    """
+    With verify=True every AST rewrite is checked with `EXPLAIN FORMAT=JSON`
+    (through `explain`, cached by fingerprint) and kept only when MySQL's
+    estimated cost does not go up; the cost change is shown in its step.
+    Rejected rewrites are listed in `rejected`.
+    """
+
+    def __init__(self, query, ast=None, verify=False, explain=None, memo=None):
         self.original_query = query
         self.query = query
         self.steps = [("Original Query", query.strip())]
+        self.ast = ast
+        self.pass_stats = {}
+        self.verify = verify
+        self.explain = explain or explain_cost
+        self.cost = None
+        self.rejected = []  # (description, query, cost note)
+        self._cost_note = None
+        self.memo = memo  # shared PassManager memo, see PassManager
 
     def log_step(self, description):
         if self.steps[-1][1].strip() != self.query.strip():
             self.steps.append((description, self.query.strip()))
 
+    @profiled(category=PASS)
     def remove_where_1_equals_1(self):
         original = self.query
         self.query = re.sub(
@@ -22,6 +581,7 @@ class SQLQueryOptimizer:
             self.log_step("Removed 'WHERE 1=1'")
         return self
 
+    @profiled(category=PASS)
     def remove_redundant_predicates(self):
         original = self.query
         self.query = re.sub(
@@ -34,6 +594,7 @@ class SQLQueryOptimizer:
             self.log_step("Simplified redundant predicates in WHERE clause")
         return self
 
+    @profiled(category=PASS)
     def remove_redundant_joins(self):
         join_pattern = re.compile(
             r'(JOIN\s+(\w+)(?:\s+\w+)?\s+ON\s+([^\s]+)\s*=\s*([^\s]+))',
@@ -55,6 +616,7 @@ class SQLQueryOptimizer:
             self.log_step("Removed redundant joins")
         return self
 
+    @profiled(category=PASS)
     def join_elimination(self):
         join_pattern = re.compile(r'JOIN\s+(\w+)(?:\s+(\w+))?', flags=re.IGNORECASE)
         joins = join_pattern.findall(self.query)
@@ -79,6 +641,7 @@ class SQLQueryOptimizer:
             self.log_step("Eliminated unused joins")
         return self
 
+    @profiled(category=PASS)
     def optimize_where_conditions(self):
         where_match = re.search(r'WHERE\s+(.+)', self.query, flags=re.IGNORECASE | re.DOTALL)
         if not where_match:
@@ -100,6 +663,7 @@ class SQLQueryOptimizer:
             self.log_step("Removed duplicate conditions from WHERE clause")
         return self
 
+    @profiled(category=PASS)
     def simplify_select_star(self):
         pattern = re.compile(r'SELECT\s+\*\s+FROM\s+(\w+)', flags=re.IGNORECASE)
 
@@ -119,6 +683,7 @@ class SQLQueryOptimizer:
             self.log_step("Replaced SELECT * with explicit column names")
         return self
 
+    @profiled(category=PASS)
     def flatten_subqueries(self):
         pattern = re.compile(
             r'FROM\s+\(\s*SELECT\s+\*\s+FROM\s+(\w+)\s+WHERE\s+([^)]+?)\s*\)\s+(\w+)',
@@ -147,23 +712,7 @@ class SQLQueryOptimizer:
                 self.log_step("Flattened subquery in FROM clause")
         return self
 
-    def reorder_joins(self):
-        join_pattern = re.compile(r'JOIN\s+(\w+)\s+ON\s+([^\s]+)\s*=\s*[^\s]+', flags=re.IGNORECASE)
-        joins = join_pattern.findall(self.query)
-        if joins:
-            original = self.query
-            joins = sorted(joins, key=lambda x: x[0].lower())
-            join_clauses = [f'JOIN {table} ON {on_condition}' for table, on_condition in joins]
-            first_join_match = join_pattern.search(self.query)
-            if first_join_match:
-                start = first_join_match.start()
-                prefix = self.query[:start]
-                suffix = join_pattern.sub('', self.query[start:])
-                self.query = prefix + ' ' + ' '.join(join_clauses) + ' ' + suffix
-            if self.query != original:
-                self.log_step("Reordered joins alphabetically by table name")
-        return self
-
+    @profiled(category=PASS)
     def convert_or_to_in(self):
         where_match = re.search(r'WHERE\s+(.+)', self.query, flags=re.IGNORECASE | re.DOTALL)
         if not where_match:
@@ -205,7 +754,54 @@ class SQLQueryOptimizer:
             self.log_step("Converted OR chains to IN clauses")
         return self
 
-    def optimize(self):
+    def _record_pass(self, rewrite_pass, tree, hits, elapsed_ms, notes=()):
+        self.ast = tree
+        self.query = tree.to_sql()
+        noun = "rewrite" if hits == 1 else "rewrites"
+        # Step descriptions stay the same from run to run; pass timings are in pass_stats and the profiler
+        description = f"{rewrite_pass.description} ({hits} {noun})"
+        if notes:
+            description += ": " + "; ".join(notes)
+        if self._cost_note:
+            description += f" [{self._cost_note}]"
+            self._cost_note = None
+        self.log_step(description)
+
+    def _accept_pass(self, rewrite_pass, old_tree, new_tree):
+        rewritten = new_tree.to_sql()
+        new_cost = self.explain(rewritten)
+        if new_cost is None or self.cost is None:
+            # Nothing to compare against: keep the rewrite unverified
+            self._cost_note = "cost unavailable"
+            self.cost = new_cost
+            return True
+        note = f"cost {self.cost:,.2f} -> {new_cost:,.2f}, {new_cost - self.cost:+,.2f}"
+        if new_cost > self.cost * (1 + 1e-9):
+            self.rejected.append((rewrite_pass.description, rewritten, note))
+            return False
+        self._cost_note = note
+        self.cost = new_cost
+        return True
+
+    def optimize(self, passes=None):
+        if self.ast is None:
+            try:
+                self.ast = parse_sql(self.query)
+            except ParseError:
+                self.ast = None
+        if self.ast is not None:
+            manager = PassManager(passes, memo=self.memo)
+            accept = None
+            if self.verify:
+                self.cost = self.explain(self.query)
+                accept = self._accept_pass
+            manager.run(self.ast, on_change=self._record_pass, accept=accept)
+            self.pass_stats = manager.stats
+            return self
+        return self.optimize_with_regex()
+
+    def optimize_with_regex(self):
+        """Fallback for statements the AST parser cannot handle."""
         return (
             self.remove_where_1_equals_1()
                 .flatten_subqueries()
@@ -215,7 +811,6 @@ class SQLQueryOptimizer:
                 .optimize_where_conditions()
                 .simplify_select_star()
                 .convert_or_to_in()
-                .reorder_joins()
         )
 
     def get_steps(self):
@@ -1,347 +1,732 @@
 import re
 
-class SQLSyntaxParser:
+from lexer import TOKEN_TYPES, TokenBuffer, tokenize
+from profiler import span
+from sql_ast import (
+    Assignment, Between, BinaryOp, Case, Cast, Column, Ddl, Delete, Exists, FuncCall, InList,
+    InSubquery, Insert, IsNull, Join, Like, Literal, OrderItem, Select, SelectItem,
+    SetOperation, Star, Subquery, SubqueryRef, TableRef, UnaryOp, Update, ValuesRow, When,
+)
+
+# Words that can never be used as a bare alias or column name
+RESERVED = {
+    "SELECT", "FROM", "WHERE", "GROUP", "ORDER", "BY", "GROUP BY", "ORDER BY", "HAVING",
+    "LIMIT", "OFFSET", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "OUTER", "ON",
+    "USING", "AS", "AND", "OR", "NOT", "IN", "IS", "NULL", "LIKE", "BETWEEN", "EXISTS",
+    "CASE", "WHEN", "THEN", "ELSE", "END", "UNION", "ALL", "DISTINCT", "INSERT", "INTO",
+    "VALUES", "UPDATE", "SET", "DELETE", "CREATE", "ALTER", "DROP", "TABLE", "ASC", "DESC",
+    "TRUE", "FALSE",
+}
+COMPARISON_OPERATORS = {"=", "<>", "!=", "<", "<=", ">", ">="}
+IDENTIFIER_PATTERN = re.compile(r'^(?:[A-Za-z_][A-Za-z0-9_$]*|`[^`]*`)$')
+
+
+class ParseError(ValueError):
+    def __init__(self, message, position=None):
+        super().__init__(message)
+        self.message = message
+        self.position = position
+
+
+class RecursiveDescentParser:
+    """
+    Grammar-driven parser that walks the token list once and builds a
+    sql_ast tree. Keywords are matched on their upper-cased text, which is
+    computed a single time up front.
+    """
+
     def __init__(self, tokens):
         self.tokens = tokens
+        if isinstance(tokens, TokenBuffer):
+            self.values = tokens.values()
+            self.types = tokens.type_names()
+        else:
+            self.values = [t[1] for t in tokens]
+            self.types = [t[0] for t in tokens]
+        self.upper = [" ".join(v.upper().split()) for v in self.values]
         self.position = 0
-        self.root = None  
-        
-    def parse_qualified_name(self):
-        """
-        Parses tokens like identifier(.identifier)+ into a single qualified name string.
-        e.g. ['e', '.', 'dept_id'] -> 'e.dept_id'
-        """
-        if self.position >= len(self.tokens):
-            return None
+        self.length = len(tokens)
 
-        if not re.match(r'^\w+$', self.tokens[self.position][1]):
-            return None
-
-        parts = [self.tokens[self.position][1]]
+    def retokenize(self, tokens, start, old_end, new_end):
+        """Switch to the TokenBuffer `tokens`, in which old tokens [start, old_end) became [start, new_end)."""
+        values = [tokens.value(i) for i in range(start, new_end)]
+        self.tokens = tokens
+        self.values[start:old_end] = values
+        self.types[start:old_end] = [TOKEN_TYPES[code] for code in tokens.types[start:new_end]]
+        self.upper[start:old_end] = [" ".join(v.upper().split()) for v in values]
+        self.position = 0
+        self.length = len(tokens)
+
+    # ---------------------------------------------------------------- helpers
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.upper[index] if index < self.length else None
+
+    def at(self, *words):
+        return self.peek() in words
+
+    def at_phrase(self, first, second):
+        """Match a two-word keyword lexed either as one token or as two."""
+        if self.peek() == f"{first} {second}":
+            return 1
+        if self.peek() == first and self.peek(1) == second:
+            return 2
+        return 0
+
+    def accept(self, *words):
+        if self.peek() in words:
+            self.position += 1
+            return True
+        return False
+
+    def accept_phrase(self, first, second):
+        width = self.at_phrase(first, second)
+        self.position += width
+        return width > 0
+
+    def expect(self, word, message=None):
+        if not self.accept(word):
+            found = self.values[self.position] if self.position < self.length else "end of query"
+            if word == ")" and (found == "end of query" or self.peek() == ";"):
+                raise ParseError("Unbalanced parentheses.", self.position)
+            raise ParseError(message or f"Expected '{word}' but found '{found}' at position {self.position}.",
+                             self.position)
+
+    def is_identifier(self, offset=0):
+        index = self.position + offset
+        if index >= self.length:
+            return False
+        return (self.upper[index] not in RESERVED
+                and self.types[index] in ("IDENTIFIER", "QUOTED_IDENTIFIER", "KEYWORD")
+                and IDENTIFIER_PATTERN.match(self.values[index]) is not None)
+
+    def identifier(self, what="identifier"):
+        if not self.is_identifier():
+            found = self.values[self.position] if self.position < self.length else "end of query"
+            raise ParseError(f"Expected {what} but found '{found}' at position {self.position}.", self.position)
+        value = self.values[self.position]
         self.position += 1
+        return value
 
-        while (self.position + 1 < len(self.tokens) and
-               self.tokens[self.position][1] == '.' and
-               re.match(r'^\w+$', self.tokens[self.position + 1][1])):
-            parts.append(self.tokens[self.position + 1][1])
+    def finish(self, node, start):
+        node.span = (start, self.position)
+        return node
+
+    def comparison_operator(self):
+        """Read a comparison operator, gluing '<' '=' style pairs from older token streams."""
+        word = self.peek()
+        if word not in COMPARISON_OPERATORS:
+            return None
+        following = self.peek(1)
+        if word in ("<", ">", "!") and following in ("=", ">") and f"{word}{following}" in COMPARISON_OPERATORS:
             self.position += 2
+            return f"{word}{following}"
+        self.position += 1
+        return word
 
-        return ".".join(parts)
+    # ------------------------------------------------------------- statements
 
-    def build_parse_tree(self):
+    def parse_statement(self):
         if not self.tokens:
-            return {"type": "Empty Query"}
-
-        root = {"type": "SQL Query", "children": []}
-        self.position = 0
-        current_keyword = None
+            raise ParseError("No query provided.", 0)
+        word = self.peek()
+        if word == "SELECT" or word == "(":
+            statement = self.parse_query(top_level=True)
+        elif word == "INSERT":
+            statement = self.parse_insert()
+        elif word == "UPDATE":
+            statement = self.parse_update()
+        elif word == "DELETE":
+            statement = self.parse_delete()
+        elif word in ("CREATE", "ALTER", "DROP"):
+            statement = self.parse_ddl()
+        else:
+            raise ParseError("Unsupported query type.", 0)
+
+        self.accept(";")
+        if self.position < self.length:
+            if self.peek() == ")":
+                raise ParseError("Unbalanced parentheses.", self.position)
+            raise ParseError(f"Unexpected '{self.values[self.position]}' at position {self.position}.",
+                             self.position)
+        return statement
+
+    def parse_query(self, top_level=False):
+        start = self.position
+        if self.accept("("):
+            query = self.parse_query(top_level)
+            self.expect(")")
+        else:
+            query = self.parse_select(top_level)
+        while self.at("UNION"):
+            self.position += 1
+            all_ = self.accept("ALL")
+            if not all_:
+                self.accept("DISTINCT")
+            right = self.parse_query(top_level)
+            query = self.finish(SetOperation("UNION", all_, query, right), start)
+        return query
+
+    def parse_select(self, top_level=False):
+        start = self.position
+        self.expect("SELECT")
+        distinct = self.accept("DISTINCT")
+        if not distinct:
+            self.accept("ALL")
+
+        columns = [self.parse_select_item()]
+        while self.accept(","):
+            columns.append(self.parse_select_item())
+        if self.is_identifier():
+            raise ParseError(f"Missing comma before '{self.values[self.position]}' at position {self.position}.",
+                             self.position)
+
+        from_ = []
+        if self.accept("FROM"):
+            from_.append(self.parse_table_expression())
+            while self.accept(","):
+                from_.append(self.parse_table_expression())
+        elif top_level:
+            raise ParseError("'FROM' clause is missing in SELECT query.", self.position)
+
+        where = self.parse_condition("WHERE", "No condition specified after WHERE.")
+
+        group_by = []
+        if self.accept_phrase("GROUP", "BY"):
+            if self.position >= self.length or self.at(";", ")"):
+                raise ParseError("No columns specified for GROUP BY.", self.position)
+            group_by = self.parse_expression_list()
+
+        having = None
+        if self.at("HAVING"):
+            if not group_by:
+                raise ParseError("HAVING clause cannot exist without GROUP BY.", self.position)
+            having = self.parse_condition("HAVING", "No condition specified for HAVING.")
+
+        order_by = []
+        if self.accept_phrase("ORDER", "BY"):
+            order_by.append(self.parse_order_item())
+            while self.accept(","):
+                order_by.append(self.parse_order_item())
+
+        limit = offset = None
+        if self.accept("LIMIT"):
+            limit = self.parse_primary()
+            if self.accept(","):
+                # MySQL's LIMIT offset, count
+                offset, limit = limit, self.parse_primary()
+            elif self.accept("OFFSET"):
+                offset = self.parse_primary()
+
+        return self.finish(Select(distinct, columns, from_, where, group_by, having, order_by, limit, offset),
+                           start)
+
+    def parse_condition(self, keyword, missing_message):
+        if not self.accept(keyword):
+            return None
+        if self.position >= self.length or self.at(";", ")"):
+            raise ParseError(missing_message, self.position)
+        return self.parse_expression()
+
+    def parse_select_item(self):
+        start = self.position
+        expr = self.parse_expression()
+        alias = None
+        if self.accept("AS"):
+            alias = self.identifier("alias")
+        elif self.is_identifier():
+            alias = self.identifier()
+            if self.is_identifier():
+                raise ParseError(f"Missing comma before '{self.values[self.position]}' at position {self.position}.",
+                                 self.position)
+        return self.finish(SelectItem(expr, alias), start)
+
+    def parse_order_item(self):
+        start = self.position
+        expr = self.parse_expression()
+        descending = False
+        if self.accept("DESC"):
+            descending = True
+        else:
+            self.accept("ASC")
+        return self.finish(OrderItem(expr, descending), start)
+
+    def parse_expression_list(self):
+        items = [self.parse_expression()]
+        while self.accept(","):
+            items.append(self.parse_expression())
+        return items
+
+    # ----------------------------------------------------------- FROM / JOIN
+
+    def parse_table_expression(self):
+        start = self.position
+        left = self.parse_table_primary()
+        while True:
+            kind = self.parse_join_kind()
+            if kind is None:
+                return left
+            right = self.parse_table_primary()
+            condition = None
+            using = None
+            if self.accept("ON"):
+                condition = self.parse_expression()
+            elif self.accept("USING"):
+                self.expect("(")
+                using = [self.identifier("column name")]
+                while self.accept(","):
+                    using.append(self.identifier("column name"))
+                self.expect(")")
+            elif kind != "CROSS":
+                raise ParseError("ON clause missing in JOIN.", self.position)
+            left = self.finish(Join(kind, left, right, condition, using), start)
+
+    def parse_join_kind(self):
+        if self.accept("JOIN"):
+            return "INNER"
+        for kind in ("INNER", "CROSS", "LEFT", "RIGHT", "FULL"):
+            if self.at(kind):
+                width = 2 if self.peek(1) == "OUTER" and kind in ("LEFT", "RIGHT", "FULL") else 1
+                if self.peek(width) == "JOIN":
+                    self.position += width + 1
+                    return kind
+        return None
 
-        while self.position < len(self.tokens):
-            token_type, token_value = self.tokens[self.position]
-            upper_value = token_value.upper()
+    def parse_table_primary(self):
+        start = self.position
+        if self.at("("):
+            if self.peek(1) == "SELECT" or self.peek(1) == "(":
+                self.position += 1
+                query = self.parse_query()
+                self.expect(")")
+                alias = self.parse_alias()
+                return self.finish(SubqueryRef(query, alias), start)
+            self.position += 1
+            inner = self.parse_table_expression()
+            self.expect(")")
+            return inner
+
+        parts = [self.identifier("table name")]
+        while self.at(".") and self.is_identifier(1):
+            self.position += 1
+            parts.append(self.identifier())
+        return self.finish(TableRef(parts, self.parse_alias()), start)
+
+    def parse_alias(self):
+        if self.accept("AS"):
+            return self.identifier("alias")
+        if self.is_identifier():
+            return self.identifier()
+        return None
 
-            if upper_value in ["SELECT", "FROM", "WHERE", "INSERT", "INTO", "VALUES", "UPDATE", "SET", "DELETE", "JOIN", "ON"]:
-                current_keyword = {"type": upper_value, "children": []}
-                root["children"].append(current_keyword)
+    # ------------------------------------------------------------ expressions
+
+    def parse_expression(self):
+        return self.parse_or()
+
+    def parse_or(self):
+        start = self.position
+        left = self.parse_and()
+        while self.accept("OR", "||"):
+            left = self.finish(BinaryOp("OR", left, self.parse_and()), start)
+        return left
+
+    def parse_and(self):
+        start = self.position
+        left = self.parse_not()
+        while self.accept("AND", "&&"):
+            left = self.finish(BinaryOp("AND", left, self.parse_not()), start)
+        return left
+
+    def parse_not(self):
+        start = self.position
+        if self.accept("NOT"):
+            return self.finish(UnaryOp("NOT", self.parse_not()), start)
+        return self.parse_predicate()
+
+    def parse_predicate(self):
+        start = self.position
+        left = self.parse_additive()
+
+        op = self.comparison_operator()
+        if op is not None:
+            if self.at("ANY", "ALL", "SOME") and self.peek(1) == "(":
+                raise ParseError(f"Quantified comparison '{op} {self.values[self.position]}' is not supported.",
+                                 self.position)
+            return self.finish(BinaryOp(op, left, self.parse_additive()), start)
+
+        if self.accept("IS"):
+            negated = self.accept("NOT")
+            self.expect("NULL", f"Expected NULL after IS at position {self.position}.")
+            return self.finish(IsNull(left, negated), start)
+
+        negated = False
+        if self.at("NOT") and self.peek(1) in ("IN", "BETWEEN", "LIKE"):
+            self.position += 1
+            negated = True
+
+        if self.accept("IN"):
+            self.expect("(")
+            if self.at("SELECT"):
+                query = self.parse_query()
+                self.expect(")")
+                return self.finish(InSubquery(left, query, negated), start)
+            items = self.parse_expression_list()
+            self.expect(")")
+            return self.finish(InList(left, items, negated), start)
+        if self.accept("BETWEEN"):
+            low = self.parse_additive()
+            self.expect("AND", f"Expected AND in BETWEEN at position {self.position}.")
+            high = self.parse_additive()
+            return self.finish(Between(left, low, high, negated), start)
+        if self.accept("LIKE"):
+            return self.finish(Like(left, self.parse_additive(), negated), start)
+        if negated:
+            raise ParseError(f"Expected IN, BETWEEN or LIKE after NOT at position {self.position}.", self.position)
+        return left
+
+    def parse_additive(self):
+        start = self.position
+        left = self.parse_multiplicative()
+        while self.at("+", "-"):
+            op = self.upper[self.position]
+            self.position += 1
+            left = self.finish(BinaryOp(op, left, self.parse_multiplicative()), start)
+        return left
+
+    def parse_multiplicative(self):
+        start = self.position
+        left = self.parse_unary()
+        while self.at("*", "/", "%"):
+            op = self.upper[self.position]
+            self.position += 1
+            left = self.finish(BinaryOp(op, left, self.parse_unary()), start)
+        return left
+
+    def parse_unary(self):
+        start = self.position
+        if self.at("-", "+"):
+            op = self.upper[self.position]
+            self.position += 1
+            return self.finish(UnaryOp(op, self.parse_unary()), start)
+        return self.parse_primary()
+
+    def parse_primary(self):
+        start = self.position
+        if self.position >= self.length:
+            raise ParseError("Unexpected end of query.", self.position)
+        word = self.upper[self.position]
+        value = self.values[self.position]
+        token_type = self.types[self.position]
+
+        if token_type == "NUMBER":
+            self.position += 1
+            # Older token streams split 3.5 into NUMBER '.' NUMBER
+            if self.at(".") and self.position + 1 < self.length and self.types[self.position + 1] == "NUMBER":
+                value = f"{value}.{self.values[self.position + 1]}"
+                self.position += 2
+            return self.finish(Literal(value, "number"), start)
+        if token_type == "STRING":
+            self.position += 1
+            return self.finish(Literal(value, "string"), start)
+        if word == "NULL":
+            self.position += 1
+            return self.finish(Literal(value, "null"), start)
+        if word in ("TRUE", "FALSE"):
+            self.position += 1
+            return self.finish(Literal(value, "boolean"), start)
+        if word == "*":
+            self.position += 1
+            return self.finish(Star(None), start)
+        if word == "(":
+            self.position += 1
+            if self.at("SELECT"):
+                query = self.parse_query()
+                self.expect(")")
+                return self.finish(Subquery(query), start)
+            expr = self.parse_expression()
+            self.expect(")")
+            return expr
+        if word == "EXISTS":
+            self.position += 1
+            self.expect("(")
+            query = self.parse_query()
+            self.expect(")")
+            return self.finish(Exists(query), start)
+        if word == "CASE":
+            return self.parse_case()
+        if word in ("CAST", "CONVERT") and self.peek(1) == "(":
+            return self.parse_cast()
+        if self.is_identifier() or (word in ("LEFT", "RIGHT", "IF", "REPLACE") and self.peek(1) == "("):
+            self.position += 1
+            if self.at("("):
+                return self.parse_function_call(value, start)
+            parts = [value]
+            while self.at("."):
+                if self.peek(1) == "*":
+                    self.position += 2
+                    return self.finish(Star(".".join(parts)), start)
                 self.position += 1
-            else:
-                qualified_name = self.parse_qualified_name()
-                if qualified_name:
-                    node = {"type": "qualified_name", "value": qualified_name}
-                    if current_keyword:
-                        current_keyword["children"].append(node)
-                    else:
-                        root["children"].append(node)
-                else:
-                    node = {"type": "token", "value": token_value}
-                    if current_keyword:
-                        current_keyword["children"].append(node)
-                    else:
-                        root["children"].append(node)
-                    self.position += 1
+                parts.append(self.identifier("column name"))
+            return self.finish(Column(parts), start)
+        if word == ")":
+            raise ParseError("Unbalanced parentheses.", self.position)
+        raise ParseError(f"Unexpected '{value}' at position {self.position}.", self.position)
+
+    def parse_function_call(self, name, start):
+        self.expect("(")
+        distinct = self.accept("DISTINCT")
+        args = []
+        if not self.at(")"):
+            args = self.parse_expression_list()
+        self.expect(")")
+        return self.finish(FuncCall(name, args, distinct), start)
+
+    def parse_cast(self):
+        start = self.position
+        function = self.values[self.position]
+        self.position += 1
+        self.expect("(")
+        expr = self.parse_expression()
+        using = False
+        if function.upper() == "CAST":
+            self.expect("AS")
+        elif self.accept("USING"):
+            using = True
+        else:
+            self.expect(",")
+        type_ = self.parse_type()
+        self.expect(")")
+        return self.finish(Cast(function, expr, type_, using), start)
+
+    def parse_type(self):
+        """SQL text of a type such as DECIMAL(10, 2) or CHAR(5) CHARACTER SET utf8mb4, up to the closing ')'."""
+        text = ""
+        depth = 0
+        while self.position < self.length and not (depth == 0 and self.at(")")):
+            value = self.values[self.position]
+            if value == "(":
+                depth += 1
+            elif value == ")":
+                depth -= 1
+            if text and not text.endswith(("(", " ")) and value not in ("(", ")", ","):
+                text += " "
+            text += value + (" " if value == "," else "")
+            self.position += 1
+        if not text:
+            raise ParseError(f"Expected a type at position {self.position}.", self.position)
+        return text
+
+    def parse_case(self):
+        start = self.position
+        self.expect("CASE")
+        operand = None if self.at("WHEN") else self.parse_expression()
+        whens = []
+        while self.at("WHEN"):
+            when_start = self.position
+            self.position += 1
+            condition = self.parse_expression()
+            self.expect("THEN")
+            whens.append(self.finish(When(condition, self.parse_expression()), when_start))
+        if not whens:
+            raise ParseError(f"CASE without WHEN at position {self.position}.", self.position)
+        else_ = self.parse_expression() if self.accept("ELSE") else None
+        self.expect("END")
+        return self.finish(Case(operand, whens, else_), start)
+
+    # ----------------------------------------------------------- DML and DDL
 
-        self.root = root
-        return root
+    def parse_insert(self):
+        start = self.position
+        self.expect("INSERT")
+        self.expect("INTO", "'INTO' clause is missing in INSERT query.")
+        table = self.parse_table_primary()
+        columns = []
+        if self.at("(") and self.peek(1) != "SELECT":
+            self.position += 1
+            columns.append(self.parse_column())
+            while self.accept(","):
+                columns.append(self.parse_column())
+            self.expect(")")
+
+        if self.at("SELECT", "("):
+            return self.finish(Insert(table, columns, [], self.parse_query()), start)
+        self.expect("VALUES", "'VALUES' clause is missing in INSERT query.")
+        rows = [self.parse_values_row()]
+        while self.accept(","):
+            rows.append(self.parse_values_row())
+        return self.finish(Insert(table, columns, rows, None), start)
+
+    def parse_values_row(self):
+        start = self.position
+        self.expect("(")
+        items = self.parse_expression_list()
+        self.expect(")")
+        return self.finish(ValuesRow(items), start)
+
+    def parse_column(self):
+        start = self.position
+        parts = [self.identifier("column name")]
+        while self.at(".") and self.is_identifier(1):
+            self.position += 1
+            parts.append(self.identifier())
+        return self.finish(Column(parts), start)
 
-    def current_token(self):
-        if self.position < len(self.tokens):
-            return self.tokens[self.position]
-        return None
+    def parse_update(self):
+        start = self.position
+        self.expect("UPDATE")
+        table = self.parse_table_primary()
+        self.expect("SET", "'SET' clause is missing in UPDATE query.")
+        assignments = [self.parse_assignment()]
+        while self.accept(","):
+            assignments.append(self.parse_assignment())
+        where = self.parse_condition("WHERE", "No condition specified after WHERE.")
+        return self.finish(Update(table, assignments, where), start)
+
+    def parse_assignment(self):
+        start = self.position
+        column = self.parse_column()
+        self.expect("=")
+        return self.finish(Assignment(column, self.parse_expression()), start)
 
-    def advance(self):
+    def parse_delete(self):
+        start = self.position
+        self.expect("DELETE")
+        self.expect("FROM", "'FROM' clause is missing in DELETE query.")
+        table = self.parse_table_primary()
+        where = self.parse_condition("WHERE", "No condition specified after WHERE.")
+        return self.finish(Delete(table, where), start)
+
+    def parse_ddl(self):
+        start = self.position
+        action = self.upper[self.position]
+        self.position += 1
+        self.accept("TEMPORARY")
+        if not self.at("TABLE", "VIEW", "INDEX", "DATABASE"):
+            if action == "DROP":
+                raise ParseError("'TABLE' keyword missing in DROP query.", self.position)
+            raise ParseError(f"Unsupported {action} statement.", self.position)
+        object_type = self.upper[self.position]
         self.position += 1
 
-    def parse(self):
-        if not self.tokens:
-            return "No query provided."
+        if_exists = False
+        if self.accept("IF"):
+            if action == "CREATE":
+                self.expect("NOT")
+            self.expect("EXISTS")
+            if_exists = True
 
-        error = self.check_for_missing_clauses()
-        if error:
-            return error
-
-        error = self.check_for_unbalanced_parentheses()
-        if error:
-            return error
-
-        error = self.check_for_missing_commas()
-        if error:
-            return error
-
-        token_values = [t[1].upper() for t in self.tokens]
-
-        if "SELECT" in token_values:
-            return self.parse_select()
-        elif "INSERT" in token_values:
-            return self.parse_insert()
-        elif "UPDATE" in token_values:
-            return self.parse_update()
-        elif "DELETE" in token_values:
-            return self.parse_delete()
-        elif "DROP" in token_values:
-            return self.parse_drop()
-        elif "JOIN" in token_values or "INNER" in token_values or "LEFT" in token_values or "RIGHT" in token_values:
-            return self.parse_join()
-        else:
-            return "Unsupported query type."
-
-    def check_for_missing_clauses(self):
-        tokens_upper = [t[1].upper() for t in self.tokens]
-        if "SELECT" in tokens_upper and "FROM" not in tokens_upper:
-            return "Syntax Error: 'FROM' clause is missing in SELECT query."
-        if "INSERT" in tokens_upper and "INTO" not in tokens_upper:
-            return "Syntax Error: 'INTO' clause is missing in INSERT query."
-        if "DELETE" in tokens_upper and "FROM" not in tokens_upper:
-            return "Syntax Error: 'FROM' clause is missing in DELETE query."
-        return None
+        names = [self.parse_table_primary()]
+        while action == "DROP" and self.accept(","):
+            names.append(self.parse_table_primary())
 
-    def check_for_unbalanced_parentheses(self):
-        open_parentheses = sum(1 for t in self.tokens if t[1] == '(')
-        close_parentheses = sum(1 for t in self.tokens if t[1] == ')')
-        if open_parentheses != close_parentheses:
-            return "Syntax Error: Unbalanced parentheses."
-        return None
+        # Column definitions, ALTER actions etc. are kept verbatim
+        body_end = self.length - 1 if self.upper[-1] == ";" else self.length
+        body = " ".join(self.values[self.position:body_end])
+        self.position = body_end
+        return self.finish(Ddl(action, object_type, names, if_exists, body), start)
 
-    def check_for_missing_commas(self):
-        i = 0
-        while i < len(self.tokens):
-            pos = i
-            if not re.match(r'^\w+$', self.tokens[pos][1]):
-                i += 1
-                continue
-            parts = [self.tokens[pos][1]]
-            pos += 1
-            while (pos + 1 < len(self.tokens) and
-                   self.tokens[pos][1] == '.' and
-                   re.match(r'^\w+$', self.tokens[pos + 1][1])):
-                parts.append(self.tokens[pos + 1][1])
-                pos += 2
-
-            next_start = pos
-            if next_start < len(self.tokens):
-                if next_start < len(self.tokens) and re.match(r'^\w+$', self.tokens[next_start][1]):
-                    after_first_end = pos
-                    if after_first_end < len(self.tokens):
-                        if self.tokens[after_first_end][1] != ',':
-                            skip_tokens = {'*', ',', 'FROM', 'WHERE', 'AND', 'OR', 'ON', 'INTO', 'SET', 'VALUES'}
-                            prev_token = self.tokens[after_first_end - 1][1].upper() if after_first_end - 1 >= 0 else None
-                            curr_token = self.tokens[after_first_end][1].upper()
-                            if curr_token not in skip_tokens and prev_token not in skip_tokens:
-                                return f"Syntax Error: Missing comma before '{self.tokens[after_first_end][1]}' at position {after_first_end}."
-            i = pos
-        return None
 
-    def parse_select(self):
-        tokens_upper = [t[1].upper() for t in self.tokens]
-        if "FROM" not in tokens_upper:
-            return "Syntax Error: 'FROM' clause is missing in SELECT query."
+def parse_tokens(tokens):
+    """Parse a token list into an AST; raises ParseError."""
+    return RecursiveDescentParser(tokens).parse_statement()
 
-        if "WHERE" in tokens_upper:
-            return self.pushdown_where("SELECT")
 
-        if "GROUP BY" in tokens_upper:
-            return self.parse_group_by()
+def parse_sql(query):
+    """Lex and parse a query string into an AST; raises ParseError."""
+    try:
+        tokens = tokenize(query)
+    except ValueError as e:
+        raise ParseError(str(e)) from e
+    return parse_tokens(tokens)
 
-        if "HAVING" in tokens_upper:
-            return self.parse_having()
 
-        return "SELECT query parsed successfully."
+class SQLSyntaxParser:
+    def __init__(self, tokens, ast=None, error=None):
+        self.tokens = tokens
+        self.position = 0
+        self.root = None
+        self.ast = ast
+        self.error = error
+        self._parsed = ast is not None or error is not None
+
+    def parse_ast(self):
+        """Parse the tokens once and return the AST (None on a syntax error)."""
+        if not self._parsed:
+            self._parsed = True
+            with span("parse"):
+                try:
+                    self.ast = parse_tokens(self.tokens)
+                except ParseError as e:
+                    self.error = e
+        return self.ast
 
-    def parse_insert(self):
-        required = ["INSERT", "INTO", "VALUES"]
-        tokens_upper = [t[1].upper() for t in self.tokens]
-        for req in required:
-            if req not in tokens_upper:
-                return f"Syntax Error: '{req}' clause is missing in INSERT query."
+    def parse(self):
+        if not self.tokens:
+            return "No query provided."
 
-        if "WHERE" in tokens_upper:
-            return self.pushdown_where("INSERT")
+        ast = self.parse_ast()
+        if ast is None:
+            if self.error.message == "Unsupported query type.":
+                return self.error.message
+            return f"Syntax Error: {self.error.message}"
+
+        if isinstance(ast, Select):
+            if ast.where is not None:
+                return f"Pushing WHERE condition into FROM: {ast.where.to_sql()}"
+            return "SELECT query parsed successfully."
+        if isinstance(ast, SetOperation):
+            return "SELECT query parsed successfully."
+        if isinstance(ast, Insert):
+            return "INSERT query parsed successfully."
+        if isinstance(ast, Update):
+            if ast.where is not None:
+                return f"Pushing WHERE condition into UPDATE: {ast.where.to_sql()}"
+            return "UPDATE query parsed successfully."
+        if isinstance(ast, Delete):
+            if ast.where is not None:
+                return f"Pushing WHERE condition into DELETE: {ast.where.to_sql()}"
+            return "DELETE query parsed successfully."
+        return f"{ast.action} query parsed successfully."
 
-        return "INSERT query parsed successfully."
+    def build_parse_tree(self):
+        if not self.tokens:
+            return {"type": "Empty Query"}
 
-    def parse_update(self):
-        tokens_upper = [t[1].upper() for t in self.tokens]
-        if "SET" not in tokens_upper:
-            return "Syntax Error: 'SET' clause is missing in UPDATE query."
+        ast = self.parse_ast()
+        if ast is None:
+            root = {"type": "Syntax Error", "message": self.error.message}
+        else:
+            root = {"type": "SQL Query", "children": [ast.to_dict()]}
+        self.root = root
+        return root
 
-        if "WHERE" in tokens_upper:
-            return self.pushdown_where("UPDATE")
+    def current_token(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
 
-        return "UPDATE query parsed successfully."
+    def advance(self):
+        self.position += 1
 
-    def parse_delete(self):
-        tokens_upper = [t[1].upper() for t in self.tokens]
-        if "FROM" not in tokens_upper:
-            return "Syntax Error: 'FROM' clause is missing in DELETE query."
-
-        if "WHERE" in tokens_upper:
-            return self.pushdown_where("DELETE")
-
-        return "DELETE query parsed successfully."
-
-    def parse_drop(self):
-        if "TABLE" not in [t[1].upper() for t in self.tokens]:
-            return "Syntax Error: 'TABLE' keyword missing in DROP query."
-        return "DROP query parsed successfully."
-
-    def parse_join(self):
-        tokens_upper = [t[1].upper() for t in self.tokens]
-        if "JOIN" not in tokens_upper:
-            return "Syntax Error: JOIN clause missing."
-        if "ON" not in tokens_upper:
-            return "Syntax Error: ON clause missing in JOIN."
-
-        if "WHERE" in tokens_upper:
-            return self.pushdown_where("JOIN")
-
-        return "JOIN query parsed successfully."
-
-    def parse_where(self):
-        where_index = [t[1].upper() for t in self.tokens].index("WHERE")
-        if where_index + 1 >= len(self.tokens):
-            return "Syntax Error: No condition specified after WHERE."
-
-        return "WHERE clause parsed successfully."
-
-    def pushdown_where(self, query_type):
-        where_index = [t[1].upper() for t in self.tokens].index("WHERE")
-        where_condition = self.tokens[where_index + 1:]
-        predicate = " ".join([t[1] for t in where_condition])
-
-        if query_type == "SELECT" and "FROM" in [t[1].upper() for t in self.tokens]:
-            return f"Pushing WHERE condition into FROM: {predicate}"
-        elif query_type == "INSERT":
-            return f"Pushing WHERE condition into INSERT VALUES: {predicate}"
-        elif query_type == "UPDATE" and "SET" in [t[1].upper() for t in self.tokens]:
-            return f"Pushing WHERE condition into UPDATE: {predicate}"
-        elif query_type == "DELETE" and "FROM" in [t[1].upper() for t in self.tokens]:
-            return f"Pushing WHERE condition into DELETE: {predicate}"
-        elif query_type == "JOIN" and "ON" in [t[1].upper() for t in self.tokens]:
-            return f"Pushing WHERE condition into JOIN ON: {predicate}"
-
-        return f"WHERE clause pushed down successfully for {query_type}."
-
-    def parse_group_by(self):
-        token_values = [t[1].upper() for t in self.tokens]
-        try:
-            group_by_index = token_values.index("GROUP BY")
-        except ValueError:
-            return "Syntax Error: GROUP BY clause not found."
-
-        if group_by_index + 1 >= len(self.tokens):
-            return "Syntax Error: No columns specified for GROUP BY."
-
-        group_by_columns = self.tokens[group_by_index + 1:]
-        for column in group_by_columns:
-            if column[1].upper() in ['AND', 'ORDER', 'HAVING']:
-                break
-            if not re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', column[1]):
-                return f"Syntax Error: Invalid column name '{column[1]}' in GROUP BY."
-
-        return "GROUP BY clause parsed successfully."
-
-    def parse_having(self):
-        token_values = [t[1].upper() for t in self.tokens]
-        if "GROUP BY" not in token_values:
-            return "Syntax Error: HAVING clause cannot exist without GROUP BY."
-
-        try:
-            having_index = token_values.index("HAVING")
-        except ValueError:
-            return "Syntax Error: HAVING clause not found."
-
-        if having_index + 1 >= len(self.tokens):
-            return "Syntax Error: No condition specified for HAVING."
-
-        return "HAVING clause parsed successfully."
-
-
-tokens = [
-    ("SELECT", "SELECT"),
-    ("*", "*"),
-    ("FROM", "FROM"),
-    ("(", "("),
-    ("SELECT", "SELECT"),
-    ("*", "*"),
-    ("FROM", "FROM"),
-    ("employees", "employees"),
-    ("WHERE", "WHERE"),
-    ("age", "age"),
-    (">", ">"),
-    ("30", "30"),
-    (")", ")"),
-    ("e", "e"),
-    ("JOIN", "JOIN"),
-    ("departments", "departments"),
-    ("d", "d"),
-    ("ON", "ON"),
-    ("e", "e"),
-    (".", "."),
-    ("dept_id", "dept_id"),
-    ("=", "="),
-    ("d", "d"),
-    (".", "."),
-    ("dept_id", "dept_id"),
-    ("JOIN", "JOIN"),
-    ("salaries", "salaries"),
-    ("s", "s"),
-    ("ON", "ON"),
-    ("e", "e"),
-    (".", "."),
-    ("emp_id", "emp_id"),
-    ("=", "="),
-    ("s", "s"),
-    (".", "."),
-    ("emp_id", "emp_id"),
-    ("WHERE", "WHERE"),
-    ("1", "1"),
-    ("=", "="),
-    ("1", "1"),
-    ("AND", "AND"),
-    ("age", "age"),
-    (">", ">"),
-    ("25", "25"),
-    ("AND", "AND"),
-    ("age", "age"),
-    (">", ">"),
-    ("30", "30"),
-    ("AND", "AND"),
-    ("e", "e"),
-    (".", "."),
-    ("emp_id", "emp_id"),
-    ("=", "="),
-    ("5", "5"),
-    ("AND", "AND"),
-    ("e", "e"),
-    (".", "."),
-    ("emp_id", "emp_id"),
-    ("=", "="),
-    ("5", "5"),
-    (";", ";")
-]
-
-parser = SQLSyntaxParser(tokens)
-print(parser.parse())
-
-parse_tree = parser.build_parse_tree()
-import json
-print(json.dumps(parse_tree, indent=2))
+
+if __name__ == "__main__":
+    import json
+
+    tokens = [
+        ("KEYWORD", "SELECT"), ("PUNCTUATION", "*"), ("KEYWORD", "FROM"), ("PUNCTUATION", "("),
+        ("KEYWORD", "SELECT"), ("PUNCTUATION", "*"), ("KEYWORD", "FROM"), ("IDENTIFIER", "employees"),
+        ("KEYWORD", "WHERE"), ("IDENTIFIER", "age"), ("OPERATOR", ">"), ("NUMBER", "30"),
+        ("PUNCTUATION", ")"), ("IDENTIFIER", "e"),
+        ("KEYWORD", "JOIN"), ("IDENTIFIER", "departments"), ("IDENTIFIER", "d"), ("KEYWORD", "ON"),
+        ("IDENTIFIER", "e"), ("PUNCTUATION", "."), ("IDENTIFIER", "dept_id"), ("OPERATOR", "="),
+        ("IDENTIFIER", "d"), ("PUNCTUATION", "."), ("IDENTIFIER", "dept_id"),
+        ("KEYWORD", "WHERE"), ("NUMBER", "1"), ("OPERATOR", "="), ("NUMBER", "1"),
+        ("OPERATOR", "AND"), ("IDENTIFIER", "age"), ("OPERATOR", ">"), ("NUMBER", "25"),
+        ("PUNCTUATION", ";"),
+    ]
+
+    parser = SQLSyntaxParser(tokens)
+    print(parser.parse())
+    print(json.dumps(parser.build_parse_tree(), indent=2))
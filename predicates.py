@@ -0,0 +1,374 @@
+"""
+Predicate engine for WHERE conditions.
+
+`simplify_predicate` rewrites a condition into a normalized form:
+
+* constants are folded (`price > 2 * 50` -> `price > 100`, `1 = 0` -> FALSE,
+  `x = NULL` -> NULL);
+* NOT is pushed down to the leaves (`NOT (a > 5)` -> `a <= 5`) and
+  comparisons are written column first with `<>` for `!=` (`5 < a` -> `a > 5`);
+* per column, the numeric constraints of a conjunction (`<, <=, >, >=, =,
+  <>, BETWEEN, IN, NOT IN, IS [NOT] NULL`) are merged into the tightest
+  equivalent form (`a > 1 AND a >= 3 AND a <= 9` -> `a BETWEEN 3 AND 9`,
+  `a IN (1, 2, 3) AND a > 1` -> `a IN (2, 3)`);
+* conditions that can never hold (`age > 30 AND age < 10`) become FALSE.
+
+Only number literals take part in range merging: string comparisons depend
+on the column collation, so they are left alone.
+"""
+
+from decimal import Decimal
+
+from sql_ast import (
+    Between, BinaryOp, Column, InList, InSubquery, IsNull, Like, Literal, UnaryOp,
+    and_all, conjuncts, disjuncts, transform,
+)
+
+COMPARISONS = ("=", "<>", "!=", "<", "<=", ">", ">=")
+NEGATED = {"=": "<>", "<>": "=", "!=": "=", "<": ">=", "<=": ">", ">": "<=", ">=": "<"}
+FLIPPED = {"=": "=", "<>": "<>", "!=": "<>", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+
+
+def _number(node):
+    """Python value of a number literal (int, exact Decimal, or float with an exponent), else None."""
+    if not isinstance(node, Literal) or node.kind != "number":
+        return None
+    text = node.value
+    if "e" in text or "E" in text:
+        return float(text)
+    if "." in text:
+        return Decimal(text)
+    return int(text)
+
+
+def _number_literal(value):
+    return Literal(str(value), "number")
+
+
+def _boolean(value):
+    return Literal("TRUE" if value else "FALSE", "boolean")
+
+
+def _is_null(node):
+    return isinstance(node, Literal) and node.kind == "null"
+
+
+def is_true(node):
+    return isinstance(node, Literal) and node.kind == "boolean" and node.python_value is True
+
+
+def is_false(node):
+    return isinstance(node, Literal) and node.kind == "boolean" and node.python_value is False
+
+
+def _compare(op, left, right):
+    if op == "=":
+        return left == right
+    if op in ("<>", "!="):
+        return left != right
+    if op == "<":
+        return left < right
+    if op == "<=":
+        return left <= right
+    if op == ">":
+        return left > right
+    return left >= right
+
+
+def _fold(node):
+    if isinstance(node, UnaryOp) and node.op in ("-", "+"):
+        value = _number(node.operand)
+        if value is not None:
+            return _number_literal(-value if node.op == "-" else value)
+        return node
+    if isinstance(node, BinaryOp) and node.op in ("+", "-", "*", "/", "%"):
+        left, right = _number(node.left), _number(node.right)
+        if left is None or right is None or isinstance(left, float) != isinstance(right, float):
+            return node
+        if node.op == "+":
+            return _number_literal(left + right)
+        if node.op == "-":
+            return _number_literal(left - right)
+        if node.op == "*":
+            return _number_literal(left * right)
+        # MySQL division returns a DECIMAL with a session-dependent scale and
+        # x / 0 is NULL, so only exact integer quotients are folded
+        if isinstance(left, int) and isinstance(right, int) and right != 0 and left % right == 0:
+            return _number_literal(left // right) if node.op == "/" else _number_literal(0)
+        if node.op == "%" and isinstance(left, int) and isinstance(right, int) and right > 0 and left >= 0:
+            return _number_literal(left % right)
+        return node
+    if isinstance(node, BinaryOp) and node.op in COMPARISONS:
+        if _is_null(node.left) or _is_null(node.right):
+            return Literal("NULL", "null")
+        left, right = _number(node.left), _number(node.right)
+        if left is not None and right is not None:
+            return _boolean(_compare(node.op, left, right))
+    return node
+
+
+def fold_constants(expr):
+    """Evaluate arithmetic and comparisons whose operands are all number literals."""
+    return transform(expr, _fold)
+
+
+def negate(expr):
+    """NOT `expr`, pushed through AND / OR and into the predicate at each leaf."""
+    if isinstance(expr, BinaryOp) and expr.op in ("AND", "OR"):
+        return BinaryOp("OR" if expr.op == "AND" else "AND", negate(expr.left), negate(expr.right))
+    if isinstance(expr, UnaryOp) and expr.op == "NOT":
+        return expr.operand
+    if isinstance(expr, BinaryOp) and expr.op in NEGATED:
+        return BinaryOp(NEGATED[expr.op], expr.left, expr.right)
+    if isinstance(expr, (InList, InSubquery, Between, Like, IsNull)):
+        return expr.replace(negated=not expr.negated)
+    if isinstance(expr, Literal) and expr.kind == "boolean":
+        return _boolean(not expr.python_value)
+    if _is_null(expr):
+        return expr
+    return UnaryOp("NOT", expr)
+
+
+def normalize(expr):
+    """Push NOT down to the leaves and write comparisons column first, with <> for !=."""
+    if isinstance(expr, BinaryOp) and expr.op in ("AND", "OR"):
+        left, right = normalize(expr.left), normalize(expr.right)
+        if left is expr.left and right is expr.right:
+            return expr
+        return BinaryOp(expr.op, left, right)
+    if isinstance(expr, UnaryOp) and expr.op == "NOT":
+        return negate(normalize(expr.operand))
+    if isinstance(expr, BinaryOp) and expr.op in COMPARISONS:
+        if isinstance(expr.left, Literal) and not isinstance(expr.right, Literal):
+            return BinaryOp(FLIPPED[expr.op], expr.right, expr.left)
+        if expr.op == "!=":
+            return BinaryOp("<>", expr.left, expr.right)
+    return expr
+
+
+class _ColumnRange:
+    """Numeric constraints on one column collected from a conjunction."""
+
+    def __init__(self, column):
+        self.column = column
+        self.predicates = []  # the original conjuncts
+        self.low = None  # (value, inclusive, literal)
+        self.high = None
+        self.values = None  # value -> literal the column must be one of
+        self.excluded = {}  # value -> literal the column must not be
+        self.null = None  # True for IS NULL, False for IS NOT NULL
+
+    def add(self, predicate):
+        """Record `predicate` if it is a constraint this class understands; returns whether it was."""
+        column_key = self.column.key()
+        if isinstance(predicate, BinaryOp) and predicate.op in COMPARISONS:
+            value = _number(predicate.right)
+            if value is None or predicate.left.key() != column_key:
+                return False
+            literal = predicate.right
+            op = predicate.op
+            if op == "=":
+                self._restrict({value: literal})
+            elif op in ("<>", "!="):
+                self.excluded.setdefault(value, literal)
+            elif op in (">", ">="):
+                self._lower(value, op == ">=", literal)
+            else:
+                self._upper(value, op == "<=", literal)
+        elif isinstance(predicate, InList):
+            values = [_number(item) for item in predicate.items]
+            if predicate.expr.key() != column_key or None in values:
+                return False
+            if predicate.negated:
+                for value, item in zip(values, predicate.items):
+                    self.excluded.setdefault(value, item)
+            else:
+                allowed = {}
+                for value, item in zip(values, predicate.items):
+                    allowed.setdefault(value, item)
+                self._restrict(allowed)
+        elif isinstance(predicate, Between):
+            low, high = _number(predicate.low), _number(predicate.high)
+            if predicate.negated or predicate.expr.key() != column_key or low is None or high is None:
+                return False
+            self._lower(low, True, predicate.low)
+            self._upper(high, True, predicate.high)
+        elif isinstance(predicate, IsNull):
+            if predicate.expr.key() != column_key:
+                return False
+            if self.null is not None and self.null != (not predicate.negated):
+                self.null = "both"
+            else:
+                self.null = not predicate.negated
+        else:
+            return False
+        self.predicates.append(predicate)
+        return True
+
+    def _restrict(self, allowed):
+        if self.values is None:
+            self.values = allowed
+        else:
+            self.values = {value: literal for value, literal in self.values.items() if value in allowed}
+
+    def _lower(self, value, inclusive, literal):
+        if self.low is None or value > self.low[0] or (value == self.low[0] and not inclusive):
+            self.low = (value, inclusive, literal)
+
+    def _upper(self, value, inclusive, literal):
+        if self.high is None or value < self.high[0] or (value == self.high[0] and not inclusive):
+            self.high = (value, inclusive, literal)
+
+    def _in_range(self, value):
+        if self.low is not None and (value < self.low[0] or (value == self.low[0] and not self.low[1])):
+            return False
+        if self.high is not None and (value > self.high[0] or (value == self.high[0] and not self.high[1])):
+            return False
+        return True
+
+    def merged(self):
+        """The tightest equivalent list of predicates, or None when they can never all hold."""
+        column = self.column
+        compared = self.values is not None or self.low is not None or self.high is not None or self.excluded
+        if self.null == "both" or (self.null is True and compared):
+            return None
+        if self.null is True:
+            return [IsNull(column, False)]
+
+        if self.values is not None:
+            values = [literal for value, literal in self.values.items()
+                      if self._in_range(value) and value not in self.excluded]
+            if not values:
+                return None
+            if len(values) == 1:
+                return [BinaryOp("=", column, values[0])]
+            return [InList(column, values, False)]
+
+        result = []
+        low, high = self.low, self.high
+        if low is not None and high is not None:
+            if low[0] > high[0] or (low[0] == high[0] and not (low[1] and high[1])):
+                return None
+            if low[0] == high[0]:
+                if low[0] in self.excluded:
+                    return None
+                return [BinaryOp("=", column, low[2])]
+            if low[1] and high[1]:
+                result.append(Between(column, low[2], high[2], False))
+                low = high = None
+        if low is not None:
+            result.append(BinaryOp(">=" if low[1] else ">", column, low[2]))
+        if high is not None:
+            result.append(BinaryOp("<=" if high[1] else "<", column, high[2]))
+        excluded = [literal for value, literal in self.excluded.items() if self._in_range(value)]
+        if len(excluded) == 1:
+            result.append(BinaryOp("<>", column, excluded[0]))
+        elif excluded:
+            result.append(InList(column, excluded, True))
+        if not result and self.null is False:
+            result.append(IsNull(column, True))
+        return result
+
+
+def _constrained_column(predicate):
+    if isinstance(predicate, BinaryOp) and predicate.op in COMPARISONS:
+        return predicate.left if isinstance(predicate.left, Column) else None
+    if isinstance(predicate, (InList, Between, IsNull)):
+        return predicate.expr if isinstance(predicate.expr, Column) else None
+    return None
+
+
+def _merge_conjuncts(parts, notes):
+    """Merge the per-column constraints among `parts`; None when they contradict each other."""
+    ranges = {}
+    order = []  # conjuncts, with a _ColumnRange standing in for all constraints on its column
+    for part in parts:
+        column = _constrained_column(part)
+        if column is not None:
+            column_range = ranges.get(column.key())
+            if column_range is None:
+                column_range = _ColumnRange(column)
+                if column_range.add(part):
+                    ranges[column.key()] = column_range
+                    order.append(column_range)
+                    continue
+            elif column_range.add(part):
+                continue
+        order.append(part)
+
+    result = []
+    for item in order:
+        if not isinstance(item, _ColumnRange):
+            result.append(item)
+            continue
+        merged = item.merged()
+        if merged is None:
+            notes.append(f"{' AND '.join(p.to_sql() for p in item.predicates)} can never be true")
+            return None
+        if [p.key() for p in merged] == [p.key() for p in item.predicates]:
+            result.extend(item.predicates)
+        else:
+            result.extend(merged)
+    return result
+
+
+def _simplify(expr, notes):
+    if isinstance(expr, BinaryOp) and expr.op == "AND":
+        parts = []
+        for part in conjuncts(expr):
+            part = _simplify(part, notes)
+            if is_false(part) or _is_null(part):
+                return _boolean(False)
+            if not is_true(part):
+                parts.extend(conjuncts(part))
+        parts = _merge_conjuncts(parts, notes)
+        if parts is None:
+            return _boolean(False)
+        return and_all(parts) or _boolean(True)
+    if isinstance(expr, BinaryOp) and expr.op == "OR":
+        options = []
+        for option in disjuncts(expr):
+            option = _simplify(option, notes)
+            if is_true(option):
+                return option
+            if not is_false(option) and not _is_null(option):
+                options.append(option)
+        if not options:
+            return _boolean(False)
+        result = options[0]
+        for option in options[1:]:
+            result = BinaryOp("OR", result, option)
+        return result
+    if _is_null(expr):
+        # In a filter NULL rejects the row just like FALSE
+        return _boolean(False)
+    merged = _merge_conjuncts([expr], notes)
+    if merged is None:
+        return _boolean(False)
+    return and_all(merged) or _boolean(True)
+
+
+def simplify_predicate(expr):
+    """
+    Normalize a WHERE condition, fold its constants and merge its ranges.
+
+    Returns (condition, notes). `condition` is the very same object when
+    nothing could be simplified, None when it always holds and a FALSE
+    literal when no row can ever satisfy it; `notes` explain contradictions.
+    NULL is treated as FALSE, which is only valid where the result filters
+    rows (WHERE, ON, HAVING).
+    """
+    if expr is None:
+        return None, []
+    notes = []
+    result = _simplify(normalize(fold_constants(expr)), notes)
+    if is_true(result):
+        return None, notes
+    if result.key() == expr.key():
+        return expr, notes
+    return result, notes
+
+
+def is_contradiction(expr):
+    """True when the WHERE condition `expr` can never hold."""
+    return expr is not None and is_false(simplify_predicate(expr)[0])
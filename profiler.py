@@ -0,0 +1,281 @@
+"""
+Profiling and tracing for the compiler pipeline.
+
+    with profile() as trace:
+        compiled = CompiledQuery(query)
+        compiled.semantic_result
+    print(trace.report())
+    trace.save("trace.json")  # open in chrome://tracing or https://ui.perfetto.dev
+
+The pipeline is instrumented with spans: one per phase (lex, parse,
+optimize, semantic, execute), one per optimizer pass run and one per
+statement sent to the database. Each span records its wall time, how many
+database round trips happened inside it and, with `profile(memory=True)`,
+the peak memory allocated while it ran (measured with tracemalloc, which
+slows everything down noticeably). `trace.summary()` aggregates the spans
+by name.
+
+Outside a `profile()` block `span()` returns a shared no-op context
+manager, so the instrumentation costs a context variable lookup.
+
+    python profiler.py "SELECT * FROM users WHERE id = 1" --output trace.json
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+# Span categories
+PHASE = "phase"
+PASS = "pass"
+DB = "db"
+
+# (Trace, innermost open Span) of the current profile() block
+_active = ContextVar("sqlc_profile", default=None)
+
+
+class _NoSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Span:
+    """One timed region; `db_round_trips` and `alloc_peak` include nested spans."""
+
+    __slots__ = ("trace", "parent", "name", "category", "args", "thread", "start_ns", "end_ns",
+                 "child_ns", "db_round_trips", "alloc_peak", "_token", "_memory_start", "_memory_peak")
+
+    def __init__(self, trace, parent, name, category, args):
+        self.trace = trace
+        self.parent = parent
+        self.name = name
+        self.category = category
+        self.args = args
+        self.thread = threading.get_ident()
+        self.start_ns = self.end_ns = None
+        self.child_ns = 0
+        self.db_round_trips = 1 if category == DB else 0
+        self.alloc_peak = None
+        self._memory_start = self._memory_peak = None
+
+    @property
+    def duration_ms(self):
+        return (self.end_ns - self.start_ns) / 1e6
+
+    @property
+    def self_ms(self):
+        """Time not spent in nested spans."""
+        return (self.end_ns - self.start_ns - self.child_ns) / 1e6
+
+    def __enter__(self):
+        if self.trace.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if self.parent is not None and self.parent._memory_peak is not None:
+                self.parent._memory_peak = max(self.parent._memory_peak, peak)
+            tracemalloc.reset_peak()
+            self._memory_start = self._memory_peak = current
+        self._token = _active.set((self.trace, self))
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.perf_counter_ns()
+        _active.reset(self._token)
+        parent = self.parent
+        if self._memory_start is not None and tracemalloc.is_tracing():
+            self._memory_peak = max(self._memory_peak, tracemalloc.get_traced_memory()[1])
+            self.alloc_peak = self._memory_peak - self._memory_start
+            if parent is not None and parent._memory_peak is not None:
+                parent._memory_peak = max(parent._memory_peak, self._memory_peak)
+        if parent is not None:
+            parent.child_ns += self.end_ns - self.start_ns
+            parent.db_round_trips += self.db_round_trips
+        self.trace._add(self)
+        return False
+
+    def to_dict(self):
+        data = {"name": self.name, "category": self.category, "thread": self.thread,
+                "start_ms": (self.start_ns - self.trace.start_ns) / 1e6, "duration_ms": self.duration_ms,
+                "self_ms": self.self_ms, "db_round_trips": self.db_round_trips,
+                "parent": self.parent.name if self.parent is not None else None}
+        if self.alloc_peak is not None:
+            data["alloc_peak_bytes"] = self.alloc_peak
+        if self.args:
+            data["args"] = self.args
+        return data
+
+
+class Trace:
+    """Spans recorded by one profile() block, in the order they finished."""
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.spans = []
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+        self._lock = threading.Lock()
+
+    def _add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    @property
+    def duration_ms(self):
+        end = self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+        return (end - self.start_ns) / 1e6
+
+    def summary(self):
+        """Per (category, name): calls, total and self time, DB round trips and peak allocation."""
+        rows = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            row = rows.get((span.category, span.name))
+            if row is None:
+                row = rows[(span.category, span.name)] = {
+                    "category": span.category, "name": span.name, "calls": 0, "total_ms": 0.0,
+                    "self_ms": 0.0, "db_round_trips": 0, "alloc_peak_bytes": None}
+            row["calls"] += 1
+            row["self_ms"] += span.self_ms
+            if span.alloc_peak is not None:
+                row["alloc_peak_bytes"] = max(row["alloc_peak_bytes"] or 0, span.alloc_peak)
+            if not self._nested_in_same(span):
+                # Recursive spans (e.g. a subquery phase inside the same phase) count once
+                row["total_ms"] += span.duration_ms
+                row["db_round_trips"] += span.db_round_trips
+        return sorted(rows.values(), key=lambda row: -row["total_ms"])
+
+    @staticmethod
+    def _nested_in_same(span):
+        parent = span.parent
+        while parent is not None:
+            if parent.name == span.name and parent.category == span.category:
+                return True
+            parent = parent.parent
+        return False
+
+    def report(self):
+        """The summary as a text table."""
+        lines = [f"{'category':<8} {'name':<32} {'calls':>6} {'total ms':>10} {'self ms':>10} "
+                 f"{'db trips':>8} {'peak KiB':>9}"]
+        for row in self.summary():
+            peak = row["alloc_peak_bytes"]
+            lines.append(f"{row['category']:<8} {row['name'][:32]:<32} {row['calls']:>6} "
+                         f"{row['total_ms']:>10.3f} {row['self_ms']:>10.3f} {row['db_round_trips']:>8} "
+                         f"{'-' if peak is None else f'{peak / 1024:.1f}':>9}")
+        lines.append(f"total {self.duration_ms:.3f} ms")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        with self._lock:
+            spans = list(self.spans)
+        return {"duration_ms": self.duration_ms, "summary": self.summary(),
+                "spans": [span.to_dict() for span in sorted(spans, key=lambda span: span.start_ns)]}
+
+    def to_chrome_trace(self):
+        """The spans as Chrome trace format complete ("X") events."""
+        pid = os.getpid()
+        events = []
+        with self._lock:
+            spans = list(self.spans)
+        for span in sorted(spans, key=lambda span: span.start_ns):
+            args = dict(span.args)
+            args["db_round_trips"] = span.db_round_trips
+            if span.alloc_peak is not None:
+                args["alloc_peak_bytes"] = span.alloc_peak
+            events.append({"name": span.name, "cat": span.category, "ph": "X", "pid": pid,
+                           "tid": span.thread, "ts": (span.start_ns - self.start_ns) / 1e3,
+                           "dur": (span.end_ns - span.start_ns) / 1e3, "args": args})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save(self, path, format="chrome"):
+        data = self.to_chrome_trace() if format == "chrome" else self.to_dict()
+        with open(path, "w") as f:
+            json.dump(data, f, indent=1, default=str)
+
+
+@contextmanager
+def profile(memory=False):
+    """Record the spans of the code run in this block (in this thread / task) into a Trace."""
+    trace = Trace(memory)
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    token = _active.set((trace, None))
+    try:
+        yield trace
+    finally:
+        _active.reset(token)
+        trace.end_ns = time.perf_counter_ns()
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def span(name, category=PHASE, **args):
+    """Context manager timing a region of the current profile() block; does nothing outside one."""
+    state = _active.get()
+    if state is None:
+        return _NO_SPAN
+    return Span(state[0], state[1], name, category, args)
+
+
+def profiled(name=None, category=PHASE):
+    """Decorator running the function in a span named after it."""
+    def decorate(func):
+        span_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def is_profiling():
+    return _active.get() is not None
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Profile the compiler phases for one query.")
+    arg_parser.add_argument("query")
+    arg_parser.add_argument("--memory", action="store_true", help="also record peak allocations (slower)")
+    arg_parser.add_argument("--execute", action="store_true", help="run the optimized query as well")
+    arg_parser.add_argument("--output", help="write the trace to this file")
+    arg_parser.add_argument("--format", choices=("chrome", "json"), default="chrome")
+    args = arg_parser.parse_args(argv)
+
+    # Imported here because the pipeline modules import this one
+    from compiler import CompiledQuery
+    from executor import execute_query
+
+    with profile(memory=args.memory) as trace:
+        compiled = CompiledQuery(args.query)
+        compiled.token_list
+        compiled.syntax_result
+        compiled.optimization_steps
+        compiled.semantic_result
+        if args.execute:
+            execute_query(compiled.optimized_query)
+    print(trace.report())
+    if args.output:
+        trace.save(args.output, args.format)
+        print(f"Trace written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Cache of SELECT results for the executor.
+
+Results are keyed by the database they came from (the backend) and the
+query fingerprint plus its literal values, so queries that differ only in
+whitespace, comments or keyword case share an entry. The cache holds at
+most `max_bytes` of DataFrames (least recently used are evicted first) and
+entries expire after `ttl` seconds.
+
+Every INSERT / UPDATE / DELETE that goes through the executor invalidates
+the cached results that read from the table it writes to. Writes the
+executor does not see (other clients, triggers, foreign-key cascades) are
+only picked up when the entry expires.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from catalog import get_catalog
+from compiler import compile_query
+from lexer import fingerprint
+from sql_ast import (
+    NILADIC_FUNCTIONS, Column, Delete, FuncCall, Insert, Select, SetOperation, TableRef, Update, walk,
+)
+
+RESULT_CACHE_BYTES = int(os.environ.get('SQLC_RESULT_CACHE_BYTES', 64 * 1024 * 1024))
+RESULT_CACHE_TTL = float(os.environ.get('SQLC_RESULT_CACHE_TTL', 300))  # seconds
+
+# Functions whose result changes between calls; queries using them are not cached
+NONDETERMINISTIC_FUNCTIONS = {
+    "NOW", "SYSDATE", "CURDATE", "CURTIME", "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP",
+    "LOCALTIME", "LOCALTIMESTAMP", "UTC_DATE", "UTC_TIME", "UTC_TIMESTAMP", "UNIX_TIMESTAMP",
+    "RAND", "UUID", "UUID_SHORT", "CONNECTION_ID", "LAST_INSERT_ID", "FOUND_ROWS", "ROW_COUNT",
+    "SLEEP", "GET_LOCK", "RELEASE_LOCK", "IS_FREE_LOCK", "USER", "CURRENT_USER", "SESSION_USER",
+    "SYSTEM_USER", "DATABASE", "SCHEMA",
+}
+
+
+def _table_key(table_ref):
+    return table_ref.name.lower()
+
+
+def read_tables(ast):
+    """
+    Lower-case names of the tables a SELECT reads, or None when its result
+    must not be cached (not a SELECT, or it calls a nondeterministic function).
+    """
+    if not isinstance(ast, (Select, SetOperation)):
+        return None
+    tables = set()
+    for node in walk(ast):
+        if isinstance(node, TableRef):
+            tables.add(_table_key(node))
+        elif isinstance(node, FuncCall) and node.name.upper() in NONDETERMINISTIC_FUNCTIONS:
+            return None
+        elif isinstance(node, Column) and len(node.parts) == 1 and node.name.upper() in NILADIC_FUNCTIONS:
+            return None
+    return frozenset(tables)
+
+
+def written_tables(ast):
+    """Lower-case names of the tables an INSERT / UPDATE / DELETE writes to, or None if unknown."""
+    if not isinstance(ast, (Insert, Update, Delete)):
+        return None
+    tables = {_table_key(node) for node in walk(ast.table) if isinstance(node, TableRef)}
+    return tables or None
+
+
+class ResultCache:
+    """
+    LRU cache of SELECT results with a memory budget and per-table invalidation.
+
+        result, ticket = cache.get(query, backend)
+        if result is None:
+            result = run(query)
+            cache.put(ticket, result)
+
+    `get` returns a ticket (None for queries that cannot be cached) that
+    remembers which tables the query reads; `put` drops the result if one of
+    them was written to while the query ran.
+    """
+
+    def __init__(self, max_bytes=RESULT_CACHE_BYTES, ttl=RESULT_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (result, tables, size, stored_at, catalog version)
+        self._by_table = {}  # table -> keys of the entries that read it
+        self._generations = {}  # table -> number of writes seen
+        self._epoch = 0  # number of clear() calls
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _ticket(self, query, source):
+        try:
+            compiled = compile_query(query)
+        except ValueError:
+            return None
+        tables = read_tables(compiled.ast)
+        if tables is None:
+            return None
+        digest, literals = fingerprint(compiled.tokens)
+        key = (source, digest, tuple(literals.values()))
+        with self._lock:
+            generations = self._generations_of(tables)
+        return key, tables, generations, get_catalog().version
+
+    def _generations_of(self, tables):
+        return self._epoch, tuple(self._generations.get(table, 0) for table in sorted(tables))
+
+    def get(self, query, source=None):
+        """
+        (copy of the cached result or None, ticket for put()). `source`
+        identifies the database the result comes from, e.g. the backend.
+        """
+        if self.max_bytes <= 0:
+            return None, None
+        ticket = self._ticket(query, source)
+        if ticket is None:
+            return None, None
+        key, _, _, version = ticket
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[4] != version or time.monotonic() - entry[3] > self.ttl):
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None, ticket
+            self._entries.move_to_end(key)
+            self.hits += 1
+            result = entry[0]
+        # Callers may modify the DataFrame they get back
+        return result.copy(), ticket
+
+    def put(self, ticket, result):
+        if ticket is None:
+            return False
+        key, tables, generations, version = ticket
+        size = int(result.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if self._generations_of(tables) != generations or version != get_catalog().version:
+                # A table was written to (or the schema changed) while the query ran
+                return False
+            self._remove(key)
+            self._entries[key] = (result, tables, size, time.monotonic(), version)
+            self.bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= entry[2]
+        for table in entry[1]:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def invalidate_tables(self, tables):
+        """Drop every result that read from one of `tables`."""
+        with self._lock:
+            for table in tables:
+                table = table.lower()
+                self._generations[table] = self._generations.get(table, 0) + 1
+                for key in list(self._by_table.get(table, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def invalidate_statement(self, query):
+        """Invalidate what a write statement touches; everything when its target cannot be told."""
+        try:
+            tables = written_tables(compile_query(query).ast)
+        except ValueError:
+            tables = None
+        if tables is None:
+            self.clear()
+        else:
+            self.invalidate_tables(tables)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._epoch += 1
+            self._entries.clear()
+            self._by_table.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "invalidations": self.invalidations}
+
+
+result_cache = ResultCache()
+
+
+def get_result_cache():
+    return result_cache
+
+
+def set_result_cache(new_cache):
+    global result_cache
+    result_cache = new_cache
+    return result_cache
@@ -1,60 +1,333 @@
-import mysql.connector
-from db_config import get_connection
+"""
+Semantic analysis: checks that the tables and columns a statement refers to
+exist and that literals compared with or assigned to a column fit its type.
+
+validate_semantics walks the statement's AST, resolving table aliases,
+derived tables and correlated subqueries scope by scope. All the tables a
+statement mentions are looked up with one catalog call
+(SchemaCatalog.describe_tables), so checking a statement takes at most one
+information_schema query however many tables and columns it uses.
+Statements the parser cannot handle get the older token-based check.
+"""
+
 import re
 
+from catalog import get_catalog
+from parser import ParseError, parse_sql
+from sql_ast import (
+    NILADIC_FUNCTIONS, Between, BinaryOp, Column, Ddl, Delete, Exists, InList, InSubquery, Insert,
+    Join, Literal, Select, SetOperation, Star, Subquery, TableRef, Update, table_sources, walk,
+    walk_block,
+)
+
+COMPARISON_OPS = {"=", "<>", "!=", "<", "<=", ">", ">=", "<=>"}
+
+NUMERIC_TYPES = {"tinyint", "smallint", "mediumint", "int", "integer", "bigint", "decimal", "numeric",
+                 "dec", "fixed", "float", "double", "real", "bit", "bool", "boolean"}
+STRING_TYPES = {"char", "varchar", "tinytext", "text", "mediumtext", "longtext", "enum", "set"}
+
+_NUMBER = re.compile(r'^\s*[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?\s*$')
+
+
 def check_table_exists(table_name):
-    conn = get_connection()
-    if conn is None:
-        return False
-    cursor = conn.cursor()
-    cursor.execute("SHOW TABLES LIKE %s", (table_name,))
-    result = cursor.fetchone()
-    conn.close()
-    return result is not None
+    return get_catalog().table_exists(table_name)
 
 def get_table_columns(table_name):
-    conn = get_connection()
-    if conn is None:
-        return []
-    cursor = conn.cursor()
-    cursor.execute(f"DESCRIBE {table_name}")
-    columns = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return columns
+    return get_catalog().get_columns(table_name)
 
 def get_column_data_type(table_name, column_name):
-    conn = get_connection()
-    if conn is None:
-        return None
-    cursor = conn.cursor()
-    cursor.execute(f"DESCRIBE {table_name}")
-    columns = cursor.fetchall()
-    conn.close()
-    for col in columns:
-        if col[0] == column_name:
-            return col[1]  # Return the data type
-    return None
+    return get_catalog().get_column_type(table_name, column_name)
 
 def check_column_exists(table_name, column_name):
-    return column_name in get_table_columns(table_name)
+    return get_catalog().has_column(table_name, column_name)
+
+def _type_family(column_type):
+    base = re.match(r'\s*(\w*)', column_type or "").group(1).lower()
+    if base in NUMERIC_TYPES:
+        return "numeric"
+    if base in STRING_TYPES:
+        return "string"
+    return None
+
+def literal_fits(column_type, literal):
+    """False when `literal` (a Literal node) clearly does not fit a column of `column_type`."""
+    family = _type_family(column_type)
+    if literal.kind == "number":
+        return family != "string"
+    if literal.kind == "string":
+        return family != "numeric" or bool(_NUMBER.match(literal.python_value))
+    return True
 
 def validate_column_data_type(table_name, column_name, value):
     column_type = get_column_data_type(table_name, column_name)
     if not column_type:
         return False
-    
-    # Check if the value is numeric
-    if re.match(r'^\d+(\.\d+)?$', str(value)):
-        return column_type.startswith("int") or column_type.startswith("decimal") or column_type.startswith("float")
-    
-    # Check if the value is a string
-    if re.match(r'^".*"$', str(value)) or re.match(r"^'.*'$", str(value)):
-        return column_type.startswith("char") or column_type.startswith("text")
-    
+    value = str(value)
+    if _NUMBER.match(value):
+        return literal_fits(column_type, Literal(value, "number"))
+    if re.match(r'^".*"$', value) or re.match(r"^'.*'$", value):
+        return literal_fits(column_type, Literal(value, "string"))
     return True
 
-def validate_semantics(query):
+
+class SemanticError(Exception):
+    pass
+
+
+class _Source:
+    """A table or derived table visible in a scope; `columns` is None when they are unknown."""
+
+    __slots__ = ("ref_name", "label", "columns")
+
+    def __init__(self, ref_name, label, columns):
+        self.ref_name = (ref_name or "").lower()
+        self.label = label
+        self.columns = columns  # lower name -> (name, type or None)
+
+
+class _Scope:
+    def __init__(self, sources, parent=None):
+        self.sources = sources
+        self.parent = parent
+        self.using = set()  # lower names of JOIN ... USING columns, which are not ambiguous
+
+
+def _joins(from_items):
+    for item in from_items:
+        if isinstance(item, Join):
+            yield from _joins([item.left, item.right])
+            yield item
+
+
+class SemanticAnalyzer:
+    """
+    Resolves every table and column reference of a parsed statement.
+
+    `analyze(ast)` raises SemanticError for the first problem found and
+    otherwise returns the kind of statement checked (e.g. "SELECT"), or None
+    for statements it does not check.
+    """
+
+    def __init__(self, catalog=None):
+        self.catalog = catalog or get_catalog()
+        self.tables = {}  # lower name -> [(column, type), ...] or None
+        self._types = {}  # id(Column) -> type of the column it resolved to
+
+    def analyze(self, ast):
+        names = [node.name for node in walk(ast) if isinstance(node, TableRef)]
+        self.tables = self.catalog.describe_tables(names) if names else {}
+        self._types = {}
+        if isinstance(ast, Ddl):
+            return self._ddl(ast)
+        for name in names:
+            if self.tables.get(name.lower()) is None:
+                raise SemanticError(f"Table '{name}' does not exist.")
+        if isinstance(ast, (Select, SetOperation)):
+            self._query(ast, None)
+            return "SELECT"
+        if isinstance(ast, Insert):
+            self._insert(ast)
+            return "INSERT"
+        if isinstance(ast, Update):
+            scope = _Scope(self._sources([ast.table]))
+            for assignment in ast.assignments:
+                self._column(assignment.column, scope)
+                self._expr(assignment.value, scope)
+                self._check_assignment(assignment.column, assignment.value)
+            self._expr(ast.where, scope)
+            return "UPDATE"
+        if isinstance(ast, Delete):
+            self._expr(ast.where, _Scope(self._sources([ast.table])))
+            return "DELETE"
+        return None
+
+    def _ddl(self, ast):
+        if ast.object_type != "TABLE":
+            return None
+        for ref in ast.names:
+            exists = self.tables.get(ref.name.lower()) is not None
+            if ast.action == "CREATE":
+                if exists and not ast.if_exists:
+                    raise SemanticError(f"Table '{ref.name}' already exists.")
+            elif not exists and not ast.if_exists:
+                raise SemanticError(f"Table '{ref.name}' does not exist.")
+        return ast.action
+
+    def _table_columns(self, ref):
+        return {column.lower(): (column, column_type) for column, column_type in self.tables[ref.name.lower()]}
+
+    def _sources(self, from_items):
+        sources = []
+        for item in table_sources(from_items):
+            if isinstance(item, TableRef):
+                sources.append(_Source(item.ref_name, item.name, self._table_columns(item)))
+            else:
+                sources.append(_Source(item.ref_name, item.ref_name or "derived table",
+                                       self._query(item.query, None)))
+        return sources
+
+    def _query(self, query, parent):
+        """Check a SELECT (or UNION); returns its output columns, or None when they are unknown."""
+        if isinstance(query, SetOperation):
+            outputs = self._query(query.left, parent)
+            self._query(query.right, parent)
+            return outputs
+        scope = _Scope(self._sources(query.from_), parent)
+        for join in _joins(query.from_):
+            for name in join.using or ():
+                scope.using.add(name.strip('`"').lower())
+                self._column(Column([name]), scope)
+            self._expr(join.condition, scope)
+        for item in query.columns:
+            self._expr(item.expr, scope)
+        self._expr(query.where, scope)
+        # GROUP BY, HAVING and ORDER BY may also name select-list aliases
+        aliases = {item.alias.strip('`"').lower() for item in query.columns if item.alias}
+        for expr in query.group_by:
+            self._expr(expr, scope, aliases)
+        self._expr(query.having, scope, aliases)
+        for item in query.order_by:
+            self._expr(item.expr, scope, aliases)
+        return self._outputs(query, scope)
+
+    def _outputs(self, query, scope):
+        outputs = {}
+        for item in query.columns:
+            expr = item.expr
+            if item.alias:
+                name = item.alias.strip('`"')
+                outputs[name.lower()] = (name, self._types.get(id(expr)))
+            elif isinstance(expr, Star):
+                wanted = expr.table.strip('`"').lower() if expr.table else None
+                for source in scope.sources:
+                    if wanted is None or source.ref_name == wanted:
+                        if source.columns is None:
+                            return None
+                        outputs.update(source.columns)
+            elif isinstance(expr, Column):
+                outputs[expr.name.lower()] = (expr.name, self._types.get(id(expr)))
+            else:
+                name = expr.to_sql()
+                outputs[name.lower()] = (name, None)
+        return outputs
+
+    def _insert(self, ast):
+        scope = _Scope(self._sources([ast.table]))
+        if ast.columns:
+            for column in ast.columns:
+                self._column(column, scope)
+            targets = ast.columns
+        else:
+            targets = [Column([name]) for name, _ in scope.sources[0].columns.values()]
+            for column in targets:
+                self._column(column, scope)
+        for number, row in enumerate(ast.rows, 1):
+            if len(row.items) != len(targets):
+                raise SemanticError(f"Column count doesn't match value count at row {number}.")
+            for column, value in zip(targets, row.items):
+                self._expr(value, scope)
+                self._check_assignment(column, value)
+        if ast.query is not None:
+            self._query(ast.query, None)
+
+    def _expr(self, expr, scope, aliases=()):
+        if expr is None:
+            return
+        pairs = []  # (left, right) operands whose types are compared
+        for node in walk_block(expr):
+            if isinstance(node, Column):
+                self._column(node, scope, aliases)
+            elif isinstance(node, Star) and node.table is not None:
+                self._qualifier(node.table, scope, node.to_sql())
+            elif isinstance(node, (Subquery, Exists, InSubquery)):
+                self._query(node.query, scope)
+            if isinstance(node, BinaryOp) and node.op in COMPARISON_OPS:
+                pairs.append((node.left, node.right))
+            elif isinstance(node, InList):
+                pairs.extend((node.expr, item) for item in node.items)
+            elif isinstance(node, Between):
+                pairs.extend(((node.expr, node.low), (node.expr, node.high)))
+        for left, right in pairs:
+            for column, literal in ((left, right), (right, left)):
+                if isinstance(column, Column) and isinstance(literal, Literal):
+                    column_type = self._types.get(id(column))
+                    if column_type and not literal_fits(column_type, literal):
+                        raise SemanticError(f"Incompatible data types for comparison: "
+                                            f"'{left.to_sql()}' and '{right.to_sql()}'.")
+
+    def _check_assignment(self, column, value):
+        column_type = self._types.get(id(column))
+        if isinstance(value, Literal) and column_type and not literal_fits(column_type, value):
+            raise SemanticError(f"Incompatible value {value.to_sql()} for column '{column.name}' ({column_type}).")
+
+    def _qualifier(self, qualifier, scope, text):
+        qualifier = qualifier.strip('`"')
+        wanted = qualifier.lower()
+        current = scope
+        while current is not None:
+            for source in current.sources:
+                if source.ref_name == wanted:
+                    return source
+            current = current.parent
+        raise SemanticError(f"Unknown table or alias '{qualifier}' in '{text}'.")
+
+    def _column(self, column, scope, aliases=()):
+        name = column.name
+        key = name.lower()
+        if column.table is not None:
+            source = self._qualifier(column.table, scope, column.to_sql())
+            if source.columns is None:
+                return
+            entry = source.columns.get(key)
+            if entry is None:
+                raise SemanticError(f"Column '{name}' does not exist in table '{source.label}'.")
+            self._types[id(column)] = entry[1]
+            return
+        if key in aliases:
+            return
+        current = scope
+        while current is not None:
+            known = [source for source in current.sources if source.columns is not None and key in source.columns]
+            if len(known) > 1 and key not in current.using:
+                raise SemanticError(f"Column '{name}' is ambiguous.")
+            if known:
+                self._types[id(column)] = known[0].columns[key][1]
+                return
+            if any(source.columns is None for source in current.sources):
+                return
+            current = current.parent
+        if name.upper() in NILADIC_FUNCTIONS:
+            return
+        labels = [source.label for source in scope.sources]
+        if not labels:
+            raise SemanticError(f"Unknown column '{name}'.")
+        if len(labels) == 1:
+            raise SemanticError(f"Column '{name}' does not exist in table '{labels[0]}'.")
+        tables = ", ".join(f"'{label}'" for label in labels)
+        raise SemanticError(f"Column '{name}' does not exist in any of the tables {tables}.")
+
+
+def validate_semantics(query, ast=None):
+    """
+    Check `query` against the schema; returns a "Semantic Check ..." or
+    "Semantic Error: ..." message. Pass `ast` when the query is already parsed.
+    """
     query = query.strip().strip(';')
+    if ast is None:
+        try:
+            ast = parse_sql(query)
+        except ParseError:
+            return _validate_tokens(query)
+    try:
+        kind = SemanticAnalyzer().analyze(ast)
+    except SemanticError as e:
+        return f"Semantic Error: {e}"
+    if kind is None:
+        return "Semantic Check Skipped: Unsupported query type."
+    return f"Semantic Check Passed: {kind}"
+
+def _validate_tokens(query):
+    """Token-based check for statements the parser does not handle."""
     tokens = query.upper().split()
 
     if query.upper().startswith("SELECT"):
@@ -62,14 +335,14 @@ def validate_semantics(query):
             table_name = query.upper().split("FROM")[1].split()[0]
             if not check_table_exists(table_name):
                 return f"Semantic Error: Table '{table_name}' does not exist."
-            
+
             # Validate columns referenced in WHERE clause
             if "WHERE" in tokens:
                 where_index = tokens.index("WHERE")
                 for i in range(where_index + 1, len(tokens)):
                     if tokens[i] == "=" and not check_column_exists(table_name, tokens[i-1]):
                         return f"Semantic Error: Column '{tokens[i-1]}' does not exist in table '{table_name}'."
-            
+
             return "Semantic Check Passed: SELECT"
         except:
             return "Semantic Error: Unable to extract table name from SELECT query."
@@ -88,7 +361,7 @@ def validate_semantics(query):
             table_name = tokens[1]
             if not check_table_exists(table_name):
                 return f"Semantic Error: Table '{table_name}' does not exist."
-            
+
             # Validate columns referenced in SET clause
             if "SET" in tokens:
                 set_index = tokens.index("SET")
@@ -142,6 +415,5 @@ def validate_semantics(query):
                 right_value = tokens[i+1]
                 if not validate_column_data_type(table_name, tokens[i-1], right_value):
                     return f"Semantic Error: Incompatible data types for comparison: '{left_value}' and '{right_value}'."
-            
-    return "Semantic Check Skipped: Unsupported query type."
 
+    return "Semantic Check Skipped: Unsupported query type."
@@ -0,0 +1,560 @@
+# sql_ast.py
+# Typed abstract syntax tree produced by parser.SQLSyntaxParser
+
+# Binding strength used when rendering expressions back to SQL
+PRECEDENCE = {
+    "OR": 1,
+    "AND": 2,
+    "NOT": 3,
+    "=": 4, "<>": 4, "!=": 4, "<": 4, "<=": 4, ">": 4, ">=": 4,
+    "+": 5, "-": 5,
+    "*": 6, "/": 6, "%": 6,
+}
+PREDICATE_PRECEDENCE = 4
+UNARY_PRECEDENCE = 7
+ATOM_PRECEDENCE = 8
+
+AGGREGATES = {"COUNT", "SUM", "AVG", "MIN", "MAX", "GROUP_CONCAT", "STD", "STDDEV", "VARIANCE",
+              "BIT_AND", "BIT_OR", "BIT_XOR", "JSON_ARRAYAGG", "JSON_OBJECTAGG"}
+
+# Functions that may be called without parentheses, which the parser reads as columns
+NILADIC_FUNCTIONS = {
+    "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP", "LOCALTIME", "LOCALTIMESTAMP",
+    "UTC_DATE", "UTC_TIME", "UTC_TIMESTAMP", "CURRENT_USER",
+}
+
+
+def ident_key(part):
+    """Normalized form of an identifier used for comparisons."""
+    return part.strip('`"').lower()
+
+
+class Node:
+    """
+    Base class of all AST nodes.
+
+    Subclasses list their fields in `_fields` (which doubles as `__slots__`).
+    Every node carries a `span`: the (start, end) token indices it was parsed
+    from, end exclusive, or None for nodes created by rewrites.
+    """
+
+    __slots__ = ("span",)
+    _fields = ()
+
+    def __init__(self, *values, span=None):
+        for name, value in zip(self._fields, values):
+            setattr(self, name, value)
+        self.span = span
+
+    def children(self):
+        for name in self._fields:
+            value = getattr(self, name)
+            if isinstance(value, Node):
+                yield value
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, Node):
+                        yield item
+
+    def replace(self, **changes):
+        """Return a copy of this node with some fields replaced."""
+        values = [changes.get(name, getattr(self, name)) for name in self._fields]
+        return type(self)(*values, span=self.span)
+
+    def key(self):
+        """Hashable structural key; identifiers compare case-insensitively."""
+        parts = [type(self).__name__]
+        for name in self._fields:
+            parts.append(_key_of(getattr(self, name)))
+        return tuple(parts)
+
+    def to_dict(self):
+        result = {"type": type(self).__name__}
+        for name in self._fields:
+            result[name.rstrip("_")] = _dict_of(getattr(self, name))
+        if self.span is not None:
+            result["span"] = list(self.span)
+        return result
+
+    def to_sql(self):
+        raise NotImplementedError
+
+    def precedence(self):
+        return ATOM_PRECEDENCE
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+
+def _key_of(value):
+    if isinstance(value, Node):
+        return value.key()
+    if isinstance(value, list):
+        return tuple(_key_of(item) for item in value)
+    return value
+
+
+def _dict_of(value):
+    if isinstance(value, Node):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_dict_of(item) for item in value]
+    return value
+
+
+def _wrap(node, min_precedence):
+    sql = node.to_sql()
+    if node.precedence() < min_precedence:
+        return f"({sql})"
+    return sql
+
+
+def _join(nodes, sep=", "):
+    return sep.join(node.to_sql() for node in nodes)
+
+
+# ---------------------------------------------------------------- expressions
+
+class Column(Node):
+    """Possibly qualified column reference, e.g. e.dept_id -> parts ['e', 'dept_id']."""
+    __slots__ = _fields = ("parts",)
+
+    @property
+    def name(self):
+        return self.parts[-1].strip('`"')
+
+    @property
+    def table(self):
+        return self.parts[-2].strip('`"') if len(self.parts) > 1 else None
+
+    def key(self):
+        return ("Column", tuple(ident_key(part) for part in self.parts))
+
+    def to_sql(self):
+        return ".".join(self.parts)
+
+
+class Star(Node):
+    """`*` or `t.*`."""
+    __slots__ = _fields = ("table",)
+
+    def key(self):
+        return ("Star", ident_key(self.table) if self.table else None)
+
+    def to_sql(self):
+        return f"{self.table}.*" if self.table else "*"
+
+
+class Literal(Node):
+    """Number, string, NULL or boolean literal; `value` is the source text."""
+    __slots__ = _fields = ("value", "kind")
+
+    def key(self):
+        if self.kind in ("null", "boolean"):
+            return ("Literal", self.value.upper(), self.kind)
+        return ("Literal", self.value, self.kind)
+
+    def to_sql(self):
+        return self.value.upper() if self.kind in ("null", "boolean") else self.value
+
+    @property
+    def python_value(self):
+        if self.kind == "number":
+            text = self.value
+            return float(text) if any(c in text for c in ".eE") else int(text)
+        if self.kind == "string":
+            quote = self.value[0]
+            body = self.value[1:-1]
+            return body.replace(quote * 2, quote).replace("\\" + quote, quote)
+        if self.kind == "boolean":
+            return self.value.upper() == "TRUE"
+        return None
+
+
+class BinaryOp(Node):
+    __slots__ = _fields = ("op", "left", "right")
+
+    def precedence(self):
+        return PRECEDENCE[self.op]
+
+    def to_sql(self):
+        prec = self.precedence()
+        # Left-associative: the right operand needs parentheses on a tie
+        return f"{_wrap(self.left, prec)} {self.op} {_wrap(self.right, prec + 1)}"
+
+
+class UnaryOp(Node):
+    __slots__ = _fields = ("op", "operand")
+
+    def precedence(self):
+        return PRECEDENCE["NOT"] if self.op == "NOT" else UNARY_PRECEDENCE
+
+    def to_sql(self):
+        if self.op == "NOT":
+            return f"NOT {_wrap(self.operand, PRECEDENCE['NOT'])}"
+        return f"{self.op}{_wrap(self.operand, UNARY_PRECEDENCE)}"
+
+
+class InList(Node):
+    __slots__ = _fields = ("expr", "items", "negated")
+
+    def precedence(self):
+        return PREDICATE_PRECEDENCE
+
+    def to_sql(self):
+        op = "NOT IN" if self.negated else "IN"
+        return f"{_wrap(self.expr, PREDICATE_PRECEDENCE + 1)} {op} ({_join(self.items)})"
+
+
+class InSubquery(Node):
+    __slots__ = _fields = ("expr", "query", "negated")
+
+    def precedence(self):
+        return PREDICATE_PRECEDENCE
+
+    def to_sql(self):
+        op = "NOT IN" if self.negated else "IN"
+        return f"{_wrap(self.expr, PREDICATE_PRECEDENCE + 1)} {op} ({self.query.to_sql()})"
+
+
+class Between(Node):
+    __slots__ = _fields = ("expr", "low", "high", "negated")
+
+    def precedence(self):
+        return PREDICATE_PRECEDENCE
+
+    def to_sql(self):
+        op = "NOT BETWEEN" if self.negated else "BETWEEN"
+        bound = PREDICATE_PRECEDENCE + 1
+        return f"{_wrap(self.expr, bound)} {op} {_wrap(self.low, bound)} AND {_wrap(self.high, bound)}"
+
+
+class Like(Node):
+    __slots__ = _fields = ("expr", "pattern", "negated")
+
+    def precedence(self):
+        return PREDICATE_PRECEDENCE
+
+    def to_sql(self):
+        op = "NOT LIKE" if self.negated else "LIKE"
+        bound = PREDICATE_PRECEDENCE + 1
+        return f"{_wrap(self.expr, bound)} {op} {_wrap(self.pattern, bound)}"
+
+
+class IsNull(Node):
+    __slots__ = _fields = ("expr", "negated")
+
+    def precedence(self):
+        return PREDICATE_PRECEDENCE
+
+    def to_sql(self):
+        op = "IS NOT NULL" if self.negated else "IS NULL"
+        return f"{_wrap(self.expr, PREDICATE_PRECEDENCE + 1)} {op}"
+
+
+class Exists(Node):
+    __slots__ = _fields = ("query",)
+
+    def to_sql(self):
+        return f"EXISTS ({self.query.to_sql()})"
+
+
+class Subquery(Node):
+    """Scalar subquery used as an expression."""
+    __slots__ = _fields = ("query",)
+
+    def to_sql(self):
+        return f"({self.query.to_sql()})"
+
+
+class FuncCall(Node):
+    __slots__ = _fields = ("name", "args", "distinct")
+
+    def key(self):
+        return ("FuncCall", self.name.lower(), _key_of(self.args), self.distinct)
+
+    def to_sql(self):
+        prefix = "DISTINCT " if self.distinct else ""
+        return f"{self.name}({prefix}{_join(self.args)})"
+
+
+class Cast(Node):
+    """
+    CAST(expr AS type), CONVERT(expr, type) or, with `using`, CONVERT(expr
+    USING charset); `type` is the SQL text of the type, e.g. DECIMAL(10, 2).
+    """
+    __slots__ = _fields = ("function", "expr", "type", "using")
+
+    def key(self):
+        return ("Cast", self.function.upper(), self.expr.key(), " ".join(self.type.upper().split()), self.using)
+
+    def to_sql(self):
+        if self.function.upper() == "CAST":
+            return f"{self.function}({self.expr.to_sql()} AS {self.type})"
+        separator = " USING " if self.using else ", "
+        return f"{self.function}({self.expr.to_sql()}{separator}{self.type})"
+
+
+class When(Node):
+    __slots__ = _fields = ("condition", "result")
+
+    def to_sql(self):
+        return f"WHEN {self.condition.to_sql()} THEN {self.result.to_sql()}"
+
+
+class Case(Node):
+    __slots__ = _fields = ("operand", "whens", "else_")
+
+    def to_sql(self):
+        parts = ["CASE"]
+        if self.operand is not None:
+            parts.append(self.operand.to_sql())
+        parts.extend(when.to_sql() for when in self.whens)
+        if self.else_ is not None:
+            parts.append(f"ELSE {self.else_.to_sql()}")
+        parts.append("END")
+        return " ".join(parts)
+
+
+# ------------------------------------------------------------- table sources
+
+class TableRef(Node):
+    __slots__ = _fields = ("parts", "alias")
+
+    @property
+    def name(self):
+        return self.parts[-1].strip('`"')
+
+    @property
+    def ref_name(self):
+        """Name other clauses use to refer to this table: its alias, else its name."""
+        return (self.alias or self.parts[-1]).strip('`"')
+
+    def key(self):
+        return ("TableRef", tuple(ident_key(part) for part in self.parts),
+                ident_key(self.alias) if self.alias else None)
+
+    def to_sql(self):
+        name = ".".join(self.parts)
+        return f"{name} {self.alias}" if self.alias else name
+
+
+class SubqueryRef(Node):
+    """Derived table: (SELECT ...) alias."""
+    __slots__ = _fields = ("query", "alias")
+
+    @property
+    def ref_name(self):
+        return self.alias.strip('`"') if self.alias else None
+
+    def to_sql(self):
+        sql = f"({self.query.to_sql()})"
+        return f"{sql} {self.alias}" if self.alias else sql
+
+
+class Join(Node):
+    """`kind` is one of INNER, LEFT, RIGHT, FULL or CROSS."""
+    __slots__ = _fields = ("kind", "left", "right", "condition", "using")
+
+    def to_sql(self):
+        keyword = "JOIN" if self.kind == "INNER" else f"{self.kind} JOIN"
+        sql = f"{self.left.to_sql()} {keyword} {self.right.to_sql()}"
+        if self.condition is not None:
+            sql += f" ON {self.condition.to_sql()}"
+        elif self.using:
+            sql += f" USING ({', '.join(self.using)})"
+        return sql
+
+
+# ---------------------------------------------------------------- clauses
+
+class SelectItem(Node):
+    __slots__ = _fields = ("expr", "alias")
+
+    def to_sql(self):
+        sql = self.expr.to_sql()
+        return f"{sql} AS {self.alias}" if self.alias else sql
+
+
+class OrderItem(Node):
+    __slots__ = _fields = ("expr", "descending")
+
+    def to_sql(self):
+        return f"{self.expr.to_sql()} DESC" if self.descending else self.expr.to_sql()
+
+
+class Assignment(Node):
+    __slots__ = _fields = ("column", "value")
+
+    def to_sql(self):
+        return f"{self.column.to_sql()} = {self.value.to_sql()}"
+
+
+# ---------------------------------------------------------------- statements
+
+class Select(Node):
+    __slots__ = _fields = ("distinct", "columns", "from_", "where", "group_by",
+                           "having", "order_by", "limit", "offset")
+
+    def to_sql(self):
+        parts = ["SELECT DISTINCT" if self.distinct else "SELECT", _join(self.columns)]
+        if self.from_:
+            parts.append(f"FROM {_join(self.from_)}")
+        if self.where is not None:
+            parts.append(f"WHERE {self.where.to_sql()}")
+        if self.group_by:
+            parts.append(f"GROUP BY {_join(self.group_by)}")
+        if self.having is not None:
+            parts.append(f"HAVING {self.having.to_sql()}")
+        if self.order_by:
+            parts.append(f"ORDER BY {_join(self.order_by)}")
+        if self.limit is not None:
+            parts.append(f"LIMIT {self.limit.to_sql()}")
+        if self.offset is not None:
+            parts.append(f"OFFSET {self.offset.to_sql()}")
+        return " ".join(parts)
+
+
+class SetOperation(Node):
+    """UNION [ALL] of two queries."""
+    __slots__ = _fields = ("op", "all", "left", "right")
+
+    def to_sql(self):
+        op = f"{self.op} ALL" if self.all else self.op
+        return f"{self.left.to_sql()} {op} {self.right.to_sql()}"
+
+
+class Insert(Node):
+    """INSERT INTO table [(columns)] VALUES (...), ... | SELECT ..."""
+    __slots__ = _fields = ("table", "columns", "rows", "query")
+
+    def to_sql(self):
+        sql = f"INSERT INTO {self.table.to_sql()}"
+        if self.columns:
+            sql += f" ({_join(self.columns)})"
+        if self.query is not None:
+            return f"{sql} {self.query.to_sql()}"
+        rows = ", ".join(f"({_join(row.items)})" for row in self.rows)
+        return f"{sql} VALUES {rows}"
+
+
+class ValuesRow(Node):
+    __slots__ = _fields = ("items",)
+
+    def to_sql(self):
+        return f"({_join(self.items)})"
+
+
+class Update(Node):
+    __slots__ = _fields = ("table", "assignments", "where")
+
+    def to_sql(self):
+        sql = f"UPDATE {self.table.to_sql()} SET {_join(self.assignments)}"
+        if self.where is not None:
+            sql += f" WHERE {self.where.to_sql()}"
+        return sql
+
+
+class Delete(Node):
+    __slots__ = _fields = ("table", "where")
+
+    def to_sql(self):
+        sql = f"DELETE FROM {self.table.to_sql()}"
+        if self.where is not None:
+            sql += f" WHERE {self.where.to_sql()}"
+        return sql
+
+
+class Ddl(Node):
+    """
+    CREATE / ALTER / DROP statement. Only the action, object type and names
+    are modelled; the remainder of the statement is kept as raw text.
+    """
+    __slots__ = _fields = ("action", "object_type", "names", "if_exists", "body")
+
+    def to_sql(self):
+        parts = [self.action, self.object_type]
+        if self.if_exists:
+            parts.append("IF NOT EXISTS" if self.action == "CREATE" else "IF EXISTS")
+        parts.append(_join(self.names))
+        if self.body:
+            parts.append(self.body)
+        return " ".join(parts)
+
+
+# ---------------------------------------------------------------- traversal
+
+def walk(node):
+    """Yield `node` and all of its descendants, parents before children."""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(reversed(list(current.children())))
+
+
+def walk_block(node):
+    """Like walk, but without descending into the subqueries below `node`."""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(reversed([child for child in current.children()
+                               if not isinstance(child, (Select, SetOperation))]))
+
+
+def transform(node, fn):
+    """
+    Rebuild the tree bottom-up, calling `fn` on every node after its
+    children have been transformed. `fn` returns the node to keep (the same
+    object when nothing changes). Untouched subtrees are shared with the
+    input, so `result is node` means nothing changed.
+    """
+    changes = {}
+    for name in node._fields:
+        value = getattr(node, name)
+        if isinstance(value, Node):
+            new_value = transform(value, fn)
+            if new_value is not value:
+                changes[name] = new_value
+        elif isinstance(value, list) and value and any(isinstance(item, Node) for item in value):
+            new_items = [transform(item, fn) if isinstance(item, Node) else item for item in value]
+            if any(new is not old for new, old in zip(new_items, value)):
+                changes[name] = new_items
+    if changes:
+        node = node.replace(**changes)
+    return fn(node)
+
+
+def conjuncts(expr):
+    """Split an expression on top-level ANDs."""
+    if expr is None:
+        return []
+    if isinstance(expr, BinaryOp) and expr.op == "AND":
+        return conjuncts(expr.left) + conjuncts(expr.right)
+    return [expr]
+
+
+def disjuncts(expr):
+    """Split an expression on top-level ORs."""
+    if isinstance(expr, BinaryOp) and expr.op == "OR":
+        return disjuncts(expr.left) + disjuncts(expr.right)
+    return [expr]
+
+
+def and_all(exprs):
+    """Combine expressions with AND; None when the list is empty."""
+    result = None
+    for expr in exprs:
+        result = expr if result is None else BinaryOp("AND", result, expr)
+    return result
+
+
+def table_sources(from_items):
+    """Yield the TableRef / SubqueryRef leaves of a FROM clause, left to right."""
+    for item in from_items:
+        if isinstance(item, Join):
+            yield from table_sources([item.left, item.right])
+        else:
+            yield item
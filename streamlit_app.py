@@ -1,11 +1,12 @@
 import streamlit as st
+import json
 import re
 
-from semantic import check_table_exists, validate_semantics
-from lexer import lexer
-from optimiser import SQLQueryOptimizer
+from semantic import check_table_exists
 from executor import execute_query
-from parser import SQLSyntaxParser
+from compiler import CompiledQuery
+from incremental import IncrementalParser
+from profiler import profile
 
 def extract_table_name(query):
     match = re.search(r'from\s+([a-zA-Z_][a-zA-Z0-9_]*)', query, re.IGNORECASE)
@@ -13,6 +14,57 @@ def extract_table_name(query):
         return match.group(1)
     return None
 
+# Each keystroke is compiled incrementally against the previous version of
+# the text: only the edited tokens are re-lexed and only the enclosing clause
+# is re-parsed (see incremental.IncrementalParser). Each phase only computes
+# the phases it depends on (see compiler.CompiledQuery).
+def edited_query(query):
+    if "editor" not in st.session_state:
+        st.session_state["editor"] = IncrementalParser()
+    return st.session_state["editor"].update(query)
+
+def lexical_phase(query):
+    return edited_query(query).token_list
+
+def syntax_phase(query):
+    return edited_query(query).syntax_result
+
+def optimization_phase(query):
+    return edited_query(query).optimization_steps
+
+# The editor recompiles the catalog-dependent phases when the schema changes
+def semantic_phase(query):
+    return edited_query(query).semantic_result
+
+# Answered from the in-memory schema catalog, which tracks DDL and its TTL
+def table_exists(table_name):
+    return check_table_exists(table_name)
+
+# Profiles a cold compile of the query, so the breakdown covers every phase
+# even when the editor already has them cached
+def profile_phases(query, memory=False):
+    with profile(memory=memory) as trace:
+        compiled = CompiledQuery(query)
+        compiled.token_list
+        compiled.syntax_result
+        compiled.optimization_steps
+        compiled.semantic_result
+    return trace
+
+def timing_panel(query):
+    st.subheader("⏱️ Timing Breakdown")
+    memory = st.checkbox("Record peak allocations (slower)")
+    trace = profile_phases(query, memory)
+    rows = [{"category": row["category"], "name": row["name"], "calls": row["calls"],
+             "total ms": round(row["total_ms"], 3), "self ms": round(row["self_ms"], 3),
+             "DB round trips": row["db_round_trips"],
+             "peak KiB": None if row["alloc_peak_bytes"] is None else round(row["alloc_peak_bytes"] / 1024, 1)}
+            for row in trace.summary()]
+    st.dataframe(rows)
+    st.caption(f"Total {trace.duration_ms:.3f} ms")
+    st.download_button("Download trace (Chrome trace format)", json.dumps(trace.to_chrome_trace()),
+                       file_name="trace.json", mime="application/json")
+
 def main():
     st.set_page_config(page_title="SQL Query Compiler", layout="wide")
     st.title("🧠 SQL Query Compiler & Optimizer")
@@ -30,59 +82,59 @@ def main():
     ]
 
     selected_phase = st.sidebar.selectbox("Select Compiler Phase to View", phases)
+    show_timings = st.sidebar.checkbox("⏱️ Show timing breakdown")
 
     if not query:
         st.info("🔎 Please enter a SQL query above to begin analysis.")
         return
 
+    optimized_query = None
     try:
-        tokens = list(lexer(query))
-        parser = SQLSyntaxParser(tokens)
-        syntax_result = parser.parse()
-        optimizer = SQLQueryOptimizer(query)
-        optimizer.optimize()
-        optimization_steps = optimizer.get_steps()
-        optimized_query = optimization_steps[-1][1]
-        semantic_result = validate_semantics(optimized_query)
-        table_name = extract_table_name(optimized_query)
-        execution_result = None
-        if optimized_query.strip().lower().startswith("select") and table_name and check_table_exists(table_name):
-            execution_result = execute_query(optimized_query)
-
         if selected_phase == "Original Query":
             st.subheader("🔹 Original Query")
             st.code(query, language='sql')
 
         elif selected_phase == "Lexical Analysis":
             st.subheader("🧩 Lexical Analysis (Tokens)")
-            st.json(tokens)
+            st.json(lexical_phase(query))
 
         elif selected_phase == "Syntax Analysis":
             st.subheader("📐 Syntax Analysis")
-            st.write(syntax_result)
+            st.write(syntax_phase(query))
 
         elif selected_phase == "Optimization":
             st.subheader("🚀 Optimized Query: Step-by-Step")
+            optimization_steps = optimization_phase(query)
+            optimized_query = optimization_steps[-1][1]
             for i, (desc, step_query) in enumerate(optimization_steps):
                 with st.expander(f"Step {i + 1}: {desc}", expanded=(i == 0)):
                     st.code(step_query, language='sql')
 
         elif selected_phase == "Semantic Analysis":
             st.subheader("🧠 Semantic Analysis")
-            st.write(semantic_result)
+            optimized_query = optimization_phase(query)[-1][1]
+            st.write(semantic_phase(query))
 
         elif selected_phase == "Execution (SELECT only)":
             st.subheader("📊 Execution (Only SELECT queries)")
+            optimized_query = optimization_phase(query)[-1][1]
             if not optimized_query.strip().lower().startswith("select"):
                 st.warning("⚠️ Only SELECT queries are executed. Other types are analyzed but not run.")
             else:
+                table_name = extract_table_name(optimized_query)
                 if not table_name:
                     st.error("⚠️ Could not extract table name from the query.")
-                elif not check_table_exists(table_name):
+                elif not table_exists(table_name):
                     st.error(f"❌ Table '{table_name}' does not exist.")
                 else:
                     st.success(f"✅ Table '{table_name}' exists.")
-                    if isinstance(execution_result, str):
+                    # Only hit the database on request; keep the last result across reruns
+                    if st.button("▶️ Run query"):
+                        st.session_state["execution"] = (optimized_query, execute_query(optimized_query))
+                    executed_query, execution_result = st.session_state.get("execution", (None, None))
+                    if executed_query != optimized_query:
+                        st.info("Press 'Run query' to execute the optimized query.")
+                    elif isinstance(execution_result, str):
                         st.error(execution_result)
                     else:
                         st.dataframe(execution_result)
@@ -90,7 +142,12 @@ def main():
         st.markdown("---")
         st.subheader("📄 Summary")
         st.code("Original Query:\n" + query, language='sql')
-        st.code("Final Optimized Query:\n" + optimized_query, language='sql')
+        if optimized_query is not None:
+            st.code("Final Optimized Query:\n" + optimized_query, language='sql')
+
+        if show_timings:
+            st.markdown("---")
+            timing_panel(query)
 
     except Exception as e:
         st.error(f"❗ Error during processing: {e}")
@@ -0,0 +1,16 @@
+from backends import SQLiteBackend
+
+
+def test_sqlite_foreign_keys_are_not_trusted_without_enforcement():
+    backend = SQLiteBackend()
+    try:
+        backend.executescript(
+            "CREATE TABLE dept (id INTEGER PRIMARY KEY);"
+            "CREATE TABLE emp (id INTEGER PRIMARY KEY, dept_id INT NOT NULL REFERENCES dept(id));"
+            "INSERT INTO emp VALUES (1, 9);"
+        )
+        catalog = backend.create_catalog()
+        assert catalog.get_unique_keys("dept") == [("id",)]
+        assert catalog.get_foreign_keys("emp") == []
+    finally:
+        backend.close()
@@ -0,0 +1,27 @@
+from decimal import Decimal
+
+import pytest
+
+from compiler import parameterize
+from lexer import tokenize
+
+
+def template(query):
+    return parameterize(tokenize(query))[:2]
+
+
+def test_literals_become_parameters():
+    assert template("SELECT name FROM users WHERE age > 30 AND city = 'Oslo'") == \
+        ("SELECT name FROM users WHERE age > %s AND city = %s", [30, "Oslo"])
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("SELECT CAST(age AS DECIMAL(10,2)) FROM users", ("SELECT CAST(age AS DECIMAL(10,2)) FROM users", [])),
+    ("SELECT id FROM users WHERE CAST(age AS DECIMAL(10, 2)) > 2.5",
+     ("SELECT id FROM users WHERE CAST(age AS DECIMAL(10, 2)) > %s", [Decimal("2.5")])),
+    ("SELECT id FROM users WHERE CONVERT(name, CHAR(3)) = 'abc' AND f(CONVERT(age, SIGNED), 4) = 2",
+     ("SELECT id FROM users WHERE CONVERT(name, CHAR(3)) = %s AND f(CONVERT(age, SIGNED), %s) = %s",
+      ["abc", 4, 2])),
+])
+def test_type_arguments_stay_inline(query, expected):
+    assert template(query) == expected
@@ -0,0 +1,94 @@
+import pytest
+
+import backends
+import catalog
+from backends import SQLiteBackend, set_backend
+from executor import execute_query
+from optimiser import SQLQueryOptimizer
+from semantic import validate_semantics
+
+
+@pytest.fixture(autouse=True)
+def sqlite_backend():
+    previous = backends._backend, catalog.catalog
+    backend = set_backend(SQLiteBackend())
+    execute_query("CREATE TABLE t (x INT, name VARCHAR(20) DEFAULT 'a')")
+    yield backend
+    backends._backend, catalog.catalog = previous
+    backend.close()
+
+
+def test_ddl_invalidates_the_catalog_once_it_has_run():
+    schema = catalog.get_catalog()
+    assert schema.get_columns("t") == ["x", "name"]
+    version = schema.version
+    assert validate_semantics("ALTER TABLE t ADD COLUMN y INT") == "Semantic Check Passed: ALTER"
+    assert execute_query("ALTER TABLE missing ADD COLUMN y INT").startswith("Error executing ALTER")
+    assert schema.version == version
+    assert execute_query("ALTER TABLE t ADD COLUMN y INT") == "ALTER successful, 0 rows affected."
+    assert schema.version > version
+    assert schema.get_columns("t") == ["x", "name", "y"]
+
+
+def test_join_reorder_keeps_the_columns_of_select_star(sqlite_backend):
+    sqlite_backend.executescript(
+        "CREATE TABLE small (id INT, name TEXT);"
+        "CREATE TABLE big (id INT, small_id INT, v INT);"
+        "CREATE INDEX big_small ON big (small_id);"
+        + "".join(f"INSERT INTO small VALUES ({i}, 's{i}');" for i in range(3))
+        + "".join(f"INSERT INTO big VALUES ({i}, {i % 3}, {i * 10});" for i in range(300))
+    )
+    query = "SELECT * FROM big JOIN small ON big.small_id = small.id"
+    optimizer = SQLQueryOptimizer(query).optimize()
+    assert optimizer.query.startswith("SELECT big.*, small.* FROM small JOIN big")
+    before, after = execute_query(query), execute_query(optimizer.query)
+    assert list(before.columns) == list(after.columns) == ["id", "small_id", "v", "id", "name"]
+    assert sorted(map(tuple, before.values.tolist())) == sorted(map(tuple, after.values.tolist()))
+
+
+def offline():
+    raise AssertionError("the database was contacted")
+
+
+def counting(backend):
+    """Connection factory for `backend` that counts the connections it opens."""
+    def connect():
+        connect.calls += 1
+        return backend.connect()
+    connect.calls = 0
+    return connect
+
+
+def test_contradiction_returns_empty_frame_with_columns():
+    result = execute_query("SELECT x, name AS n, t.* FROM t WHERE x > 5 AND x < 3", connection_factory=offline)
+    assert list(result.columns) == ["x", "n", "x", "name"]
+    assert result.empty
+
+
+def test_contradictory_union_returns_empty_frame():
+    result = execute_query("SELECT x FROM t WHERE x > 5 AND x < 3 UNION SELECT name FROM t WHERE 1 = 0",
+                           connection_factory=offline)
+    assert list(result.columns) == ["x"]
+    assert result.empty
+
+
+@pytest.mark.parametrize("query, expected", [
+    # An aggregate without GROUP BY returns one row even over no rows
+    ("SELECT COUNT(*) AS c FROM t WHERE x > 5 AND x < 3", [[0]]),
+    # Only one branch of the UNION is contradictory
+    ("SELECT name FROM t WHERE x > 5 AND x < 3 UNION SELECT name FROM t WHERE x = 1", [["one"]]),
+    # The columns of * over a derived table are not in the catalog
+    ("SELECT * FROM (SELECT name FROM t) s WHERE 1 = 0", []),
+    # Comparisons with NULL that can still hold
+    ("SELECT name FROM t WHERE x IS NULL", [["none"]]),
+    ("SELECT name FROM t WHERE NOT (x IS NOT NULL)", [["none"]]),
+    ("SELECT name FROM t WHERE x IS NULL OR (x > 1 AND x < 0)", [["none"]]),
+    ("SELECT name FROM t WHERE x NOT IN (2, NULL) OR x IN (NULL, 1)", [["one"]]),
+])
+def test_queries_that_can_return_rows_run(sqlite_backend, query, expected):
+    execute_query("INSERT INTO t (x, name) VALUES (1, 'one')")
+    execute_query("INSERT INTO t (x, name) VALUES (NULL, 'none')")
+    connect = counting(sqlite_backend)
+    result = execute_query(query, connection_factory=connect)
+    assert connect.calls == 1
+    assert result.values.tolist() == expected
@@ -0,0 +1,57 @@
+import pytest
+
+import catalog
+from cli import OfflineCatalog
+from optimiser import SQLQueryOptimizer, eliminate_unused_joins
+from parser import parse_sql
+
+
+class KeyedCatalog(OfflineCatalog):
+    """dept(dept_id) is the primary key of dept; emp(dept_id) NOT NULL references it."""
+
+    def _fetch_keys(self):
+        return [("dept", "PRIMARY", "dept_id", 0, ""), ("emp", "PRIMARY", "id", 0, ""),
+                ("emp", "fk_dept", "dept_id", 1, "")]
+
+    def _fetch_foreign_keys(self):
+        return [("emp", "fk_dept", "dept_id", "dept", "dept_id")]
+
+
+@pytest.fixture(autouse=True)
+def keyed_catalog():
+    previous = catalog.catalog
+    yield catalog.set_catalog(KeyedCatalog({"dept": ["dept_id", "name"], "emp": ["id", "name", "dept_id"]}))
+    catalog.set_catalog(previous)
+
+
+def eliminate(query):
+    block, hits = eliminate_unused_joins(parse_sql(query))[:2]
+    return block.to_sql(), hits
+
+
+def test_foreign_key_join_is_eliminated():
+    assert eliminate("SELECT e.name FROM emp e JOIN dept d ON e.dept_id = d.dept_id") == \
+        ("SELECT e.name FROM emp e", 1)
+
+
+def test_unique_key_left_join_is_eliminated():
+    assert eliminate("SELECT e.name FROM emp e LEFT JOIN dept d ON d.dept_id = e.dept_id") == \
+        ("SELECT e.name FROM emp e", 1)
+
+
+@pytest.mark.parametrize("query", [
+    # The NULL-extended emp rows match no dept d2, so the inner join filters them out
+    "SELECT d.name FROM dept d LEFT JOIN emp e ON e.id = d.dept_id + 100 JOIN dept d2 ON e.dept_id = d2.dept_id",
+    "SELECT d.name FROM emp e RIGHT JOIN dept d ON e.id = d.dept_id JOIN dept d2 ON e.dept_id = d2.dept_id",
+])
+def test_foreign_key_of_null_extended_table_keeps_join(query):
+    assert eliminate(query) == (parse_sql(query).to_sql(), 0)
+
+
+def test_optimization_steps_are_deterministic():
+    query = "SELECT e.name FROM emp e JOIN dept d ON e.dept_id = d.dept_id WHERE 1=1 AND e.id > 2 AND e.id > 5"
+    runs = [SQLQueryOptimizer(query).optimize().steps for _ in range(2)]
+    assert runs[0] == runs[1]
+    assert runs[0][-1] == ("Eliminated unused joins (1 rewrite): "
+                           "JOIN dept d: foreign key emp(dept_id) -> dept(dept_id)",
+                           "SELECT e.name FROM emp e WHERE e.id > 5")
@@ -0,0 +1,115 @@
+import pytest
+
+from parser import ParseError, parse_sql
+from sql_ast import Cast, Join, SetOperation, Subquery, walk
+
+
+def round_trip(query):
+    """Parse, print and parse again; the two trees must match."""
+    ast = parse_sql(query)
+    sql = ast.to_sql()
+    again = parse_sql(sql)
+    assert again.key() == ast.key()
+    assert again.to_sql() == sql
+    return ast
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT a.x, b.y FROM a JOIN b ON a.id = b.a_id LEFT JOIN c ON c.id = b.c_id",
+    "SELECT * FROM a RIGHT OUTER JOIN b USING (id) CROSS JOIN c",
+    "SELECT a.x FROM a INNER JOIN b ON a.id = b.a_id AND b.flag = 1 LEFT OUTER JOIN c ON c.id = a.c_id",
+])
+def test_joins_round_trip(query):
+    assert any(isinstance(node, Join) for node in walk(round_trip(query)))
+
+
+def test_comma_join_round_trips():
+    assert len(round_trip("SELECT a.x FROM a, b WHERE a.id = b.a_id").from_) == 2
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT x FROM (SELECT x FROM t WHERE y > 1) s",
+    "SELECT x FROM t WHERE x IN (SELECT z FROM u) AND NOT EXISTS (SELECT 1 FROM v WHERE v.k = t.x)",
+    "SELECT x, (SELECT MAX(v) FROM u WHERE u.k = t.x) AS m FROM t",
+])
+def test_subqueries_round_trip(query):
+    round_trip(query)
+
+
+def test_scalar_subquery_is_a_subquery_node():
+    ast = round_trip("SELECT x, (SELECT MAX(v) FROM u) AS m FROM t")
+    assert isinstance(ast.columns[1].expr, Subquery)
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT a FROM t UNION SELECT b FROM u",
+    "SELECT a FROM t UNION ALL SELECT b FROM u UNION SELECT c FROM w ORDER BY 1",
+    "SELECT a FROM t WHERE a IN (SELECT b FROM u UNION SELECT c FROM w)",
+])
+def test_set_operations_round_trip(query):
+    assert any(isinstance(node, SetOperation) for node in walk(round_trip(query)))
+
+
+@pytest.mark.parametrize("query, printed", [
+    ("SELECT CAST(age AS DECIMAL(10,2)) FROM users", "CAST(age AS DECIMAL(10, 2))"),
+    ("SELECT CAST(a + 1 AS SIGNED) FROM t", "CAST(a + 1 AS SIGNED)"),
+    ("SELECT CAST(b AS CHAR(5) CHARACTER SET utf8mb4) FROM t", "CAST(b AS CHAR(5) CHARACTER SET utf8mb4)"),
+    ("SELECT CONVERT(name, CHAR(3)) FROM t", "CONVERT(name, CHAR(3))"),
+    ("SELECT CONVERT(name USING utf8mb4) FROM t", "CONVERT(name USING utf8mb4)"),
+])
+def test_cast_and_convert_round_trip(query, printed):
+    ast = round_trip(query)
+    cast = ast.columns[0].expr
+    assert isinstance(cast, Cast)
+    assert cast.to_sql() == printed
+
+
+def test_cast_in_where_round_trips():
+    round_trip("SELECT a FROM t WHERE CAST(a AS DECIMAL(10, 2)) > 2.5 AND CONVERT(b, UNSIGNED) = 3")
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT `select`, `weird col` FROM `my table` AS `t` WHERE `t`.`select` = 'it''s'",
+    'SELECT "x" FROM t WHERE "x" <> \'a\'',
+    "SELECT t.`Mixed Case` FROM `db`.`t` t",
+])
+def test_quoted_identifiers_round_trip(query):
+    round_trip(query)
+
+
+@pytest.mark.parametrize("query", [
+    "UPDATE t SET a = 1, b = b + 1 WHERE c = 2",
+    "DELETE FROM t WHERE a IN (1, 2)",
+    "INSERT INTO t (a, b) VALUES (1, 'x'), (2, 'y')",
+])
+def test_dml_round_trips(query):
+    round_trip(query)
+
+
+@pytest.mark.parametrize("query", [
+    "",
+    "SELECT",
+    "SELECT FROM t",
+    "SELECT a FROM t WHERE",
+    "SELECT (a FROM t",
+    "SELECT a FROM t)",
+    "SELECT a,, b FROM t",
+    "SELECT a FROM t JOIN u ON",
+    "SELECT a FROM t WHERE a IN (",
+    "SELECT CAST(a AS) FROM t",
+    "SELECT CAST(a DECIMAL) FROM t",
+    "SELECT CONVERT(a) FROM t",
+    "SELECT a FROM t WHERE b = 'unterminated",
+    "SELEC a FROM t",
+    "UPDATE t WHERE a = 1",
+    "INSERT INTO t (a) 1",
+])
+def test_malformed_input_raises_value_error(query):
+    with pytest.raises(ValueError):
+        parse_sql(query)
+
+
+def test_parse_error_reports_position():
+    with pytest.raises(ParseError) as error:
+        parse_sql("SELECT a FROM t WHERE a = = 1")
+    assert error.value.position is not None
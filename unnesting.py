@@ -0,0 +1,514 @@
+"""
+Subquery unnesting passes for the optimizer (see optimiser.DEFAULT_PASSES).
+
+    merge_derived_tables
+        FROM (SELECT b.x AS y FROM b WHERE c) s ... s.y   ->  FROM b s ... s.x WHERE s.c
+    unnest_semi_joins
+        WHERE a.x IN (SELECT y FROM t)                    ->  JOIN (SELECT DISTINCT y AS _k1 FROM t) _sq1
+                                                              ON a.x = _sq1._k1
+        WHERE [NOT] EXISTS (SELECT 1 FROM t WHERE t.k = a.k)
+                                                          ->  [LEFT] JOIN (SELECT DISTINCT t.k AS _k1 FROM t) _sq1
+                                                              ON _sq1._k1 = a.k [WHERE _sq1._k1 IS NULL]
+    decorrelate_scalar_subqueries
+        (SELECT COUNT(*) FROM t WHERE t.k = a.k)          ->  COALESCE(_sq1._v, 0)
+                                                              ... LEFT JOIN (SELECT t.k AS _k1, COUNT(*) AS _v
+                                                              FROM t GROUP BY t.k) _sq1 ON _sq1._k1 = a.k
+
+MySQL has no semi-join syntax, so semi- and anti-joins are written as
+joins against DISTINCT derived tables, which match each outer row at most
+once. An anti-join is a LEFT JOIN that keeps the rows whose join key came
+back NULL, which only happens when nothing matched.
+
+A subquery is only unnested when it refers to the enclosing query through
+`inner = outer` equalities in its WHERE clause and nowhere else, and when
+every unqualified column in it resolves to one of its own tables in the
+schema catalog. NOT IN is left alone: one NULL in the subquery makes it
+unknown for every row, which no join reproduces.
+"""
+
+from semantic import get_table_columns
+from sql_ast import (
+    AGGREGATES, NILADIC_FUNCTIONS, BinaryOp, Case, Column, Exists, FuncCall, InSubquery, IsNull, Join,
+    Literal, Select, SelectItem, SetOperation, Star, Subquery, SubqueryRef, TableRef, UnaryOp, When,
+    and_all, conjuncts, ident_key, table_sources, transform, walk, walk_block,
+)
+
+# Expressions a merged derived table may project: they are evaluated once
+# per reference after merging, so they must not call functions
+_PROJECTABLE = (Column, Literal, BinaryOp, UnaryOp, Case, When)
+
+# What each decorrelatable aggregate returns over no rows. An outer row the
+# grouped LEFT JOIN does not match gets NULL, so the others are wrapped in
+# COALESCE with their empty-input value
+_EMPTY_AGGREGATES = {
+    "SUM": None, "AVG": None, "MIN": None, "MAX": None, "GROUP_CONCAT": None, "STD": None,
+    "STDDEV": None, "VARIANCE": None, "JSON_ARRAYAGG": None, "JSON_OBJECTAGG": None,
+    "COUNT": "0", "BIT_OR": "0", "BIT_XOR": "0", "BIT_AND": "18446744073709551615",
+}
+
+
+def _ref_names(nodes):
+    return {ident_key(node.ref_name) for node in nodes
+            if isinstance(node, (TableRef, SubqueryRef)) and node.ref_name}
+
+
+def _fresh_names(block, prefix="_sq"):
+    """Generator of aliases not used anywhere in `block`."""
+    used = _ref_names(walk(block))
+    number = 0
+    while True:
+        number += 1
+        if f"{prefix}{number}" not in used:
+            yield f"{prefix}{number}"
+
+
+def _has_aggregate(exprs):
+    return any(isinstance(node, FuncCall) and node.name.upper() in AGGREGATES
+               for expr in exprs for node in walk_block(expr))
+
+
+def _has_subquery(node):
+    return any(isinstance(child, (Select, SetOperation)) for child in walk(node) if child is not node)
+
+
+def _table_columns(table):
+    try:
+        columns = get_table_columns(table.name)
+    except Exception:
+        return None
+    return {column.lower() for column in columns} if columns else None
+
+
+# ------------------------------------------------------------------ correlation
+
+class _Correlation:
+    """Which scope each column of a subquery belongs to."""
+
+    def __init__(self, query, outer_names):
+        self.tables = list(table_sources(query.from_))
+        self.inner_names = _ref_names(self.tables)
+        self.outer_names = outer_names
+        self._columns = None
+
+    def _unqualified_is_inner(self, name):
+        if self._columns is None:
+            self._columns = set()
+            for table in self.tables:
+                columns = _table_columns(table)
+                if columns is None:
+                    self._columns = False
+                    break
+                self._columns |= columns
+        return self._columns is not False and name.lower() in self._columns
+
+    def scopes(self, expr):
+        """Set of "inner" / "outer" / "unknown" for the columns in `expr`."""
+        found = set()
+        for node in walk(expr):
+            if isinstance(node, Column):
+                if node.table is not None:
+                    qualifier = ident_key(node.table)
+                    found.add("inner" if qualifier in self.inner_names
+                              else "outer" if qualifier in self.outer_names else "unknown")
+                elif self._unqualified_is_inner(node.name):
+                    found.add("inner")
+                elif len(node.parts) > 1 or node.name.upper() not in NILADIC_FUNCTIONS:
+                    found.add("unknown")
+            elif isinstance(node, Star):
+                found.add("inner")
+        return found
+
+
+def _correlated_shape(query, outer_names):
+    """
+    For a subquery that refers to the enclosing block only through
+    `inner = outer` equalities in its WHERE clause, return (local WHERE
+    conjuncts, [(inner expr, outer expr), ...]); otherwise None.
+    """
+    if not isinstance(query, Select) or not query.from_ or query.offset is not None or _has_subquery(query):
+        return None
+    correlation = _Correlation(query, outer_names)
+    if not all(isinstance(table, TableRef) for table in correlation.tables):
+        return None
+    local_parts = [item.expr for item in query.columns] + list(query.group_by) + \
+        [item.expr for item in query.order_by] + [join.condition for join in _joins(query.from_)
+                                                  if join.condition is not None]
+    if query.having is not None:
+        local_parts.append(query.having)
+    if any(correlation.scopes(part) - {"inner"} for part in local_parts):
+        return None
+    local = []
+    pairs = []
+    for part in conjuncts(query.where):
+        scopes = correlation.scopes(part)
+        if scopes <= {"inner"}:
+            local.append(part)
+            continue
+        if not isinstance(part, BinaryOp) or part.op != "=" or "unknown" in scopes:
+            return None
+        left, right = correlation.scopes(part.left), correlation.scopes(part.right)
+        if left == {"inner"} and right == {"outer"}:
+            pairs.append((part.left, part.right))
+        elif left == {"outer"} and right == {"inner"}:
+            pairs.append((part.right, part.left))
+        else:
+            return None
+    return local, pairs
+
+
+def _joins(from_items):
+    for item in from_items:
+        if isinstance(item, Join):
+            yield from _joins([item.left, item.right])
+            yield item
+
+
+def _joinable(block):
+    """True when a derived table can be joined onto the block's single FROM item."""
+    return isinstance(block, Select) and len(block.from_) == 1
+
+
+def with_qualified_stars(block):
+    """
+    The block's select list with `*` spelled out per table (`a.*, b.*`), so
+    joining another table does not add columns to the result; None when
+    that would change the result.
+    """
+    if not any(isinstance(item.expr, Star) and item.expr.table is None for item in block.columns):
+        return block.columns
+    sources = list(table_sources(block.from_))
+    if any(join.using for join in _joins(block.from_)) or not all(source.ref_name for source in sources):
+        return None
+    columns = []
+    for item in block.columns:
+        if isinstance(item.expr, Star) and item.expr.table is None:
+            columns.extend(SelectItem(Star(source.ref_name), None) for source in sources)
+        else:
+            columns.append(item)
+    return columns
+
+
+def _attach(block, kind, derived, alias, on):
+    return Join(kind, block.from_[0], SubqueryRef(derived, alias), and_all(on), None)
+
+
+def _keys(alias, pairs):
+    """Select items and ON conditions joining a derived table on correlation pairs."""
+    items = [SelectItem(inner, f"_k{number}") for number, (inner, _) in enumerate(pairs, 1)]
+    on = [BinaryOp("=", Column([alias, f"_k{number}"]), outer) for number, (_, outer) in enumerate(pairs, 1)]
+    return items, on
+
+
+# ------------------------------------------------------------------ semi / anti joins
+
+def _semi_join(part, outer_names, alias):
+    """(join kind, derived query, ON conditions, WHERE conjuncts to add) replacing `part`, or None."""
+    negated = isinstance(part, UnaryOp) and part.op == "NOT" and isinstance(part.operand, Exists)
+    if negated:
+        part = part.operand
+    if isinstance(part, InSubquery) and not part.negated:
+        query = part.query
+        shape = _correlated_shape(query, outer_names)
+        if (shape is None or len(query.columns) != 1 or isinstance(query.columns[0].expr, Star)
+                or query.limit is not None):
+            return None
+        local, pairs = shape
+        if pairs and (query.group_by or query.having is not None or _has_aggregate(query.columns)):
+            return None
+        items, on = _keys(alias, [(query.columns[0].expr, part.expr)] + pairs)
+        on[0] = BinaryOp("=", part.expr, Column([alias, "_k1"]))
+        derived = Select(True, items, query.from_, and_all(local), query.group_by, query.having, [], None, None)
+        return "INNER", derived, on, []
+    if isinstance(part, Exists):
+        query = part.query
+        shape = _correlated_shape(query, outer_names)
+        if (shape is None or not shape[1] or query.group_by or query.having is not None
+                or _has_aggregate(query.columns)):
+            return None
+        if query.limit is not None and not (isinstance(query.limit, Literal) and query.limit.kind == "number"
+                                            and query.limit.python_value >= 1):
+            return None
+        local, pairs = shape
+        items, on = _keys(alias, pairs)
+        derived = Select(True, items, query.from_, and_all(local), [], None, [], None, None)
+        if negated:
+            return "LEFT", derived, on, [IsNull(Column([alias, "_k1"]), False)]
+        return "INNER", derived, on, []
+    return None
+
+
+def unnest_semi_joins(block):
+    """WHERE x IN (SELECT ...) / [NOT] EXISTS (SELECT ...) -> [LEFT] JOIN (SELECT DISTINCT ...)"""
+    if not _joinable(block) or block.where is None:
+        return block, 0
+    columns = with_qualified_stars(block)
+    if columns is None:
+        return block, 0
+    outer_names = _ref_names(table_sources(block.from_))
+    names = _fresh_names(block)
+    alias = next(names)
+    kept = []
+    added = []
+    notes = []
+    for part in conjuncts(block.where):
+        rewrite = _semi_join(part, outer_names, alias)
+        if rewrite is None:
+            kept.append(part)
+            continue
+        kind, derived, on, filters = rewrite
+        block = block.replace(from_=[_attach(block, kind, derived, alias, on)])
+        added.extend(filters)
+        join = "anti-join" if filters else "semi-join"
+        notes.append(f"{part.to_sql()[:60]} -> {join} with {alias}")
+        alias = next(names)
+    if not notes:
+        return block, 0
+    return block.replace(columns=columns, where=and_all(kept + added)), len(notes), notes
+
+
+# ------------------------------------------------------------------ scalar subqueries
+
+def _scalar_subqueries(expr):
+    """Scalar subqueries in `expr`, not looking inside other subqueries."""
+    stack = [expr]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Subquery):
+            yield node
+        elif not isinstance(node, (Select, SetOperation, Exists, InSubquery)):
+            stack.extend(reversed(list(node.children())))
+
+
+def _decorrelated(subquery, outer_names, alias):
+    """(derived query, ON conditions, replacement expression) for a scalar subquery, or None."""
+    query = subquery.query
+    shape = _correlated_shape(query, outer_names)
+    if (shape is None or not shape[1] or len(query.columns) != 1 or query.distinct or query.group_by
+            or query.having is not None or query.order_by or query.limit is not None):
+        return None
+    aggregate = query.columns[0].expr
+    if not isinstance(aggregate, FuncCall) or aggregate.name.upper() not in _EMPTY_AGGREGATES:
+        return None
+    local, pairs = shape
+    items, on = _keys(alias, pairs)
+    derived = Select(False, items + [SelectItem(aggregate, "_v")], query.from_, and_all(local),
+                     [inner for inner, _ in pairs], None, [], None, None)
+    value = Column([alias, "_v"])
+    empty = _EMPTY_AGGREGATES[aggregate.name.upper()]
+    if empty is not None:
+        value = FuncCall("COALESCE", [value, Literal(empty, "number")], False)
+    return derived, on, value
+
+
+def decorrelate_scalar_subqueries(block):
+    """(SELECT agg(...) FROM t WHERE t.k = o.k) -> LEFT JOIN (SELECT t.k, agg(...) ... GROUP BY t.k)"""
+    if (not _joinable(block) or block.group_by or block.having is not None
+            or _has_aggregate([item.expr for item in block.columns])):
+        return block, 0
+    columns = with_qualified_stars(block)
+    if columns is None:
+        return block, 0
+    outer_names = _ref_names(table_sources(block.from_))
+    names = _fresh_names(block)
+    replacements = {}  # id(Subquery) -> replacement expression
+    notes = []
+    for expr in [item.expr for item in columns] + ([block.where] if block.where is not None else []):
+        for subquery in _scalar_subqueries(expr):
+            if id(subquery) in replacements:
+                continue
+            alias = next(names)
+            rewrite = _decorrelated(subquery, outer_names, alias)
+            if rewrite is None:
+                continue
+            derived, on, value = rewrite
+            block = block.replace(from_=[_attach(block, "LEFT", derived, alias, on)])
+            replacements[id(subquery)] = value
+            notes.append(f"{subquery.to_sql()[:60]} -> grouped join with {alias}")
+    if not notes:
+        return block, 0
+
+    def replace(node):
+        return replacements.get(id(node), node) if isinstance(node, Subquery) else node
+
+    new_columns = []
+    for item in columns:
+        expr = transform(item.expr, replace)
+        if expr is not item.expr and item.alias is None:
+            # Keep the result column name the subquery gave it
+            item = SelectItem(expr, "`" + item.expr.to_sql().replace("`", "``")[:64] + "`")
+        elif expr is not item.expr:
+            item = item.replace(expr=expr)
+        new_columns.append(item)
+    where = transform(block.where, replace) if block.where is not None else None
+    return block.replace(columns=new_columns, where=where), len(notes), notes
+
+
+# ------------------------------------------------------------------ derived tables
+
+def _derived_positions(from_items):
+    """(SubqueryRef, preserved, LEFT join it is the right side of) for each derived table."""
+    def visit(item, preserved, left_join):
+        if isinstance(item, Join):
+            yield from visit(item.left, preserved and item.kind in ("INNER", "CROSS", "LEFT"), None)
+            yield from visit(item.right, preserved and item.kind in ("INNER", "CROSS", "RIGHT"),
+                             item if item.kind == "LEFT" else None)
+        elif isinstance(item, SubqueryRef):
+            yield item, preserved, left_join
+    for item in from_items:
+        yield from visit(item, True, None)
+
+
+def _mergeable(query):
+    return (isinstance(query, Select) and len(query.from_) == 1 and isinstance(query.from_[0], TableRef)
+            and not (query.distinct or query.group_by or query.having is not None or query.order_by
+                     or query.limit is not None or query.offset is not None)
+            and not _has_subquery(query) and not _has_aggregate([item.expr for item in query.columns]))
+
+
+def _replace_source(item, target, replacement, on_extra):
+    if item is target:
+        return replacement
+    if not isinstance(item, Join):
+        return item
+    condition = item.condition
+    if item.right is target and on_extra:
+        condition = and_all(conjuncts(condition) + on_extra)
+    return Join(item.kind, _replace_source(item.left, target, replacement, on_extra),
+                _replace_source(item.right, target, replacement, on_extra), condition, item.using)
+
+
+def _merge(block, derived, preserved, left_join):
+    """`block` with derived table `derived` replaced by the table it reads, or None."""
+    query = derived.query
+    if not derived.alias or not _mergeable(query):
+        return None
+    alias = derived.alias.strip('`"')
+    key = ident_key(alias)
+    table = query.from_[0]
+    inner_names = {ident_key(table.name), ident_key(table.ref_name)}
+    if any(isinstance(node, Column) and node.table is not None and ident_key(node.table) not in inner_names
+           for node in walk(query)):
+        return None
+
+    def requalify(node):
+        if isinstance(node, Column) and len(node.parts) <= 2 and node.name.upper() not in NILADIC_FUNCTIONS:
+            return Column([alias, node.parts[-1]])
+        if isinstance(node, Star):
+            return Star(alias)
+        return node
+
+    outputs = {}  # lower output name -> expression over the table
+    labels = {}  # lower output name -> output name as written
+    passthrough = False
+    for item in query.columns:
+        if isinstance(item.expr, Star):
+            passthrough = True
+            continue
+        if not all(isinstance(node, _PROJECTABLE) for node in walk(item.expr)):
+            return None
+        name = item.alias.strip('`"') if item.alias else item.expr.name if isinstance(item.expr, Column) else None
+        if name is None or name.lower() in outputs:
+            return None
+        outputs[name.lower()] = transform(item.expr, requalify)
+        labels[name.lower()] = name
+    renamed = not passthrough or any(not (isinstance(expr, Column) and expr.name.lower() == name)
+                                     for name, expr in outputs.items())
+    if not preserved and (query.where is not None and left_join is None
+                          or not all(isinstance(expr, Column) for expr in outputs.values())):
+        # Rows the outer join null-extends would lose the filter or get non-NULL values
+        return None
+
+    nested = [node for node in walk(block) if isinstance(node, Select) and node is not block and node is not query]
+    if any(key in _ref_names(table_sources(node.from_)) for node in nested):
+        # A subquery redefines the alias, so its references are not to this table
+        return None
+    sole = len(block.from_) == 1 and block.from_[0] is derived
+    select_aliases = {item.alias.strip('`"').lower() for item in block.columns if item.alias}
+    inside = {id(node) for node in walk(derived)}
+    own = {id(node) for part in block.children() if id(part) not in inside for node in walk_block(part)}
+    for node in walk(block):
+        if id(node) in inside or not isinstance(node, Column) or node.table is not None:
+            continue
+        if node.name.upper() in NILADIC_FUNCTIONS and len(node.parts) == 1:
+            continue
+        if id(node) not in own:
+            # Could name an output of the derived table from inside a subquery
+            if renamed and node.name.lower() in outputs:
+                return None
+        elif not sole and renamed:
+            # The table's other columns become visible and could make it ambiguous
+            return None
+        elif sole and node.name.lower() not in outputs and not passthrough \
+                and node.name.lower() not in select_aliases:
+            return None
+
+    def output(node):
+        found = outputs.get(node.name.lower())
+        if found is not None:
+            return found
+        if node.table is None:
+            return node
+        if passthrough:
+            return Column([alias, node.parts[-1]])
+        raise LookupError(node.name)
+
+    def visit(node):
+        if isinstance(node, Column) and id(node) not in inside and (
+                node.table is not None and len(node.parts) == 2 and ident_key(node.table) == key
+                or node.table is None and sole and id(node) in own):
+            return output(node)
+        return node
+
+    columns = []
+    try:
+        for item in block.columns:
+            expr = item.expr
+            if isinstance(expr, Star) and renamed and (expr.table is None and sole
+                                                       or expr.table is not None and ident_key(expr.table) == key):
+                if passthrough:
+                    return None
+                for name, value in outputs.items():
+                    same = isinstance(value, Column) and value.name == labels[name]
+                    columns.append(SelectItem(value, None if same else f"`{labels[name]}`"))
+                continue
+            if isinstance(expr, Star) and renamed and expr.table is None:
+                return None
+            new_expr = transform(expr, visit)
+            if new_expr is not expr and item.alias is None and isinstance(expr, Column) and not (
+                    isinstance(new_expr, Column) and new_expr.name == expr.name):
+                item = SelectItem(new_expr, f"`{expr.name}`")
+            elif new_expr is not expr:
+                item = item.replace(expr=new_expr)
+            columns.append(item)
+        placeholder = TableRef(["__derived__"], derived.alias)
+        rest = block.replace(columns=[], from_=[_replace_source(item, derived, placeholder, None)
+                                                for item in block.from_])
+        rest = transform(rest, visit)
+    except LookupError:
+        return None
+
+    lifted = conjuncts(transform(query.where, requalify)) if query.where is not None else []
+    new_table = TableRef(table.parts, derived.alias)
+    from_ = [_replace_source(item, placeholder, new_table, [] if preserved else lifted) for item in rest.from_]
+    where = and_all(lifted + conjuncts(rest.where)) if preserved else rest.where
+    return rest.replace(columns=columns, from_=from_, where=where)
+
+
+def merge_derived_tables(block):
+    """FROM (SELECT b.x AS y FROM b WHERE c) s -> FROM b s WHERE s.c, with s.y read as s.x"""
+    if not isinstance(block, Select) or not block.from_:
+        return block, 0
+    notes = []
+    merged = True
+    while merged:
+        merged = False
+        for derived, preserved, left_join in _derived_positions(block.from_):
+            new_block = _merge(block, derived, preserved, left_join)
+            if new_block is not None:
+                notes.append(f"merged derived table {derived.alias} into the outer query")
+                block = new_block
+                merged = True
+                break
+    if not notes:
+        return block, 0
+    return block, len(notes), notes